@@ -0,0 +1,50 @@
+"""typed stock schema
+
+Store prices as numbers, add volume, bid, ask and updated_at columns,
+and put a unique index on stocks.symbol.
+
+Revision ID: 3a1f0c2b9d47
+Revises: None
+Create Date: 2026-10-18 10:30:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3a1f0c2b9d47'
+down_revision = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # Symbols must be unique before the index can be built, and the text
+    # placeholders YQL used for missing values are not numbers.
+    op.execute("DELETE FROM stocks WHERE id NOT IN "
+               "(SELECT MIN(id) FROM stocks GROUP BY symbol)")
+    op.execute("DELETE FROM stocks WHERE symbol IS NULL")
+    for column in ('last_trade_price', 'change'):
+        op.execute("UPDATE stocks SET {0} = NULL WHERE {0} = '' OR {0} = 'N/A'".format(column))
+    
+    # SQLite cannot alter column types, so the table is copied.
+    with op.batch_alter_table('stocks') as batch_op:
+        batch_op.alter_column('symbol', existing_type=sa.String(), nullable=False)
+        batch_op.alter_column('last_trade_price', type_=sa.Float(), existing_type=sa.String())
+        batch_op.alter_column('change', type_=sa.Float(), existing_type=sa.String())
+        batch_op.add_column(sa.Column('volume', sa.Integer()))
+        batch_op.add_column(sa.Column('bid', sa.Float()))
+        batch_op.add_column(sa.Column('ask', sa.Float()))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime()))
+        batch_op.create_index('ix_stocks_symbol', ['symbol'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('stocks') as batch_op:
+        batch_op.drop_index('ix_stocks_symbol')
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('ask')
+        batch_op.drop_column('bid')
+        batch_op.drop_column('volume')
+        batch_op.alter_column('change', type_=sa.String(), existing_type=sa.Float())
+        batch_op.alter_column('last_trade_price', type_=sa.String(), existing_type=sa.Float())
+        batch_op.alter_column('symbol', existing_type=sa.String(), nullable=True)
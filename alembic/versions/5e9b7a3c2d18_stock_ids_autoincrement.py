@@ -0,0 +1,40 @@
+"""stock ids autoincrement
+
+Stop reusing the ids of removed stocks, which the tick history still
+holds ticks of.
+
+Revision ID: 5e9b7a3c2d18
+Revises: 8c52e4d1a6f3
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5e9b7a3c2d18'
+down_revision = '8c52e4d1a6f3'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # SQLite only takes AUTOINCREMENT when a table is created.
+    with op.batch_alter_table('stocks', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        pass
+    
+    # Start past the ids of removed stocks that still have ticks.
+    connection = op.get_bind()
+    partitions = [name for name, in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'ticks\\_%' ESCAPE '\\'")]
+    highest = max([connection.execute('SELECT MAX(symbol_id) FROM {}'.format(name)).scalar() or 0
+                   for name in partitions] + [0])
+    op.execute("INSERT INTO sqlite_sequence (name, seq) SELECT 'stocks', 0 "
+               "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'stocks')")
+    op.execute("UPDATE sqlite_sequence SET seq = MAX(seq, {}) WHERE name = 'stocks'".format(highest))
+
+
+def downgrade():
+    with op.batch_alter_table('stocks', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': False}) as batch_op:
+        pass
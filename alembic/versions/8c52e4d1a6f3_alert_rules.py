@@ -0,0 +1,35 @@
+"""alert rules
+
+Add the alert_rules table of the alert engine.
+
+Revision ID: 8c52e4d1a6f3
+Revises: 3a1f0c2b9d47
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '8c52e4d1a6f3'
+down_revision = '3a1f0c2b9d47'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('alert_rules',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('symbol', sa.String(), nullable=False),
+        sa.Column('field', sa.String(), nullable=False),
+        sa.Column('direction', sa.String(), nullable=False),
+        sa.Column('threshold', sa.Float(), nullable=False),
+        sa.Column('once', sa.Boolean(), nullable=False),
+        sa.Column('enabled', sa.Boolean(), nullable=False),
+        sa.Column('fired_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'))
+    op.create_index('ix_alert_rules_symbol', 'alert_rules', ['symbol'])
+
+
+def downgrade():
+    op.drop_index('ix_alert_rules_symbol', 'alert_rules')
+    op.drop_table('alert_rules')
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Times AlertEngine.check with 100k rules on 10k symbols (10 rules per
+symbol, thresholds within 5% of the price), for polls in which 100, 1k
+or all 10k symbols changed, against checking every rule on every poll.
+Run from the project root: python benchmarks/bench_alerts.py
+"""
+
+import os, sys
+import random
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stream.alerts import AlertEngine, Rule
+from stream.quote import Quote
+
+SYMBOLS = 10000
+RULES_PER_SYMBOL = 10
+CHANGED = (100, 1000, 10000)
+ROUNDS = 50
+
+def make_rules(symbols, prices):
+    rules = []
+    for symbol in symbols:
+        for i in range(RULES_PER_SYMBOL):
+            rules.append(Rule(len(rules) + 1, symbol, 'last_trade_price',
+                              random.choice(('up', 'down', 'either')),
+                              prices[symbol] * random.uniform(0.95, 1.05)))
+    return rules
+
+def poll(symbols, prices):
+    quotes = []
+    for symbol in symbols:
+        prices[symbol] *= 1 + random.gauss(0, 0.002)
+        quotes.append(Quote(symbol, prices[symbol]))
+    return quotes
+
+def brute_force(rules, quotes, last):
+    """
+    Checks every rule against the latest prices.
+    """
+    latest = dict(last)
+    for quote in quotes:
+        latest[quote.symbol] = quote.last_trade_price
+    fired = 0
+    for rule in rules:
+        previous, value = last[rule.symbol], latest[rule.symbol]
+        if (previous < rule.threshold <= value and rule.direction != 'down' or
+                value <= rule.threshold < previous and rule.direction != 'up'):
+            fired += 1
+    last.update(latest)
+    return fired
+
+def main():
+    random.seed(1)
+    symbols = ['S{}'.format(i) for i in range(SYMBOLS)]
+    prices = dict((symbol, random.uniform(10, 500)) for symbol in symbols)
+    rules = make_rules(symbols, prices)
+    engine = AlertEngine()
+    for rule in rules:
+        engine.add(rule)
+    engine.check(poll(symbols, prices))
+    last = dict(prices)
+    print('{} rules on {} symbols'.format(len(engine), SYMBOLS))
+    print('{:>8} {:>14} {:>16} {:>14}'.format('changed', 'indexed ms', 'brute force ms', 'events/poll'))
+    for changed in CHANGED:
+        batches = [poll(random.sample(symbols, changed), prices) for i in range(ROUNDS)]
+        events = 0
+        start = timer()
+        for batch in batches:
+            events += len(engine.check(batch))
+        indexed = (timer() - start) / ROUNDS * 1e3
+        last = dict(prices)
+        brute_batches = [poll(random.sample(symbols, changed), prices) for i in range(5)]
+        start = timer()
+        for batch in brute_batches:
+            brute_force(rules, batch, last)
+        brute = (timer() - start) / len(brute_batches) * 1e3
+        print('{:>8} {:>14.3f} {:>16.1f} {:>14.1f}'.format(changed, indexed, brute,
+                                                          float(events) / ROUNDS))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+Measures the cost per tick of Analytics.update with 100, 1k and 10k
+symbols, for polls that return every symbol and for polls that return
+only 100 of them. The windows are filled before timing, so every tick
+also drops old prices from the running sums. The cost per tick should
+stay flat as the number of symbols grows.
+Run from the project root: python benchmarks/bench_analytics.py
+"""
+
+import os, sys
+import random
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stream.analytics import Analytics
+from stream.quote import Quote
+
+SIZES = (100, 1000, 10000)
+WARMUP = 60
+ROUNDS = 20
+PARTIAL = 100
+
+def poll(symbols, prices):
+    quotes = []
+    for symbol in symbols:
+        prices[symbol] *= 1 + random.gauss(0, 0.001)
+        quotes.append(Quote(symbol, prices[symbol], volume=100))
+    return quotes
+
+def per_tick(analytics, batches):
+    ticks = sum(len(batch) for batch in batches)
+    start = timer()
+    for batch in batches:
+        analytics.update(batch)
+    return (timer() - start) / ticks * 1e6
+
+def main():
+    random.seed(1)
+    print('{:>8} {:>18} {:>22}'.format('symbols', 'all, us/tick', '{} each, us/tick'.format(PARTIAL)))
+    for size in SIZES:
+        symbols = ['S{}'.format(i) for i in range(size)]
+        prices = dict((symbol, 100.0) for symbol in symbols)
+        analytics = Analytics()
+        for i in range(WARMUP):
+            analytics.update(poll(symbols, prices))
+        everything = per_tick(analytics, [poll(symbols, prices) for i in range(ROUNDS)])
+        partial = per_tick(analytics, [poll(random.sample(symbols, PARTIAL), prices)
+                                       for i in range(ROUNDS * 10)])
+        print('{:>8} {:>18.2f} {:>22.2f}'.format(size, everything, partial))
+
+if __name__ == '__main__':
+    main()
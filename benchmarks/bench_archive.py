@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Exports one day of tick history for 5k symbols (200 ticks each) to a CSV
+file the way it is done without archives, one TickHistory.range() query
+per symbol, and to a compressed columnar archive with export_ticks, then
+imports the archive into an empty database. Also times importing a 50k
+symbol watchlist file.
+Run from the project root: python benchmarks/bench_archive.py
+"""
+
+import os, sys
+import csv
+import random
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from stream.archive import export_ticks, import_ticks, import_watchlist
+from stream.history import TickHistory, to_millis
+from stream.models import Base, Stock
+
+SYMBOLS = 5000
+TICKS = 200
+WATCHLIST = 50000
+DAY = date(2016, 3, 1)
+
+def make_session(path):
+    engine = create_engine('sqlite:///' + path)
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+def fill(session):
+    random.seed(1)
+    session.execute(Stock.__table__.insert(),
+                    [{'symbol': 'S{}'.format(i)} for i in range(SYMBOLS)])
+    opening = to_millis(datetime(DAY.year, DAY.month, DAY.day, 14, 30))
+    rows = []
+    for symbol_id in range(1, SYMBOLS + 1):
+        price = random.uniform(10, 500)
+        ts = opening
+        for i in range(TICKS):
+            ts += random.randint(1000, 100000)
+            price *= 1 + random.gauss(0, 0.001)
+            rows.append((symbol_id, ts, round(price, 2), random.randint(100, 100000)))
+    TickHistory().insert(session, DAY, rows)
+    session.commit()
+
+def export_csv(session, path):
+    history = TickHistory()
+    start = datetime(DAY.year, DAY.month, DAY.day)
+    end = start + timedelta(days=1) - timedelta(milliseconds=1)
+    count = 0
+    with open(path, 'wb') as output:
+        writer = csv.writer(output)
+        writer.writerow(['symbol', 'ts', 'price', 'volume'])
+        for symbol_id, symbol in session.query(Stock.id, Stock.symbol):
+            for ts, price, volume in history.range(session, symbol_id, start, end):
+                writer.writerow([symbol, ts.isoformat(), price, volume])
+                count += 1
+    return count
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        source = make_session(os.path.join(directory, 'source.db'))
+        fill(source)
+        csv_path = os.path.join(directory, 'ticks.csv')
+        archive_path = os.path.join(directory, 'ticks.stk')
+
+        start = timer()
+        csv_count = export_csv(source, csv_path)
+        csv_seconds = timer() - start
+        start = timer()
+        count = export_ticks(source, archive_path, DAY)
+        export_seconds = timer() - start
+        assert count == csv_count == SYMBOLS * TICKS
+
+        target = make_session(os.path.join(directory, 'target.db'))
+        start = timer()
+        assert import_ticks(target, archive_path) == count
+        target.commit()
+        import_seconds = timer() - start
+
+        watchlist_path = os.path.join(directory, 'watchlist.txt')
+        with open(watchlist_path, 'w') as watchlist:
+            watchlist.write('\n'.join('W{}'.format(i) for i in range(WATCHLIST)))
+        start = timer()
+        assert len(import_watchlist(target, watchlist_path)) == WATCHLIST
+        target.commit()
+        watchlist_seconds = timer() - start
+
+        print('{} ticks of {} symbols'.format(count, SYMBOLS))
+        print('{:<32} {:>8.2f} s {:>10.1f} MB'.format('CSV, a range() query per symbol',
+                                                     csv_seconds, os.path.getsize(csv_path) / 1e6))
+        print('{:<32} {:>8.2f} s {:>10.1f} MB'.format('export_ticks', export_seconds,
+                                                     os.path.getsize(archive_path) / 1e6))
+        print('{:<32} {:>8.2f} s'.format('import_ticks', import_seconds))
+        print('{:<32} {:>8.2f} s'.format('import_watchlist ({} symbols)'.format(WATCHLIST),
+                                         watchlist_seconds))
+        source.close()
+        target.close()
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
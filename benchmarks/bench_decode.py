@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Compares decoding a YQL quote response with response.json() and a walk
+of ['query']['results']['quote'] against QuoteStreamDecoder. Responses
+are built by repeating the quotes of the recorded fixture in
+tests/fixtures. Each measurement runs in a fresh interpreter so that
+peak RSS is not shared between the two paths.
+Run from the project root: python benchmarks/bench_decode.py
+"""
+
+import os, sys
+import json
+import resource
+import shutil
+import subprocess
+import tempfile
+from datetime import datetime
+from timeit import default_timer as timer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from stream.decode import QuoteStreamDecoder
+from stream.fetch import CHUNK_SIZE
+from stream.quote import Projection
+
+FIXTURE = os.path.join(ROOT, 'tests', 'fixtures', 'yql_quotes.json')
+SIZES = (1000, 10000, 50000)
+
+def make_body(size):
+    quotes = json.load(open(FIXTURE))['query']['results']['quote']
+    recorded = []
+    for i in range(size):
+        quote = dict(quotes[i % len(quotes)])
+        quote['symbol'] = quote['Symbol'] = 'S{}'.format(i)
+        recorded.append(quote)
+    return json.dumps({'query': {'count': size, 'results': {'quote': recorded}}})
+
+def full_decode(body, projection, now):
+    stocks_data_list = json.loads(body)['query']['results']['quote']
+    return [projection.decode(stock_data, now) for stock_data in stocks_data_list]
+
+def stream_decode(body, projection, now):
+    decoder = QuoteStreamDecoder(lambda pairs: projection.decode_pairs(pairs, now))
+    quotes = []
+    for start in range(0, len(body), CHUNK_SIZE):
+        quotes.extend(decoder.feed(body[start:start + CHUNK_SIZE]))
+    quotes.extend(decoder.close())
+    return quotes
+
+def child(path, fixture, size):
+    body = open(fixture).read()
+    projection = Projection()
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = timer()
+    quotes = (full_decode if path == 'full' else stream_decode)(body, projection, datetime.utcnow())
+    elapsed = timer() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    assert len(quotes) == size
+    print(json.dumps({'seconds': elapsed, 'peak_kb': peak - baseline, 'bytes': len(body)}))
+
+def run(path, fixture, size):
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                      path, fixture, str(size)])
+    return json.loads(output)
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        print('{:>8} {:>9} {:>12} {:>12} {:>14} {:>14}'.format(
+            'symbols', 'MB', 'full ms', 'stream ms', 'full RSS KB', 'stream RSS KB'))
+        for size in SIZES:
+            fixture = os.path.join(directory, 'quotes_{}.json'.format(size))
+            with open(fixture, 'w') as response:
+                response.write(make_body(size))
+            full = run('full', fixture, size)
+            stream = run('stream', fixture, size)
+            print('{:>8} {:>9.1f} {:>12.1f} {:>12.1f} {:>14} {:>14}'.format(
+                size, full['bytes'] / 1e6, full['seconds'] * 1e3, stream['seconds'] * 1e3,
+                full['peak_kb'], stream['peak_kb']))
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4:
+        child(sys.argv[1], sys.argv[2], int(sys.argv[3]))
+    else:
+        main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+Measures how fast FileProvider takes in appended ticks and answers a
+poll of the whole watchlist, for CSV and NDJSON tick files of 500k ticks
+on 10k symbols.
+Run from the project root: python benchmarks/bench_file_provider.py
+"""
+
+import os, sys
+import json
+import random
+import shutil
+import tempfile
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stream.providers import FileProvider
+from stream.quote import Projection
+
+SYMBOLS = 10000
+TICKS = 500000
+
+def write_ticks(path, symbols):
+    random.seed(1)
+    with open(path, 'w') as tick_file:
+        if path.endswith('.csv'):
+            tick_file.write('Symbol,LastTradePriceOnly,Volume\n')
+        for i in range(TICKS):
+            symbol = random.choice(symbols)
+            price = '{:.2f}'.format(random.uniform(10, 500))
+            volume = str(random.randint(1, 10 ** 6))
+            if path.endswith('.csv'):
+                tick_file.write('{},{},{}\n'.format(symbol, price, volume))
+            else:
+                tick_file.write(json.dumps({'Symbol': symbol, 'LastTradePriceOnly': price,
+                                            'Volume': volume}) + '\n')
+
+def main():
+    symbols = ['S{}'.format(i) for i in range(SYMBOLS)]
+    directory = tempfile.mkdtemp()
+    try:
+        print('{:>7} {:>12} {:>14}'.format('format', 'ticks/s', 'poll of 10k ms'))
+        for name in ('ticks.csv', 'ticks.ndjson'):
+            path = os.path.join(directory, name)
+            write_ticks(path, symbols)
+            provider = FileProvider(path, Projection(['l1', 'v0']))
+            start = timer()
+            ticks = provider.read()
+            read = timer() - start
+            shards = provider.snapshot(symbols)
+            start = timer()
+            quotes = provider.fetch_shards(shards)
+            poll = timer() - start
+            assert ticks == TICKS and len(quotes) == SYMBOLS
+            print('{:>7} {:>12.0f} {:>14.1f}'.format(name.split('.')[1], ticks / read, poll * 1e3))
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
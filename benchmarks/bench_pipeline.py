@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+"""
+Replays synthetic quote responses through a local ReplayServer and times
+each stage of a poll for 100, 1k and 10k symbols: fetch (HTTP and
+streamed decode), decode alone, process (Streamer.apply: change
+detection, analytics, the snapshot, alerts and the cache), persist (the
+writer thread's commit of what apply queued) and notify (the quote bus),
+and the whole of Streamer.refresh until its write is committed, for
+every tier. Every price moves on every frame, so each poll is full.
+
+Results are printed, and with --output also written as JSON together
+with the environment they were measured in. --compare checks them
+against such a file and exits with status 1 if a stage got slower than
+the tolerance allows.
+Run from the project root: python benchmarks/bench_pipeline.py
+"""
+
+import os, sys
+import argparse
+import json
+import platform
+import random
+import shutil
+import tempfile
+from datetime import datetime
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy import create_engine
+import stream
+from stream.decode import QuoteStreamDecoder
+from stream.fetch import ShardedFetcher
+from stream.models import Base
+from stream.process import Streamer
+from stream.replay import Recording, ReplayServer
+
+SIZES = (100, 1000, 10000)
+ROUNDS = 5
+STAGES = ('fetch', 'decode', 'process', 'persist', 'notify', 'end_to_end')
+
+def make_recording(size, frames):
+    random.seed(size)
+    quotes = [{'Symbol': 'S{}'.format(i), 'LastTradePriceOnly': '{:.2f}'.format(random.uniform(10, 500)),
+               'Volume': str(random.randint(1000, 10 ** 7))} for i in range(size)]
+    return Recording.synthetic(quotes, frames, volatility=0.01, seed=size)
+
+def make_body(recording, frame, symbols, fields):
+    quotes = [dict((field, recording.quote(frame, symbol).get(field)) for field in fields)
+              for symbol in symbols]
+    return json.dumps({'query': {'count': len(quotes), 'results': {'quote': quotes}}})
+
+def decode(projection, body):
+    now = datetime.utcnow()
+    decoder = QuoteStreamDecoder(lambda pairs: projection.decode_pairs(pairs, now))
+    return decoder.feed(body) + decoder.close()
+
+def committed(streamer):
+    # Jobs are committed in queue order, so this returns once every write
+    # queued before it is committed.
+    streamer.writes.submit(lambda session: None).wait()
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def measure(directory, size):
+    engine = create_engine('sqlite:///' + os.path.join(directory, 'bench.db'))
+    stream.enable_wal(engine)
+    Base.metadata.create_all(engine)
+    stream.Session.configure(bind=engine)
+    # Two frames per round: one for the stages, one for refresh().
+    recording = make_recording(size, 2 * ROUNDS + 1)
+    server = ReplayServer(recording).start()
+    streamer = Streamer(fetcher=ShardedFetcher(url=server.url))
+    symbols = ['S{}'.format(i) for i in range(size)]
+    streamer.add_many(symbols, fetch=False)
+    subscription = streamer.subscribe(maxsize=None)
+    projection = streamer.projection
+    fields = projection.names
+    times = dict((stage, []) for stage in STAGES)
+    try:
+        # Warm up: the first poll stores every symbol's starting values.
+        with streamer.lock:
+            streamer.apply(streamer.fetcher.fetch(symbols))
+        committed(streamer)
+        for round in range(ROUNDS):
+            body = make_body(recording, 2 * round + 1, symbols, fields)
+            start = timer()
+            decode(projection, body)
+            times['decode'].append(timer() - start)
+
+            start = timer()
+            quotes = streamer.fetcher.fetch(symbols)
+            times['fetch'].append(timer() - start)
+            start = timer()
+            with streamer.lock:
+                quotes = streamer.apply(quotes)
+            times['process'].append(timer() - start)
+            start = timer()
+            committed(streamer)
+            times['persist'].append(timer() - start)
+            start = timer()
+            streamer.bus.publish(quotes)
+            subscription.get(timeout=0)
+            times['notify'].append(timer() - start)
+
+            # Poll every tier, as the update loop would if all were due.
+            for tier in streamer.scheduler.tiers.values():
+                tier.next_due = 0.0
+            start = timer()
+            for tier in streamer.scheduler.due():
+                streamer.refresh(tier)
+            committed(streamer)
+            times['end_to_end'].append(timer() - start)
+            subscription.get(timeout=0)
+    finally:
+        streamer.writes.stop()
+        streamer.fetcher.close()
+        server.stop()
+        stream.Session.remove()
+        engine.dispose()
+        os.remove(os.path.join(directory, 'bench.db'))
+    results = {}
+    for stage in STAGES:
+        seconds = median(times[stage])
+        results[stage] = {'ms': seconds * 1e3, 'quotes_per_s': size / seconds}
+    return results
+
+def environment():
+    return {'python': platform.python_version(), 'platform': platform.platform(),
+            'processor': platform.processor(), 'time': datetime.utcnow().isoformat(),
+            'rounds': ROUNDS}
+
+def compare(results, baseline, tolerance):
+    """
+    @return the (size, stage, baseline ms, ms) of every stage more than
+        tolerance (a fraction) slower than in the baseline.
+    """
+    slower = []
+    for size, stages in sorted(results.items()):
+        for stage, result in sorted(stages.items()):
+            before = baseline.get(size, {}).get(stage)
+            if before is not None and result['ms'] > before['ms'] * (1 + tolerance):
+                slower.append((size, stage, before['ms'], result['ms']))
+    return slower
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='a JSON file written with --output')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='fraction a stage may be slower than in --compare')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    results = {}
+    try:
+        print('{:>8} {:>11} {:>12} {:>14}'.format('symbols', 'stage', 'median ms', 'quotes/s'))
+        for size in args.sizes:
+            results[str(size)] = measure(directory, size)
+            for stage in STAGES:
+                result = results[str(size)][stage]
+                print('{:>8} {:>11} {:>12.2f} {:>14.0f}'.format(size, stage, result['ms'],
+                                                              result['quotes_per_s']))
+    finally:
+        shutil.rmtree(directory)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'environment': environment(), 'results': results}, output,
+                      indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as baseline:
+            slower = compare(results, json.load(baseline)['results'], args.tolerance)
+        for size, stage, before, after in slower:
+            print('{} symbols, {}: {:.2f} ms -> {:.2f} ms'.format(size, stage, before, after))
+        if slower:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Compares symbol lookups, price sorts and price threshold filters on the
+original stocks schema (text prices, no index on symbol) against the
+typed, indexed schema at 10k symbols.
+Run from the project root: python benchmarks/bench_schema.py
+"""
+
+import os, sys
+import random
+import shutil
+import tempfile
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy import create_engine
+from stream.models import Base, Stock
+
+SIZE = 10000
+LOOKUPS = 1000
+SORTS = 20
+
+OLD_SCHEMA = ('CREATE TABLE stocks (id INTEGER NOT NULL, symbol VARCHAR, '
+              'last_trade_price VARCHAR, change VARCHAR, PRIMARY KEY (id))')
+
+OLD_QUERIES = {
+    'sort': 'SELECT symbol FROM stocks ORDER BY CAST(last_trade_price AS REAL) DESC LIMIT 50',
+    'filter': 'SELECT symbol FROM stocks WHERE CAST(last_trade_price AS REAL) > 500',
+    }
+NEW_QUERIES = {
+    'sort': 'SELECT symbol FROM stocks ORDER BY last_trade_price DESC LIMIT 50',
+    'filter': 'SELECT symbol FROM stocks WHERE last_trade_price > 500',
+    }
+
+def populate(engine, typed):
+    prices = [random.uniform(1, 1000) for i in range(SIZE)]
+    rows = [{'symbol': 'S{}'.format(i),
+             'last_trade_price': price if typed else '{:.2f}'.format(price)}
+            for i, price in enumerate(prices)]
+    engine.execute(Stock.__table__.insert(), rows)
+
+def measure(engine, queries):
+    connection = engine.raw_connection()
+    cursor = connection.cursor()
+    symbols = ['S{}'.format(random.randrange(SIZE)) for i in range(LOOKUPS)]
+    results = {}
+    start = timer()
+    for symbol in symbols:
+        cursor.execute('SELECT id FROM stocks WHERE symbol = ?', (symbol,)).fetchone()
+    results['lookup'] = (timer() - start) / LOOKUPS
+    for name, query in sorted(queries.items()):
+        start = timer()
+        for i in range(SORTS):
+            cursor.execute(query).fetchall()
+        results[name] = (timer() - start) / SORTS
+    connection.close()
+    return results
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        old_engine = create_engine('sqlite:///' + os.path.join(directory, 'old.db'))
+        old_engine.execute(OLD_SCHEMA)
+        populate(old_engine, typed=False)
+        new_engine = create_engine('sqlite:///' + os.path.join(directory, 'new.db'))
+        Base.metadata.create_all(new_engine)
+        populate(new_engine, typed=True)
+
+        old = measure(old_engine, OLD_QUERIES)
+        new = measure(new_engine, NEW_QUERIES)
+        print('{} symbols, microseconds per query'.format(SIZE))
+        print('{:>8} {:>12} {:>12} {:>8}'.format('query', 'before', 'after', 'speedup'))
+        for name in ('lookup', 'sort', 'filter'):
+            print('{:>8} {:>12.1f} {:>12.1f} {:>7.1f}x'.format(
+                name, old[name] * 1e6, new[name] * 1e6, old[name] / new[name]))
+        old_engine.dispose()
+        new_engine.dispose()
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Times the database work of add/remove churn and single-symbol lookups
+on a 10k symbol stocks table with three session setups: a new SQLite
+connection per session and queries compiled on every call (how
+get_session worked before connections were pooled), pooled connections
+with those same queries, and pooled connections with the cached
+statements that QuoteWriter and Streamer.read_quotes use.
+Run from the project root: python benchmarks/bench_sessions.py
+"""
+
+import os, sys
+import shutil
+import tempfile
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy import create_engine
+import stream
+from stream.models import Base, Stock
+from stream.providers import FileProvider
+from stream.process import Streamer
+from stream.util import get_session
+from stream.writer import QuoteWriter, stocks_table
+
+SIZE = 10000
+OPERATIONS = 2000
+
+def legacy_engine(uri):
+    engine = create_engine(uri)
+    stream.enable_wal(engine)
+    return engine
+
+def legacy_read(symbols):
+    columns = ('last_trade_price', 'change', 'volume', 'bid', 'ask', 'updated_at')
+    with get_session() as session:
+        return session.query(Stock.symbol, *[getattr(Stock, column) for column in columns]) \
+            .filter(Stock.symbol.in_(symbols)).all()
+
+def legacy_add(symbol):
+    with get_session() as session:
+        session.execute(stocks_table.insert().prefix_with('OR IGNORE'), [{'symbol': symbol}])
+        row_ids = session.query(Stock.id, Stock.symbol).filter(Stock.symbol.in_([symbol])).all()
+        session.commit()
+    return row_ids[0][0]
+
+def legacy_remove(row_id):
+    with get_session() as session:
+        session.execute(stocks_table.delete().where(stocks_table.c.id.in_([row_id])))
+        session.commit()
+
+def cached_add(writer, symbol):
+    with get_session() as session:
+        writer.resolve(session, [symbol])
+        session.commit()
+    return writer.row_ids[symbol]
+
+def cached_remove(writer, symbol):
+    with get_session() as session:
+        writer.delete(session, [symbol])
+        session.commit()
+
+def measure(read, add, remove):
+    start = timer()
+    for i in range(OPERATIONS):
+        assert len(read(['S{}'.format(i * 7 % SIZE)])) == 1
+    lookup = (timer() - start) / OPERATIONS * 1e6
+    start = timer()
+    for i in range(OPERATIONS):
+        symbol = 'NEW{}'.format(i)
+        remove(symbol, add(symbol))
+    churn = (timer() - start) / OPERATIONS * 1e6
+    return lookup, churn
+
+def main():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'bench.db')
+    uri = 'sqlite:///' + path
+    ticks = os.path.join(directory, 'ticks.csv')
+    open(ticks, 'w').close()
+    try:
+        engine = create_engine(uri)
+        Base.metadata.create_all(engine)
+        engine.execute(Stock.__table__.insert(),
+                       [{'symbol': 'S{}'.format(i), 'last_trade_price': float(i)}
+                        for i in range(SIZE)])
+        engine.dispose()
+        print('{} stocks, {} operations each'.format(SIZE, OPERATIONS))
+        print('{:<36} {:>12} {:>14}'.format('', 'lookup us', 'add+remove us'))
+        setups = (('connection per session, compiled', legacy_engine(uri), False),
+                  ('pooled, compiled', stream.make_engine(uri), False),
+                  ('pooled, cached statements', stream.make_engine(uri), True))
+        for name, engine, cached in setups:
+            stream.Session.remove()
+            stream.Session.configure(bind=engine)
+            if cached:
+                streamer = Streamer(fetcher=FileProvider(ticks))
+                writer = QuoteWriter()
+                lookup, churn = measure(streamer.read_quotes, lambda symbol: cached_add(writer, symbol),
+                                        lambda symbol, row_id: cached_remove(writer, symbol))
+                streamer.stop()
+                streamer.writes.stop()
+            else:
+                lookup, churn = measure(legacy_read, legacy_add,
+                                        lambda symbol, row_id: legacy_remove(row_id))
+            print('{:<36} {:>12.1f} {:>14.1f}'.format(name, lookup, churn))
+            stream.Session.remove()
+            engine.dispose()
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Reads the latest quotes of 20k symbols from the shared quote table, and
+from an indexed SQLite table the way the UI reads them, while another
+process rewrites every row of the shared table as fast as it can.
+Times single-symbol lookups and full-table reads, and checks that no row
+read from the shared table is torn (the writer gives every field of a
+row the same value).
+Run from the project root: python benchmarks/bench_shm.py
+"""
+
+import os, sys
+import multiprocessing
+import random
+import shutil
+import sqlite3
+import tempfile
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+from stream.quote import Quote
+from stream.shm import QuoteTable, QuoteTableReader
+
+SIZE = 20000
+LOOKUPS = 50000
+ROUNDS = 10
+FIELDS = ('last_trade_price', 'change', 'volume', 'bid', 'ask')
+
+def write(table, symbols, stop):
+    # Rewrites every row in batches of 1000, all fields set to one value.
+    i = 0
+    while not stop.is_set():
+        i += 1
+        for start in range(0, len(symbols), 1000):
+            table.update([Quote(symbol, float(i), change=float(i), volume=i, bid=float(i),
+                                ask=float(i)) for symbol in symbols[start:start + 1000]])
+
+def per_lookup(get, symbols):
+    start = timer()
+    for symbol in symbols:
+        get(symbol)
+    return (timer() - start) / len(symbols) * 1e6
+
+def best(function):
+    times = []
+    for i in range(ROUNDS):
+        start = timer()
+        result = function()
+        times.append(timer() - start)
+    return min(times) * 1e3, result
+
+def main():
+    symbols = ['S{}'.format(i) for i in range(SIZE)]
+    random.seed(1)
+    lookups = [random.choice(symbols) for i in range(LOOKUPS)]
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'quotes')
+        table = QuoteTable(path, FIELDS, capacity=SIZE)
+        table.update([Quote(symbol, 0.0, change=0.0, volume=0, bid=0.0, ask=0.0) for symbol in symbols])
+        connection = sqlite3.connect(os.path.join(directory, 'bench.db'))
+        connection.execute('CREATE TABLE stocks (symbol TEXT UNIQUE, {})'.format(
+            ', '.join('{} REAL'.format(field) for field in FIELDS)))
+        connection.executemany('INSERT INTO stocks VALUES (?, ?, ?, ?, ?, ?)',
+                               [(symbol, 1.0, 1.0, 1.0, 1.0, 1.0) for symbol in symbols])
+        connection.commit()
+        query = 'SELECT {} FROM stocks WHERE symbol = ?'.format(', '.join(FIELDS))
+        sqlite_get = lambda symbol: connection.execute(query, (symbol,)).fetchone()
+        sqlite_all = lambda: connection.execute('SELECT * FROM stocks').fetchall()
+
+        reader = QuoteTableReader(path)
+        stop = multiprocessing.Event()
+        writer = multiprocessing.Process(target=write, args=(table, symbols, stop))
+        writer.start()
+        try:
+            get_us = per_lookup(reader.get, lookups)
+            sqlite_us = per_lookup(sqlite_get, lookups)
+            sqlite_ms, _ = best(sqlite_all)
+            snapshot_ms, rows = best(reader.snapshot)
+            torn = 0
+            for i in range(ROUNDS * 10):
+                rows = reader.snapshot()
+                values = np.column_stack([rows[field] for field in FIELDS])
+                torn += int((values != values[:, :1]).any(axis=1).sum())
+            written = int(rows['last_trade_price'].max())
+        finally:
+            stop.set()
+            writer.join()
+        print('{} symbols, {} cores; the writer rewrote every row {} times'.format(
+            SIZE, multiprocessing.cpu_count(), written))
+        print('{:<28} {:>10.2f} us'.format('shared table get()', get_us))
+        print('{:<28} {:>10.2f} us'.format('SQLite point query', sqlite_us))
+        print('{:<28} {:>10.2f} ms'.format('shared table snapshot()', snapshot_ms))
+        print('{:<28} {:>10.2f} ms'.format('SQLite full table', sqlite_ms))
+        print('torn rows seen in {} snapshots: {}'.format(ROUNDS * 10, torn))
+        assert torn == 0
+        reader.close()
+        table.close()
+        connection.close()
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
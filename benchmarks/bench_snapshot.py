@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Screens 10k symbols for "price above its 20-tick SMA and volume above
+twice the median", by walking ORM Stock objects (with the SMA kept in a
+dict, as the ORM has no column for it) and on the Streamer's columnar
+Snapshot. Also times Snapshot.update for a poll of every symbol.
+Run from the project root: python benchmarks/bench_snapshot.py
+"""
+
+import os, sys
+import random
+import shutil
+import tempfile
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from stream.models import Base, Stock
+from stream.quote import Quote
+from stream.snapshot import Snapshot
+
+SIZE = 10000
+ROUNDS = 20
+
+def orm_screen(Session, smas):
+    session = Session()
+    stocks = session.query(Stock).all()
+    median = sorted(stock.volume for stock in stocks)[len(stocks) // 2]
+    selected = [stock.symbol for stock in stocks
+                if stock.last_trade_price > smas[stock.symbol] and stock.volume > 2 * median]
+    session.close()
+    return selected
+
+def snapshot_screen(snapshot):
+    with snapshot.read() as view:
+        median = np.nanmedian(view.volume)
+        return view.select((view.last_trade_price > view.sma_20) & (view.volume > 2 * median))
+
+def best(function, *args):
+    times = []
+    for i in range(ROUNDS):
+        start = timer()
+        result = function(*args)
+        times.append(timer() - start)
+    return min(times) * 1e3, result
+
+def main():
+    random.seed(1)
+    quotes = [Quote('S{}'.format(i), random.uniform(10, 200),
+                    volume=int(random.lognormvariate(13, 1)),
+                    stats={'sma_20': random.uniform(10, 200)}) for i in range(SIZE)]
+    smas = dict((quote.symbol, quote.stats['sma_20']) for quote in quotes)
+    directory = tempfile.mkdtemp()
+    try:
+        engine = create_engine('sqlite:///' + os.path.join(directory, 'bench.db'))
+        Base.metadata.create_all(engine)
+        engine.execute(Stock.__table__.insert(),
+                       [{'symbol': quote.symbol, 'last_trade_price': quote.last_trade_price,
+                         'volume': quote.volume} for quote in quotes])
+        Session = sessionmaker(bind=engine)
+        snapshot = Snapshot(('last_trade_price', 'change', 'bid', 'ask', 'volume', 'sma_20'))
+        update_ms, _ = best(snapshot.update, quotes)
+        orm_ms, orm_selected = best(orm_screen, Session, smas)
+        snapshot_ms, snapshot_selected = best(snapshot_screen, snapshot)
+        assert sorted(orm_selected) == sorted(snapshot_selected)
+        print('{} symbols, {} selected'.format(SIZE, len(snapshot_selected)))
+        print('{:<28} {:>10.2f} ms'.format('ORM screen', orm_ms))
+        print('{:<28} {:>10.2f} ms'.format('snapshot screen', snapshot_ms))
+        print('{:<28} {:>10.2f} ms'.format('snapshot update (all)', update_ms))
+        engine.dispose()
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Compares Streamer startup against the original load, which read every
+Stock and then called add() on each one (a find_database query, a list
+membership test and a stocks_csv rebuild per symbol).
+Run from the project root: python benchmarks/bench_startup.py
+"""
+
+import os, sys
+import shutil
+import tempfile
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy import create_engine
+import stream
+from stream.models import Base, Stock
+from stream.fetch import ShardedFetcher
+from stream.process import Streamer
+from stream.util import get_session
+
+SIZES = (1000, 10000)
+
+def legacy_load():
+    stocks = []
+    stocks_csv = ''
+    with get_session() as session:
+        stocks_in_database = session.query(Stock).all()
+    for stock in stocks_in_database:
+        symbol = str(stock.symbol)
+        in_local = symbol in stocks
+        with get_session() as session:
+            in_database = session.query(Stock).filter(Stock.symbol == symbol).first() is not None
+        if not in_local:
+            stocks.append(symbol)
+            stocks_csv = '","'.join(stocks)
+    return stocks
+
+def main():
+    directory = tempfile.mkdtemp()
+    fetcher = ShardedFetcher(workers=1)
+    try:
+        print('{:>8} {:>12} {:>12} {:>8}'.format('symbols', 'before s', 'after s', 'speedup'))
+        for size in SIZES:
+            engine = create_engine('sqlite:///' + os.path.join(directory, '{}.db'.format(size)))
+            Base.metadata.create_all(engine)
+            engine.execute(Stock.__table__.insert(),
+                           [{'symbol': 'S{}'.format(i), 'last_trade_price': float(i)}
+                            for i in range(size)])
+            stream.Session.remove()
+            stream.Session.configure(bind=engine)
+
+            start = timer()
+            assert len(legacy_load()) == size
+            before = timer() - start
+            start = timer()
+            assert len(Streamer(fetcher=fetcher).watchlist) == size
+            after = timer() - start
+            print('{:>8} {:>12.3f} {:>12.3f} {:>7.1f}x'.format(size, before, after, before / after))
+            stream.Session.remove()
+            engine.dispose()
+    finally:
+        fetcher.close()
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
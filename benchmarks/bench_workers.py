@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Polls 20k symbols from a ReplayServer running in its own process, with
+the in-process ShardedFetcher and with a WorkerPool of 1, 2, 4 and 8
+worker processes. Reports quotes/s, and the CPU time the polling process
+itself spends per poll, which is what the workers take off the process
+that owns the writer and the UI. Speedups need as many free cores as
+workers.
+Run from the project root: python benchmarks/bench_workers.py
+"""
+
+import os, sys
+import multiprocessing
+import random
+import resource
+from functools import partial
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stream.fetch import ShardedFetcher
+from stream.quote import Projection
+from stream.replay import Recording, ReplayServer
+from stream.workers import WorkerPool
+
+SYMBOLS = 20000
+WORKERS = (1, 2, 4, 8)
+ROUNDS = 5
+
+def make_recording():
+    random.seed(1)
+    quotes = [{'Symbol': 'S{}'.format(i), 'LastTradePriceOnly': '{:.2f}'.format(random.uniform(10, 500)),
+               'Change': '{:.2f}'.format(random.gauss(0, 1)), 'Volume': str(random.randint(1, 10 ** 7)),
+               'Bid': '1.00', 'Ask': '1.01'} for i in range(SYMBOLS)]
+    return Recording.synthetic(quotes, 2, seed=1)
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def measure(provider, symbols):
+    # The first poll of each frame renders the server's cached bodies.
+    provider.fetch(symbols)
+    provider.fetch(symbols)
+    start, cpu = timer(), cpu_time()
+    for i in range(ROUNDS):
+        quotes = provider.fetch(symbols)
+    elapsed, cpu = timer() - start, cpu_time() - cpu
+    provider.close()
+    assert len(quotes) == len(symbols)
+    return len(symbols) * ROUNDS / elapsed, cpu / ROUNDS * 1e3
+
+def main():
+    symbols = ['S{}'.format(i) for i in range(SYMBOLS)]
+    server = ReplayServer(make_recording(), cache=True)
+    serving = multiprocessing.Process(target=server.serve_forever)
+    serving.daemon = True
+    serving.start()
+    projection = Projection()
+    try:
+        print('{} symbols, {} cores'.format(SYMBOLS, multiprocessing.cpu_count()))
+        print('{:>12} {:>10} {:>16}'.format('workers', 'quotes/s', 'own CPU ms/poll'))
+        rate, cpu = measure(ShardedFetcher(url=server.url, projection=projection), symbols)
+        print('{:>12} {:>10.0f} {:>16.1f}'.format('in-process', rate, cpu))
+        for workers in WORKERS:
+            pool = WorkerPool(workers, partial(ShardedFetcher, url=server.url), projection)
+            rate, cpu = measure(pool, symbols)
+            print('{:>12} {:>10.0f} {:>16.1f}'.format(workers, rate, cpu))
+    finally:
+        serving.terminate()
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
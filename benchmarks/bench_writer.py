@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Compares the per-symbol ORM update that Streamer.update used to run
+against the batched QuoteWriter. Reports rows/sec for each watchlist size.
+Run from the project root: python benchmarks/bench_writer.py
+"""
+
+import os, sys
+import shutil
+import tempfile
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from stream.models import Base, Stock
+from stream.quote import Quote
+from stream.writer import QuoteWriter
+
+SIZES = (100, 1000, 10000)
+ROUNDS = 3
+
+def make_session(path, size):
+    engine = create_engine('sqlite:///' + path)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.execute(Stock.__table__.insert(),
+                    [{'symbol': 'S{}'.format(i)} for i in range(size)])
+    session.commit()
+    return session
+
+def make_quotes(size, tick):
+    return [Quote('S{}'.format(i), i + tick / 10.0) for i in range(size)]
+
+def per_symbol(session, quotes):
+    for quote in quotes:
+        stock = session.query(Stock).filter(Stock.symbol == quote.symbol).first()
+        stock.last_trade_price = quote.last_trade_price
+        session.add(stock)
+    session.commit()
+    session.query(Stock).count()
+
+def batched(writer):
+    def write(session, quotes):
+        writer.write(session, quotes, ('last_trade_price',))
+        session.commit()
+    return write
+
+def measure(path, size, make_write):
+    session = make_session(path, size)
+    write = make_write(session)
+    best = None
+    for tick in range(ROUNDS):
+        quotes = make_quotes(size, tick)
+        start = timer()
+        write(session, quotes)
+        elapsed = timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    session.close()
+    session.bind.dispose()
+    os.remove(path)
+    return size / best
+
+def main():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'bench.db')
+    try:
+        print('{:>8} {:>16} {:>16} {:>8}'.format('symbols', 'per-symbol r/s', 'batched r/s', 'speedup'))
+        for size in SIZES:
+            old = measure(path, size, lambda session: per_symbol)
+            def make_batched(session):
+                writer = QuoteWriter()
+                writer.load(session)
+                return batched(writer)
+            new = measure(path, size, make_batched)
+            print('{:>8} {:>16.0f} {:>16.0f} {:>7.1f}x'.format(size, old, new, new / old))
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
@@ -8,12 +8,121 @@ SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, \
                             'db/{}.db'.format(SQLALCHEMY_DATABASE_NAME))
 SQLALCHEMY_MIGRATE_REPO = os.path.join(basedir, 'db_repository')
 SQLALCHEMY_ECHO = False
+# Database connections kept open for reuse, and how many more may be opened
+# while every one of them is in use by a thread's session.
+DB_POOL_SIZE = 5
+DB_POOL_OVERFLOW = 10
+# Compiled SQL statements and ORM queries kept for reuse, and prepared
+# statements kept by each SQLite connection.
+DB_STATEMENT_CACHE_SIZE = 100
 
 # Seconds to wait before polling new data to refresh the stocks database.
 UPDATE_INTERVAL = 5
 
+# Symbols are polled in tiers by how often their quotes change: seconds
+# between polls of each tier, and the share of recent polls with a change
+# that a symbol needs to be in the hot or warm tier.
+TIER_INTERVALS = {'hot': UPDATE_INTERVAL, 'warm': 3 * UPDATE_INTERVAL, 'cold': 12 * UPDATE_INTERVAL}
+TIER_THRESHOLDS = {'hot': 0.5, 'warm': 0.1}
+# Trading hours in the machine's local time, Monday to Friday. Outside of
+# them every tier is polled CLOSED_INTERVAL_FACTOR times less often.
+MARKET_OPEN = (9, 30)
+MARKET_CLOSE = (16, 0)
+CLOSED_INTERVAL_FACTOR = 12
+# Longest wait in seconds between polls of a tier whose polls keep failing.
+MAX_BACKOFF = 300
+
+# Maximum number of rows sent to the database in one executemany statement.
+WRITE_BATCH_SIZE = 500
+# Writes waiting for the writer thread before producers have to wait too,
+# and the most writes committed together in one transaction.
+WRITE_QUEUE_SIZE = 64
+WRITE_GROUP_SIZE = 32
+# Put SQLite databases in write-ahead log mode, so reads do not wait for
+# the writer thread's transactions (and it does not wait for them).
+SQLITE_WAL = True
+
+# Symbols per YQL request, concurrent requests, and the timeout (seconds)
+# and number of retries of each request.
+FETCH_SHARD_SIZE = 200
+FETCH_WORKERS = 4
+FETCH_TIMEOUT = 10
+FETCH_RETRIES = 2
+
+# Quotes a quote bus subscriber can fall behind by before the oldest are
+# dropped (or, for conflating subscribers, the least recently updated).
+SUBSCRIBER_QUEUE_SIZE = 10000
+# Local port on which other processes can subscribe to the quote bus and
+# receive newline-delimited JSON quotes; None disables it.
+BUS_PORT = None
+# Local port of the control socket of the headless mode (run.py --headless),
+# which takes ADD, REMOVE and STATUS commands; None disables it.
+CONTROL_PORT = 8766
+
+# Compute rolling statistics of every tick (see stream/analytics.py): the
+# windows of the simple moving averages and the spans of the exponential
+# ones, in ticks, and the number of ticks the volatility is taken over.
+ANALYTICS = True
+ANALYTICS_SMA_WINDOWS = (20, 50)
+ANALYTICS_EMA_SPANS = (12, 26)
+ANALYTICS_VOLATILITY_WINDOW = 20
+
+# Alert events a subscriber's queue holds before new ones are dropped.
+ALERT_QUEUE_SIZE = 1000
+
+# Port of the local HTTP endpoint serving metrics (/metrics and
+# /metrics.json) and the profiler's stacks (/profile); None disables it.
+METRICS_PORT = None
+
+# Seconds between the sampling profiler's stack samples; None leaves it off.
+PROFILE_INTERVAL = None
+
+# Lowest level of the log messages shown; each updated quote is logged at
+# DEBUG (run.py --verbose).
+LOG_LEVEL = 'INFO'
+
+# Worker processes that fetch and decode quotes, each owning a slice of
+# the watchlist, so polls use more than one core; 0 fetches in-process.
+WORKER_PROCESSES = 0
+
+# File of a table of the latest quotes that other processes on this host
+# map and read without locks or copies (see stream/shm.py), such as
+# '/dev/shm/stockstream.quotes'; None publishes none. It has rows for
+# SHARED_QUOTES_CAPACITY symbols.
+SHARED_QUOTES = None
+SHARED_QUOTES_CAPACITY = 20000
+
+# Latest quotes kept in memory for lookups and newly added symbols, and
+# the seconds each stays valid.
+QUOTE_CACHE_SIZE = 20000
+QUOTE_CACHE_TTL = 60
+
+# Where quotes come from: 'yahoo' polls STREAM_URL, 'file' tails QUOTE_FILE,
+# a CSV (under a header of quote property names) or NDJSON tick file.
+QUOTE_PROVIDER = 'yahoo'
+QUOTE_FILE = None
+# Symbols answered per batch by the 'file' provider.
+FILE_BATCH_SIZE = 1000
+
+# Rows per chunk of the archives written by run.py export, which bounds
+# the memory an export or import uses, and their zlib compression level
+# (1 writes ticks half again as fast as 6, for files 10% larger).
+ARCHIVE_CHUNK_SIZE = 65536
+ARCHIVE_COMPRESSION = 1
+
+# File that every raw quote response is appended to, for replaying with
+# python -m stream.replay; None records nothing.
+RECORD_RESPONSES = None
+
+# Keep every polled tick in day-partitioned ticks_YYYYMMDD tables.
+TICK_HISTORY = False
+# Days of tick history to keep; None keeps everything.
+TICK_RETENTION_DAYS = 30
+
 default_parameters = {
-    'DEBUG': False
+    'DEBUG': False,
+    'HEADLESS': False,
+    'VERBOSE': False
     }
 
 quote_properties = {
@@ -32,4 +141,12 @@ quote_properties = {
     'c6': 'ChangeRealtime',
     'c8': 'AfterHoursChangeRealtime',
     'd0': 'TrailingAnnualDividendYield',
-    }
\ No newline at end of file
+    'l1': 'LastTradePriceOnly',
+    's0': 'Symbol',
+    'v0': 'Volume',
+    }
+
+# Codes from quote_properties to request from YQL. Only these fields are
+# downloaded and decoded, and only the ones with a column in the stocks
+# table (l1, c1, v0, b0, a0) are stored.
+QUOTE_FIELDS = ['l1', 'c1', 'v0', 'b0', 'a0']
\ No newline at end of file
@@ -1,28 +1,103 @@
 #!/usr/bin/env python
 
 import sys
-from config import default_parameters
+import logging
+import argparse
+from datetime import datetime
+from config import default_parameters, LOG_LEVEL, ARCHIVE_CHUNK_SIZE
 from stream import Session
 
-def parse_args():
-    args = [sys.argv[i].lower() for i in range(len(sys.argv))]
-    if '--debug' in args:
-        default_parameters['DEBUG'] = True
-    return default_parameters
+COMMANDS = ('run', 'export', 'import')
+
+def to_day(text):
+    try:
+        return datetime.strptime(text, '%Y-%m-%d').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected a day as YYYY-MM-DD, got {}'.format(text))
+
+def parse_args(argv=None):
+    """
+    Parses the command line, where the command defaults to run, e.g.
+    run.py --debug, run.py export ticks ticks.stk --start 2016-03-01 or
+    run.py import watchlist symbols.txt.
+    """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] not in COMMANDS:
+        argv.insert(0, 'run')
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--verbose', action='store_true', help='log every updated quote')
+    parser = argparse.ArgumentParser(description='Stream stock quotes into a database.')
+    commands = parser.add_subparsers(dest='command')
+    run = commands.add_parser('run', parents=[common], help='stream quotes (the default)')
+    run.add_argument('--debug', action='store_true', help='run without the GUI, reading '
+                     'commands from standard input')
+    run.add_argument('--headless', action='store_true', help='run without the GUI, taking '
+                     'commands on the control socket')
+    export = commands.add_parser('export', parents=[common],
+                                 help='write a table to a compressed columnar archive')
+    export.add_argument('table', choices=('stocks', 'ticks'))
+    export.add_argument('file')
+    export.add_argument('--start', type=to_day, help='first day of ticks (default: today)')
+    export.add_argument('--end', type=to_day, help='last day of ticks (default: the start)')
+    export.add_argument('--chunk-size', type=int, default=ARCHIVE_CHUNK_SIZE,
+                        help='rows per chunk')
+    load = commands.add_parser('import', parents=[common], help='load an archive, or add '
+                               'the symbols of a watchlist file to the database')
+    load.add_argument('table', choices=('stocks', 'ticks', 'watchlist'))
+    load.add_argument('file')
+    args = parser.parse_args(argv)
+    default_parameters['DEBUG'] = getattr(args, 'debug', False)
+    default_parameters['HEADLESS'] = getattr(args, 'headless', False)
+    default_parameters['VERBOSE'] = args.verbose
+    return args
+
+def transfer(args):
+    """
+    Runs an export or import command in one transaction.
+    """
+    from stream import archive
+    session = Session()
+    try:
+        if args.command == 'export' and args.table == 'stocks':
+            count = archive.export_stocks(session, args.file, args.chunk_size)
+        elif args.command == 'export':
+            start = args.start if args.start is not None else datetime.utcnow().date()
+            count = archive.export_ticks(session, args.file, start, args.end, args.chunk_size)
+        elif args.table == 'stocks':
+            count = archive.import_stocks(session, args.file)
+        elif args.table == 'ticks':
+            count = archive.import_ticks(session, args.file)
+        else:
+            count = len(archive.import_watchlist(session, args.file))
+        session.commit()
+    except:
+        session.rollback()
+        raise
+    finally:
+        Session.remove()
+    logging.info('%sed %d %s.', args.command.capitalize(), count,
+                 'new symbols' if args.table == 'watchlist' else args.table)
 
 def main():
     args = parse_args()
-    if args['DEBUG']:
+    logging.basicConfig(level='DEBUG' if args.verbose else LOG_LEVEL,
+                        format='%(asctime)s %(levelname)s %(message)s')
+    if args.command != 'run':
+        transfer(args)
+    elif args.headless:
+        from stream.daemon import run_headless
+        run_headless()
+    elif args.debug:
         from stream.process import Streamer
-        from stream.util import join_threads
         streamer = Streamer()
-        streamer.run(args['DEBUG'])
+        streamer.run(args.debug)
         try:
-            join_threads(streamer.threads)
+            streamer.join()
         except KeyboardInterrupt:
             print("\nKeyboardInterrupt caught.")
-            print("Terminate main thread.")
-            print("If only daemonic threads are left, terminate whole program.")
+            print("Finishing the poll in progress, then terminating.")
+            streamer.stop()
+            streamer.join()
         finally:
             Session.remove()
     else:
@@ -32,4 +107,4 @@ def main():
         sys.exit(app.exec_())
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
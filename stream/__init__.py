@@ -1,6 +1,56 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.ext import baked
 from sqlalchemy.orm import scoped_session, sessionmaker
-from config import SQLALCHEMY_DATABASE_URI, SQLALCHEMY_ECHO
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.util import LRUCache
+from config import SQLALCHEMY_DATABASE_URI, SQLALCHEMY_ECHO, SQLITE_WAL, DB_POOL_SIZE, \
+    DB_POOL_OVERFLOW, DB_STATEMENT_CACHE_SIZE
 
-db_engine = create_engine(SQLALCHEMY_DATABASE_URI, echo=SQLALCHEMY_ECHO)
-Session = scoped_session(sessionmaker(bind=db_engine))
\ No newline at end of file
+def enable_wal(engine):
+    """
+    Switches each new connection of a SQLite engine to write-ahead
+    logging, with fsyncs only at checkpoints, which is still safe
+    against corruption in WAL mode.
+    """
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(connection, record):
+        cursor = connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+def make_engine(uri=SQLALCHEMY_DATABASE_URI, pool_size=DB_POOL_SIZE, max_overflow=DB_POOL_OVERFLOW,
+                statement_cache_size=DB_STATEMENT_CACHE_SIZE, echo=SQLALCHEMY_ECHO):
+    """
+    Creates an engine whose connections stay open in a pool of pool_size
+    (plus max_overflow more while every one is in use). A thread holds a
+    connection while its session has one open, and hands it back when
+    the session is closed, so sessions cost a checkout rather than a new
+    connection. The SQL compiled for up to statement_cache_size
+    statements is kept, and so are as many prepared statements per SQLite
+    connection.
+    """
+    url = make_url(uri)
+    options = {'pool_size': pool_size, 'max_overflow': max_overflow}
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            # One connection per thread, since each would be its own database.
+            options = {}
+        else:
+            # SQLAlchemy opens a new SQLite connection (and runs the pragmas)
+            # on every checkout unless a pool is asked for. A connection is
+            # used by one thread at a time, though not always the same one.
+            options['poolclass'] = QueuePool
+            options['connect_args'] = {'check_same_thread': False,
+                                       'cached_statements': statement_cache_size}
+    engine = create_engine(url, echo=echo, **options)
+    if SQLITE_WAL and engine.dialect.name == 'sqlite':
+        enable_wal(engine)
+    return engine.execution_options(compiled_cache=LRUCache(statement_cache_size))
+
+db_engine = make_engine()
+Session = scoped_session(sessionmaker(bind=db_engine))
+# Caches the SQL of ORM queries built through it, such as the ones run on
+# every add or lookup, so that they are only compiled once.
+bakery = baked.bakery(DB_STATEMENT_CACHE_SIZE)
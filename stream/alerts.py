@@ -0,0 +1,247 @@
+import Queue
+from bisect import bisect_left, bisect_right
+from config import ALERT_QUEUE_SIZE
+from models import AlertRule
+
+
+
+alert_rules_table = AlertRule.__table__
+
+# Fields a rule can watch: Quote attributes, or statistics in quote.stats.
+FIELDS = ('last_trade_price', 'change', 'pct_change', 'volume', 'bid', 'ask')
+DIRECTIONS = ('up', 'down', 'either')
+
+class Rule(object):
+    """
+    In-memory copy of an AlertRule row.
+    """
+
+    __slots__ = ('id', 'symbol', 'field', 'direction', 'threshold', 'once')
+
+    def __init__(self, id, symbol, field, direction, threshold, once=False):
+        self.id = id
+        self.symbol = symbol
+        self.field = field
+        self.direction = direction
+        self.threshold = threshold
+        self.once = once
+
+class AlertEvent(object):
+    """
+    A rule that fired: its field went from previous to value, crossing
+    the rule's threshold, in the quote retrieved at the given time.
+    """
+
+    __slots__ = ('rule', 'previous', 'value', 'at')
+
+    def __init__(self, rule, previous, value, at):
+        self.rule = rule
+        self.previous = previous
+        self.value = value
+        self.at = at
+
+    def __str__(self):
+        return '{} {} crossed {} {}: {} -> {}'.format(
+            self.rule.symbol, self.rule.field, 'above' if self.value > self.previous else 'below',
+            self.rule.threshold, self.previous, self.value)
+
+class Ladder(object):
+    """
+    The rules of one symbol, field and direction, sorted by threshold,
+    so the rules a move crosses are found with two bisections: going up
+    from previous to value crosses previous < threshold <= value, going
+    down crosses value <= threshold < previous.
+    """
+
+    __slots__ = ('thresholds', 'rules')
+
+    def __init__(self):
+        self.thresholds = []
+        self.rules = []
+
+    def add(self, rule):
+        i = bisect_right(self.thresholds, rule.threshold)
+        self.thresholds.insert(i, rule.threshold)
+        self.rules.insert(i, rule)
+
+    def remove(self, rule):
+        i = bisect_left(self.thresholds, rule.threshold)
+        while self.rules[i] is not rule:
+            i += 1
+        del self.thresholds[i]
+        del self.rules[i]
+
+class Crossings(object):
+    """
+    The ladders of one symbol and field, and the field's last value.
+    """
+
+    __slots__ = ('field', 'up', 'down', 'last')
+
+    def __init__(self, field):
+        self.field = field
+        self.up = Ladder()
+        self.down = Ladder()
+        self.last = None
+
+class AlertEngine(object):
+    """
+    Threshold alerts on the Streamer's ticks. Rules are indexed by symbol
+    and field in threshold-sorted ladders, so a tick only costs a lookup
+    for symbols without rules, and two bisections per watched field plus
+    the rules it actually crosses otherwise. A rule fires when its field
+    moves across the threshold between two ticks; the first tick of a
+    symbol only sets the starting value.
+
+    Events go to every callback registered with listen(), on the update
+    thread, and to every queue handed out by subscribe(); queues that are
+    full drop the event and count it in dropped.
+    """
+
+    def __init__(self, queue_size=ALERT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.index = {}
+        self.rules = {}
+        self.callbacks = []
+        self.queues = []
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.rules)
+
+    def load(self, session):
+        """
+        Indexes the enabled rules stored in the database.
+        """
+        table = alert_rules_table
+        query = table.select().with_only_columns(
+            [table.c.id, table.c.symbol, table.c.field, table.c.direction,
+             table.c.threshold, table.c.once]).where(table.c.enabled == True)
+        for row in session.execute(query):
+            self.add(Rule(*row))
+
+    def add(self, rule):
+        # Each symbol maps to a list of the Crossings of its fields.
+        watched = self.index.setdefault(rule.symbol, [])
+        for crossings in watched:
+            if crossings.field == rule.field:
+                break
+        else:
+            crossings = Crossings(rule.field)
+            watched.append(crossings)
+        if rule.direction in ('up', 'either'):
+            crossings.up.add(rule)
+        if rule.direction in ('down', 'either'):
+            crossings.down.add(rule)
+        self.rules[rule.id] = rule
+
+    def remove(self, rule_id):
+        """
+        @return the removed Rule, or None if there was none with that id.
+        """
+        rule = self.rules.pop(rule_id, None)
+        if rule is None:
+            return None
+        watched = self.index[rule.symbol]
+        crossings, = [crossings for crossings in watched if crossings.field == rule.field]
+        if rule.direction in ('up', 'either'):
+            crossings.up.remove(rule)
+        if rule.direction in ('down', 'either'):
+            crossings.down.remove(rule)
+        if not crossings.up.rules and not crossings.down.rules:
+            watched.remove(crossings)
+            if not watched:
+                del self.index[rule.symbol]
+        return rule
+
+    def check(self, quotes):
+        """
+        Evaluates the rules the quotes can trigger, and sends out the
+        events. Rules that fire once are removed from the index; the
+        caller disables them in the database.
+
+        @quotes a list of Quote records, at most one per symbol.
+        @return a list of AlertEvent.
+        """
+        events = []
+        index = self.index
+        # The bisections are inlined: this runs for every changed quote.
+        for quote in quotes:
+            watched = index.get(quote.symbol)
+            if watched is None:
+                continue
+            for crossings in watched:
+                value = getattr(quote, crossings.field, None)
+                if value is None and quote.stats is not None:
+                    value = quote.stats.get(crossings.field)
+                if value is None:
+                    continue
+                previous = crossings.last
+                crossings.last = value
+                if previous is None or value == previous:
+                    continue
+                if value > previous:
+                    ladder = crossings.up
+                    thresholds = ladder.thresholds
+                    start = bisect_right(thresholds, previous)
+                    end = bisect_right(thresholds, value)
+                else:
+                    ladder = crossings.down
+                    thresholds = ladder.thresholds
+                    start = bisect_left(thresholds, value)
+                    end = bisect_left(thresholds, previous)
+                if start != end:
+                    for rule in ladder.rules[start:end]:
+                        events.append(AlertEvent(rule, previous, value, quote.updated_at))
+        for event in events:
+            if event.rule.once:
+                self.remove(event.rule.id)
+        if events:
+            self.publish(events)
+        return events
+
+    def listen(self, callback):
+        """
+        @callback called with each list of events, on the update thread,
+            so it must only hand them off.
+        """
+        self.callbacks.append(callback)
+
+    def subscribe(self, maxsize=None):
+        """
+        @return a Queue.Queue that receives every AlertEvent.
+        """
+        queue = Queue.Queue(self.queue_size if maxsize is None else maxsize)
+        self.queues.append(queue)
+        return queue
+
+    def publish(self, events):
+        for callback in self.callbacks:
+            callback(events)
+        for queue in self.queues:
+            for event in events:
+                try:
+                    queue.put_nowait(event)
+                except Queue.Full:
+                    self.dropped += 1
+
+    def insert(self, session, rule):
+        """
+        Stores a new rule and sets its id. Runs as a writer thread job.
+        """
+        result = session.execute(alert_rules_table.insert(), {
+            'symbol': rule.symbol, 'field': rule.field, 'direction': rule.direction,
+            'threshold': rule.threshold, 'once': rule.once, 'enabled': True})
+        rule.id = result.inserted_primary_key[0]
+        return rule.id
+
+    def delete(self, session, rule_id):
+        session.execute(alert_rules_table.delete().where(alert_rules_table.c.id == rule_id))
+
+    def disable(self, session, rule_ids, fired_at):
+        """
+        Marks rules that fired once as disabled. Runs as a writer thread job.
+        """
+        table = alert_rules_table
+        session.execute(table.update().where(table.c.id.in_(rule_ids)),
+                        {'enabled': False, 'fired_at': fired_at})
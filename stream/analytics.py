@@ -0,0 +1,192 @@
+import time
+from datetime import date
+import numpy as np
+from config import ANALYTICS_SMA_WINDOWS, ANALYTICS_EMA_SPANS, ANALYTICS_VOLATILITY_WINDOW
+from slots import SymbolSlots, grow
+
+
+
+class Analytics(object):
+    """
+    Rolling per-symbol statistics, updated incrementally on every tick (a
+    quote whose price differs from the symbol's last one). Each symbol has a row in NumPy arrays
+    holding a ring buffer of its last prices and the running sums over
+    them, so a tick costs the same however many symbols are followed,
+    and a whole batch of quotes is updated with a few vectorized
+    operations.
+
+    The statistics of each quote are attached to it as quote.stats:
+    change and pct_change from the previous close (or, when the quote
+    has no change, from the session's first price), sma_N and ema_N for
+    each configured window and span, the volatility (standard deviation
+    of log returns) over the last volatility_window ticks, and the
+    session's high and low. Statistics without enough ticks yet are None.
+    A quote without a change gets the computed one. The session resets
+    with the local date.
+    """
+
+    def __init__(self, sma_windows=ANALYTICS_SMA_WINDOWS, ema_spans=ANALYTICS_EMA_SPANS,
+                 volatility_window=ANALYTICS_VOLATILITY_WINDOW, capacity=1024, clock=time.time):
+        self.sma_windows = np.array(sma_windows, dtype=np.intp)
+        self.ema_alphas = 2.0 / (np.array(ema_spans, dtype=np.float64) + 1)
+        self.volatility_window = volatility_window
+        self.clock = clock
+        self.names = (['change', 'pct_change'] +
+                      ['sma_{}'.format(window) for window in sma_windows] +
+                      ['ema_{}'.format(span) for span in ema_spans] +
+                      ['volatility', 'high', 'low'])
+        # The ring keeps one price more than the volatility window, for
+        # the return that leaves the window.
+        self.length = max(list(sma_windows) + [volatility_window + 1])
+        self.session = None
+        self.slots = SymbolSlots(capacity)
+        nan = np.nan
+        self.prices = np.full((capacity, self.length), nan)
+        self.head = np.zeros(capacity, dtype=np.intp)
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.sums = np.zeros((capacity, len(sma_windows)))
+        self.emas = np.full((capacity, len(ema_spans)), nan)
+        self.return_sum = np.zeros(capacity)
+        self.return_squares = np.zeros(capacity)
+        self.last = np.full(capacity, nan)
+        self.reference = np.full(capacity, nan)
+        self.high = np.full(capacity, nan)
+        self.low = np.full(capacity, nan)
+
+    def update(self, quotes):
+        """
+        Adds the ticks of a batch of quotes and attaches each quote's
+        statistics. Quotes without a price are skipped.
+
+        @quotes a list of Quote records, at most one per symbol.
+        """
+        session = date.fromtimestamp(self.clock())
+        if session != self.session:
+            self.reset_session()
+            self.session = session
+        quotes = [quote for quote in quotes
+                  if quote.last_trade_price is not None and quote.last_trade_price > 0]
+        if not quotes:
+            return
+        rows, fresh = self.slots.assign([quote.symbol for quote in quotes])
+        if self.slots.capacity > len(self.last):
+            self.grow(self.slots.capacity)
+        if fresh:
+            self.reset(fresh)
+        n = len(quotes)
+        price = np.fromiter((quote.last_trade_price for quote in quotes), np.float64, n)
+        change = np.fromiter((np.nan if quote.change is None else quote.change
+                              for quote in quotes), np.float64, n)
+
+        # Only a new price is a tick; a quote whose volume or bid/ask
+        # changed gets the statistics as they stand.
+        moved = ~(price == self.last[rows])
+        self.add_ticks(rows[moved], price[moved])
+
+        # The previous close, or the session's first price.
+        reference = self.reference[rows]
+        unset = np.isnan(reference)
+        reference[unset] = np.where(np.isnan(change[unset]), price[unset],
+                                    price[unset] - change[unset])
+        self.reference[rows] = reference
+        self.high[rows] = np.fmax(self.high[rows], price)
+        self.low[rows] = np.fmin(self.low[rows], price)
+        self.last[rows] = price
+
+        windows = self.sma_windows
+        window = self.volatility_window
+        seen = self.count[rows]
+        changes = price - reference
+        smas = np.where(seen[:, None] >= windows, self.sums[rows] / windows, np.nan)
+        samples = np.minimum(seen - 1, window)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.return_sum[rows] / samples
+            variance = (self.return_squares[rows] - mean * self.return_sum[rows]) / (samples - 1)
+            volatility = np.where(samples >= 2, np.sqrt(np.maximum(variance, 0.0)), np.nan)
+            table = np.column_stack([changes, changes / reference * 100, smas, self.emas[rows],
+                                     volatility, self.high[rows], self.low[rows]])
+        names = self.names
+        for quote, values in zip(quotes, table.tolist()):
+            quote.stats = dict(zip(names, [None if value != value else value
+                                           for value in values]))
+            if quote.change is None:
+                quote.change = quote.stats['change']
+
+    def add_ticks(self, rows, price):
+        """
+        Pushes a new price into the rings and running sums of each row.
+        """
+        n = len(rows)
+        length = self.length
+        pos = self.head[rows]
+        seen = self.count[rows]
+        ring = self.prices
+
+        # Simple moving averages: add the new price, drop the one that
+        # leaves each window once it is full.
+        windows = self.sma_windows
+        leaving = ring[rows[:, None], (pos[:, None] - windows) % length]
+        leaving[seen[:, None] < windows] = 0.0
+        self.sums[rows] += price[:, None] - leaving
+
+        # Log returns over the volatility window, likewise.
+        window = self.volatility_window
+        previous = self.last[rows]
+        returns = np.log(price / previous)
+        returns[seen == 0] = 0.0
+        full = seen > window
+        old = np.zeros(n)
+        if full.any():
+            full_rows, full_pos = rows[full], pos[full]
+            old[full] = np.log(ring[full_rows, (full_pos - window) % length] /
+                               ring[full_rows, (full_pos - window - 1) % length])
+        self.return_sum[rows] += returns - old
+        self.return_squares[rows] += returns * returns - old * old
+
+        ring[rows, pos] = price
+        self.head[rows] = (pos + 1) % length
+        seen = seen + 1
+        self.count[rows] = seen
+
+        emas = self.emas[rows]
+        emas += self.ema_alphas * (price[:, None] - emas)
+        emas[seen == 1] = price[seen == 1, None]
+        self.emas[rows] = emas
+
+    def remove(self, symbols):
+        """
+        Forgets the symbols; their rows are reset when reused.
+        """
+        self.slots.release(symbols)
+
+    def reset_session(self):
+        self.reference.fill(np.nan)
+        self.high.fill(np.nan)
+        self.low.fill(np.nan)
+
+    def reset(self, rows):
+        self.prices[rows] = np.nan
+        self.head[rows] = 0
+        self.count[rows] = 0
+        self.sums[rows] = 0.0
+        self.emas[rows] = np.nan
+        self.return_sum[rows] = 0.0
+        self.return_squares[rows] = 0.0
+        self.last[rows] = np.nan
+        self.reference[rows] = np.nan
+        self.high[rows] = np.nan
+        self.low[rows] = np.nan
+
+    def grow(self, capacity):
+        nan = np.nan
+        self.prices = grow(self.prices, capacity, nan)
+        self.head = grow(self.head, capacity, 0)
+        self.count = grow(self.count, capacity, 0)
+        self.sums = grow(self.sums, capacity, 0.0)
+        self.emas = grow(self.emas, capacity, nan)
+        self.return_sum = grow(self.return_sum, capacity, 0.0)
+        self.return_squares = grow(self.return_squares, capacity, 0.0)
+        self.last = grow(self.last, capacity, nan)
+        self.reference = grow(self.reference, capacity, nan)
+        self.high = grow(self.high, capacity, nan)
+        self.low = grow(self.low, capacity, nan)
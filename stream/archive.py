@@ -0,0 +1,291 @@
+import json
+import struct
+import zlib
+from collections import OrderedDict
+from datetime import date, timedelta
+import numpy as np
+from sqlalchemy import select
+from config import ARCHIVE_CHUNK_SIZE, ARCHIVE_COMPRESSION
+from models import Stock, tick_partition
+from history import TickHistory, to_millis, from_millis
+from quote import Quote
+from writer import QuoteWriter
+
+
+
+MAGIC = 'STKCOLS1'
+LENGTH = struct.Struct('<I')
+# Stands for a missing value in integer columns.
+NULL_INT = np.iinfo(np.int64).min
+MILLIS_PER_DAY = 86400000
+
+# Columns of each table kept in archives, with their kinds: 'sym' strings
+# are stored once per chunk with an int32 code per row, 'f8' floats with
+# NaN for NULL, 'i8' integers with NULL_INT for NULL, and 'ms' times in
+# milliseconds as the differences between consecutive values.
+STOCK_COLUMNS = (('symbol', 'sym'), ('last_trade_price', 'f8'), ('change', 'f8'),
+                 ('volume', 'i8'), ('bid', 'f8'), ('ask', 'f8'), ('updated_at', 'ms'))
+TICK_COLUMNS = (('symbol', 'sym'), ('ts', 'ms'), ('price', 'f8'), ('volume', 'i8'))
+
+def encode(kind, values):
+    """
+    @return the bytes of a column of values, before compression.
+    """
+    if kind == 'sym':
+        symbols, codes = np.unique(np.array(values, dtype=object), return_inverse=True)
+        symbols = '\n'.join(symbols)
+        return LENGTH.pack(len(symbols)) + symbols + codes.astype('<i4').tostring()
+    if kind == 'f8':
+        return np.array(values, dtype='<f8').tostring()
+    values = np.array([NULL_INT if value is None else value for value in values], dtype='<i8')
+    if kind == 'ms':
+        # Wraps around like the cumulative sum that undoes it.
+        values[1:] = np.diff(values)
+    return values.tostring()
+
+def decode(kind, data):
+    """
+    @return the column encoded in data, as a NumPy array.
+    """
+    if kind == 'sym':
+        length, = LENGTH.unpack_from(data)
+        symbols = np.array(data[LENGTH.size:LENGTH.size + length].split('\n'), dtype=object)
+        return symbols[np.frombuffer(data, '<i4', offset=LENGTH.size + length)]
+    if kind == 'f8':
+        return np.frombuffer(data, '<f8')
+    values = np.frombuffer(data, '<i8')
+    return np.cumsum(values, dtype='<i8') if kind == 'ms' else values
+
+def to_python(kind, column):
+    """
+    @return a list of the column's values, with None for NULL.
+    """
+    values = column.tolist()
+    if kind == 'f8':
+        return [None if value != value else value for value in values]
+    if kind in ('i8', 'ms'):
+        return [None if value == NULL_INT else value for value in values]
+    return values
+
+class ArchiveWriter(object):
+    """
+    Writes a table to a compressed columnar file in chunks of rows. Each
+    chunk holds every column of its rows, compressed separately with zlib,
+    so only one chunk is ever in memory. The file starts with a JSON
+    header naming the table and its columns and their kinds.
+    """
+
+    def __init__(self, path, table, columns, level=ARCHIVE_COMPRESSION):
+        self.columns = tuple(columns)
+        self.level = level
+        self.rows = 0
+        self.file = open(path, 'wb')
+        header = json.dumps({'table': table, 'columns': self.columns})
+        self.file.write(MAGIC + LENGTH.pack(len(header)) + header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, columns):
+        """
+        @columns a sequence of values per column, in the writer's order,
+            all of the same length.
+        """
+        count = len(columns[0])
+        if not count:
+            return
+        parts = [LENGTH.pack(count)]
+        for (name, kind), values in zip(self.columns, columns):
+            data = zlib.compress(encode(kind, values), self.level)
+            parts.append(LENGTH.pack(len(data)))
+            parts.append(data)
+        self.file.write(''.join(parts))
+        self.rows += count
+
+    def close(self):
+        self.file.close()
+
+class ArchiveReader(object):
+    """
+    Reads a file written by an ArchiveWriter one chunk at a time.
+    Iterating over it yields an OrderedDict of each chunk's columns as
+    NumPy arrays.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        if self.file.read(len(MAGIC)) != MAGIC:
+            self.file.close()
+            raise ValueError('{} is not a quote archive.'.format(path))
+        length, = LENGTH.unpack(self.file.read(LENGTH.size))
+        header = json.loads(self.file.read(length))
+        self.table = header['table']
+        self.columns = tuple((str(name), str(kind)) for name, kind in header['columns'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iter__(self):
+        while True:
+            count = self.file.read(LENGTH.size)
+            if not count:
+                return
+            chunk = OrderedDict()
+            for name, kind in self.columns:
+                length, = LENGTH.unpack(self.file.read(LENGTH.size))
+                chunk[name] = decode(kind, zlib.decompress(self.file.read(length)))
+            yield chunk
+
+    def close(self):
+        self.file.close()
+
+def export_stocks(session, path, chunk_size=ARCHIVE_CHUNK_SIZE):
+    """
+    Writes the stocks table to an archive.
+
+    @return the number of stocks written.
+    """
+    stocks = Stock.__table__
+    result = session.execute(select([stocks.c[name] for name, kind in STOCK_COLUMNS]))
+    with ArchiveWriter(path, 'stocks', STOCK_COLUMNS) as archive:
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows:
+                break
+            columns = [list(column) for column in zip(*rows)]
+            columns[-1] = [None if moment is None else to_millis(moment) for moment in columns[-1]]
+            archive.write(columns)
+    return archive.rows
+
+def export_ticks(session, path, start, end=None, chunk_size=ARCHIVE_CHUNK_SIZE):
+    """
+    Writes the tick history of the days from start to end, by default
+    just start, to an archive, partition by partition, each ordered by
+    symbol and time. Ticks of symbols that are no longer in the stocks
+    table are left out.
+
+    @start, @end datetime.dates.
+    @return the number of ticks written.
+    """
+    end = start if end is None else end
+    symbol_of = dict((row_id, str(symbol)) for row_id, symbol in
+                     session.query(Stock.id, Stock.symbol))
+    days = [day for day in TickHistory().partitions(session) if start <= day <= end]
+    with ArchiveWriter(path, 'ticks', TICK_COLUMNS) as archive:
+        for day in days:
+            # Plain tuples from the driver's own cursor, which take half as
+            # long to fetch as result rows.
+            cursor = session.connection().connection.cursor()
+            cursor.execute('SELECT symbol_id, ts, price, volume FROM {} '
+                           'ORDER BY symbol_id, ts'.format(tick_partition(day).name))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                rows = [row for row in rows if row[0] in symbol_of]
+                if rows:
+                    symbol_ids, ts, prices, volumes = zip(*rows)
+                    archive.write(([symbol_of[symbol_id] for symbol_id in symbol_ids],
+                                   ts, prices, volumes))
+            cursor.close()
+    return archive.rows
+
+def check_table(archive, table):
+    if archive.table != table:
+        raise ValueError('The archive holds {}, not {}.'.format(archive.table, table))
+
+def import_stocks(session, path):
+    """
+    Loads an archive of the stocks table, adding the symbols that are not
+    stored yet and overwriting the values of the others. The caller
+    commits.
+
+    @return the number of stocks loaded.
+    """
+    writer = QuoteWriter()
+    writer.load(session)
+    columns = [name for name, kind in STOCK_COLUMNS[1:]]
+    loaded = 0
+    with ArchiveReader(path) as archive:
+        check_table(archive, 'stocks')
+        for chunk in archive:
+            values = [to_python(kind, chunk[name]) for name, kind in archive.columns]
+            values[-1] = [None if millis is None else from_millis(millis) for millis in values[-1]]
+            quotes = [Quote(*row) for row in zip(*values)]
+            writer.write(session, quotes, columns)
+            loaded += len(quotes)
+    return loaded
+
+def import_ticks(session, path, history=None):
+    """
+    Loads an archive of ticks into the tick history, adding the symbols
+    that are not stored yet to the stocks table. Ticks replace the ones
+    of the same symbol and millisecond. The caller commits.
+
+    @history the TickHistory to load into; by default one that drops no
+        partitions, however old the ticks.
+    @return the number of ticks loaded.
+    """
+    history = history if history is not None else TickHistory()
+    writer = QuoteWriter()
+    writer.load(session)
+    loaded = 0
+    with ArchiveReader(path) as archive:
+        check_table(archive, 'ticks')
+        for chunk in archive:
+            unique, codes = np.unique(chunk['symbol'], return_inverse=True)
+            missing = [symbol for symbol in unique if symbol not in writer.row_ids]
+            if missing:
+                writer.resolve(session, missing)
+            symbol_ids = np.array([writer.row_ids[symbol] for symbol in unique])[codes]
+            ts = chunk['ts']
+            days = ts // MILLIS_PER_DAY
+            for day in np.unique(days):
+                rows = days == day
+                history.insert(session, date(1970, 1, 1) + timedelta(days=int(day)),
+                               zip(symbol_ids[rows].tolist(), ts[rows].tolist(),
+                                   to_python('f8', chunk['price'][rows]),
+                                   to_python('i8', chunk['volume'][rows])))
+            loaded += len(ts)
+    return loaded
+
+def read_watchlist(path):
+    """
+    Reads a watchlist file: one symbol per line, or a CSV whose first
+    column is the symbol, optionally under a 'symbol' header. Blank lines
+    and lines starting with '#' are skipped.
+
+    @return the symbols, upper-cased, each once, in file order.
+    """
+    symbols = OrderedDict()
+    with open(path) as watchlist:
+        for line in watchlist:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            # The first field may be empty, as in ',x'.
+            field = line.split(',')[0].split()
+            symbol = field[0].strip('"\'').upper() if field else ''
+            if symbol and symbol != 'SYMBOL':
+                symbols[symbol] = None
+    return list(symbols)
+
+def import_watchlist(session, path):
+    """
+    Adds the symbols of a watchlist file to the stocks table, in batches,
+    so that the Streamer polls them from its next start. The caller
+    commits.
+
+    @return the symbols that were not stored yet.
+    """
+    writer = QuoteWriter()
+    writer.load(session)
+    missing = [symbol for symbol in read_watchlist(path) if symbol not in writer.row_ids]
+    writer.resolve(session, missing)
+    return missing
@@ -0,0 +1,179 @@
+import json
+import socket
+import threading
+import SocketServer
+from collections import deque, OrderedDict
+from config import SUBSCRIBER_QUEUE_SIZE
+
+
+
+POLICIES = ('conflate', 'drop')
+
+class Subscription(object):
+    """
+    A subscriber's bounded queue of quotes. Publishing never blocks: with
+    the 'conflate' policy only the latest quote of each symbol is kept,
+    and with 'drop' the oldest quotes are discarded once maxsize quotes
+    are waiting. Either way dropped counts what was lost. maxsize None
+    leaves a conflating queue bounded by the number of symbols only.
+    """
+
+    def __init__(self, bus, symbols=None, maxsize=SUBSCRIBER_QUEUE_SIZE, policy='conflate'):
+        if policy not in POLICIES:
+            raise ValueError('Unknown policy {}, expected one of {}.'.format(policy, POLICIES))
+        if maxsize is None and policy == 'drop':
+            raise ValueError("The 'drop' policy needs a maxsize.")
+        self.bus = bus
+        self.symbols = frozenset(symbols) if symbols is not None else None
+        self.maxsize = maxsize
+        self.policy = policy
+        self.pending = OrderedDict() if policy == 'conflate' else deque()
+        self.dropped = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def put(self, quotes):
+        """
+        Queues the quotes this subscription is interested in. Called by
+        the bus on the publishing thread.
+        """
+        if self.symbols is not None:
+            quotes = [quote for quote in quotes if quote.symbol in self.symbols]
+            if not quotes:
+                return
+        with self.condition:
+            pending = self.pending
+            if self.policy == 'conflate':
+                for quote in quotes:
+                    pending.pop(quote.symbol, None)
+                    pending[quote.symbol] = quote
+                while self.maxsize is not None and len(pending) > self.maxsize:
+                    pending.popitem(last=False)
+                    self.dropped += 1
+            else:
+                for quote in quotes:
+                    if len(pending) >= self.maxsize:
+                        pending.popleft()
+                        self.dropped += 1
+                    pending.append(quote)
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """
+        Waits for quotes and takes everything that is queued.
+
+        @timeout seconds to wait; 0 only checks, None waits until quotes
+            arrive or the subscription is closed.
+        @return a list of Quote records, empty on timeout.
+        """
+        with self.condition:
+            if not self.pending and not self.closed and timeout != 0:
+                self.condition.wait(timeout)
+            if self.policy == 'conflate':
+                quotes = self.pending.values()
+                self.pending = OrderedDict()
+            else:
+                quotes = list(self.pending)
+                self.pending.clear()
+        return quotes
+
+    def qsize(self):
+        return len(self.pending)
+
+    def close(self):
+        """
+        Unsubscribes from the bus and wakes up a waiting get().
+        """
+        self.bus.unsubscribe(self)
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+class QuoteBus(object):
+    """
+    Fans out each batch of changed quotes to every subscriber, so many
+    consumers can share one Streamer's fetches.
+    """
+
+    def __init__(self):
+        self.subscriptions = []
+        self.lock = threading.Lock()
+
+    def subscribe(self, symbols=None, maxsize=SUBSCRIBER_QUEUE_SIZE, policy='conflate'):
+        """
+        @symbols the symbols to receive, or None for all of them.
+        @return a Subscription to get() the quotes from.
+        """
+        subscription = Subscription(self, symbols, maxsize, policy)
+        with self.lock:
+            self.subscriptions = self.subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions = [other for other in self.subscriptions
+                                  if other is not subscription]
+
+    def publish(self, quotes):
+        # Subscribing swaps in a new list, so iterating needs no lock.
+        for subscription in self.subscriptions:
+            subscription.put(quotes)
+
+
+
+class SubscriberHandler(SocketServer.StreamRequestHandler):
+    """
+    Serves one socket subscriber. The client may send a first line of
+    'SUBSCRIBE [SYMBOL ...]' (no symbols, or an empty line, means all of
+    them) and then receives one JSON object per quote and line.
+    """
+
+    def handle(self):
+        words = self.rfile.readline().upper().split()
+        symbols = words[1:] if words[:1] == ['SUBSCRIBE'] and words[1:] else None
+        subscription = self.server.bus.subscribe(symbols)
+        try:
+            while not self.server.stopping:
+                quotes = subscription.get(timeout=1)
+                if quotes:
+                    self.wfile.write(''.join(json.dumps(quote.as_dict()) + '\n'
+                                             for quote in quotes))
+                    self.wfile.flush()
+        except socket.error:
+            pass
+        finally:
+            subscription.close()
+
+class BusServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    """
+    Local socket front end of a QuoteBus, for consumers in other
+    processes. Only listens on the loopback interface.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, bus, port):
+        SocketServer.TCPServer.__init__(self, ('127.0.0.1', port), SubscriberHandler)
+        self.bus = bus
+        self.stopping = False
+
+    def stop(self):
+        self.stopping = True
+        self.shutdown()
+        self.server_close()
+
+def listen(port, symbols=None):
+    """
+    Connects to a BusServer and yields the quotes it sends, as dicts.
+
+    @port the port the BusServer listens on.
+    @symbols the symbols to receive, or None for all of them.
+    """
+    connection = socket.create_connection(('127.0.0.1', port))
+    try:
+        connection.sendall('SUBSCRIBE {}\n'.format(' '.join(symbols or [])))
+        for line in connection.makefile('r'):
+            yield json.loads(line)
+    finally:
+        connection.close()
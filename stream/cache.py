@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import OrderedDict
+from config import QUOTE_CACHE_SIZE, QUOTE_CACHE_TTL
+from metrics import registry
+
+
+
+hits = registry.counter('cache.hits')
+misses = registry.counter('cache.misses')
+evictions = registry.counter('cache.evictions')
+
+class Loading(object):
+    """
+    A load in flight, which other readers of its symbols wait for instead
+    of loading them again.
+    """
+
+    __slots__ = ('done', 'quotes', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.quotes = {}
+        self.error = None
+
+class QuoteCache(object):
+    """
+    Bounded read-through cache of the latest Quote of each symbol. Entries
+    expire ttl seconds after they were stored, and once maxsize are held
+    the least recently used one is evicted. A miss calls loader(symbols)
+    for every missing symbol at once; readers that miss on a symbol while
+    it is being loaded wait for that load rather than starting another.
+    Symbols the loader has no quote for are not cached.
+    """
+
+    def __init__(self, loader, maxsize=QUOTE_CACHE_SIZE, ttl=QUOTE_CACHE_TTL, clock=time.time):
+        self.loader = loader
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        # Symbol -> (quote, expiry time), least recently used first.
+        self.entries = OrderedDict()
+        self.loading = {}
+        self.lock = threading.Lock()
+        # This cache's own lookups; the registry's counters add up every
+        # cache's.
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, symbol, loader=None):
+        """
+        @return the symbol's Quote, or None if the loader has none.
+        """
+        return self.get_many([symbol], loader).get(symbol)
+
+    def get_many(self, symbols, loader=None):
+        """
+        @symbols a list of symbols.
+        @loader a callable(symbols) returning a list of Quote records, used
+            for this call's misses instead of the cache's own loader.
+        @return a dictionary of each symbol's Quote, without the symbols
+            the loader has none for.
+        """
+        loader = loader if loader is not None else self.loader
+        found = {}
+        missing = []
+        waiting = []
+        now = self.clock()
+        with self.lock:
+            entries = self.entries
+            for symbol in symbols:
+                entry = entries.pop(symbol, None)
+                if entry is not None and entry[1] > now:
+                    entries[symbol] = entry
+                    found[symbol] = entry[0]
+                    continue
+                # Loads are shared only between readers using the same loader.
+                loading = self.loading.get((loader, symbol))
+                if loading is not None:
+                    waiting.append((symbol, loading))
+                else:
+                    missing.append(symbol)
+            if missing:
+                loading = Loading()
+                for symbol in missing:
+                    self.loading[(loader, symbol)] = loading
+            self.hits += len(found)
+            self.misses += len(symbols) - len(found)
+        hits.inc(len(found))
+        misses.inc(len(symbols) - len(found))
+        if missing:
+            self.load(loader, missing, loading)
+            found.update(loading.quotes)
+        for symbol, loading in waiting:
+            loading.done.wait()
+            if loading.error is not None:
+                raise loading.error
+            if symbol in loading.quotes:
+                found[symbol] = loading.quotes[symbol]
+        return found
+
+    def load(self, loader, symbols, loading):
+        try:
+            loading.quotes = dict((quote.symbol, quote) for quote in loader(symbols))
+            self.put(loading.quotes.values())
+        except Exception as e:
+            loading.error = e
+            raise
+        finally:
+            with self.lock:
+                for symbol in symbols:
+                    self.loading.pop((loader, symbol), None)
+            loading.done.set()
+
+    def put(self, quotes):
+        """
+        Stores the latest quotes, such as the ones a poll changed.
+        """
+        expires = self.clock() + self.ttl
+        with self.lock:
+            entries = self.entries
+            for quote in quotes:
+                entries.pop(quote.symbol, None)
+                entries[quote.symbol] = (quote, expires)
+            evicted = len(entries) - self.maxsize
+            for i in range(evicted):
+                entries.popitem(last=False)
+        if evicted > 0:
+            evictions.inc(evicted)
+
+    def invalidate(self, symbols):
+        with self.lock:
+            for symbol in symbols:
+                self.entries.pop(symbol, None)
+
+    def hit_ratio(self):
+        """
+        @return the share of lookups served from memory so far, or None
+            before the first one.
+        """
+        total = self.hits + self.misses
+        return float(self.hits) / total if total else None
@@ -0,0 +1,98 @@
+import json
+import logging
+import signal
+import threading
+import SocketServer
+from config import CONTROL_PORT
+from stream import Session
+from process import Streamer
+
+
+
+log = logging.getLogger(__name__)
+
+class ControlHandler(SocketServer.StreamRequestHandler):
+    """
+    Serves one control connection, answering each command line with one
+    line:
+
+        ADD SYMBOL [SYMBOL ...]     -> OK <symbols added>
+        REMOVE SYMBOL [SYMBOL ...]  -> OK <symbols removed>
+        STATUS                      -> OK <Streamer.status() as JSON>
+        IMPORT PATH                 -> OK <number of symbols added>
+
+    IMPORT adds every symbol of a watchlist file on the host at once.
+
+    Anything else gets an ERR line. Commands run on this connection's own
+    thread and only hold the Streamer's lock briefly, so they do not wait
+    for a poll in progress.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            words = line.split()
+            if not words:
+                continue
+            command, symbols = words[0].upper(), [word.upper() for word in words[1:]]
+            if command == 'ADD' and symbols:
+                reply = 'OK ' + ' '.join(self.server.streamer.add_many(symbols))
+            elif command == 'REMOVE' and symbols:
+                reply = 'OK ' + ' '.join(self.server.streamer.remove_many(symbols))
+            elif command == 'STATUS':
+                reply = 'OK ' + json.dumps(self.server.streamer.status())
+            elif command == 'IMPORT' and len(words) == 2:
+                try:
+                    reply = 'OK {}'.format(len(self.server.streamer.import_watchlist(words[1])))
+                except IOError as e:
+                    reply = 'ERR ' + str(e)
+            else:
+                reply = 'ERR expected ADD SYMBOL..., REMOVE SYMBOL..., STATUS or IMPORT PATH'
+            self.wfile.write(reply.rstrip() + '\n')
+            self.wfile.flush()
+
+class ControlServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    """
+    Local control socket of a headless Streamer. Only listens on the
+    loopback interface.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, streamer, port=CONTROL_PORT):
+        SocketServer.TCPServer.__init__(self, ('127.0.0.1', port), ControlHandler)
+        self.streamer = streamer
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def run_headless(control_port=CONTROL_PORT):
+    """
+    Runs a Streamer without a GUI until SIGTERM or SIGINT, then lets it
+    write the poll in progress before returning.
+
+    @control_port the port of the control socket, or None for none.
+    """
+    streamer = Streamer()
+    control = ControlServer(streamer, control_port) if control_port is not None else None
+
+    def shutdown(signum, frame):
+        log.info('Received signal %d, stopping after the poll in progress.', signum)
+        streamer.stop()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    streamer.run()
+    if control is not None:
+        thread = threading.Thread(target=control.serve_forever)
+        thread.daemon = True
+        thread.start()
+        log.info('Control socket listening on 127.0.0.1:%d.', control.server_address[1])
+    try:
+        streamer.join()
+    finally:
+        if control is not None:
+            control.stop()
+        streamer.fetcher.close()
+        Session.remove()
@@ -0,0 +1,103 @@
+import json
+
+
+
+QUOTE_KEY = '"quote"'
+WHITESPACE = ' \t\n\r'
+
+class QuoteStreamDecoder(object):
+    """
+    Incremental decoder for YQL quote responses. Skips ahead to the
+    "quote" value and decodes its objects one at a time as the chunks
+    arrive, handing each object's (key, value) pairs to make_quote, so
+    neither the whole document nor a dict per quote is ever built.
+    """
+
+    def __init__(self, make_quote):
+        self.decoder = json.JSONDecoder(object_pairs_hook=make_quote)
+        self.buffer = ''
+        self.state = 'seek'
+
+    def feed(self, chunk):
+        """
+        @chunk the next piece of the response body.
+        @return the quote records completed by this chunk.
+        """
+        if self.state == 'done':
+            return []
+        self.buffer += chunk
+        if self.state == 'seek':
+            self._seek()
+        quotes = []
+        if self.state in ('items', 'single'):
+            position = self._decode(quotes)
+            self.buffer = self.buffer[position:]
+        return quotes
+
+    def close(self):
+        """
+        Finishes the response.
+
+        @return the quote records still pending.
+        @raise ValueError if the response was cut short or malformed.
+        @raise KeyError if the response has no query results.
+        """
+        if self.state == 'seek':
+            # No quote key: either there were no results, or an error document.
+            results = json.loads(self.buffer)['query']['results']
+            if results is not None:
+                raise KeyError('quote')
+            return []
+        quotes = self.feed('')
+        if self.state != 'done':
+            raise ValueError('Quote response ended before the quotes did.')
+        return quotes
+
+    def _seek(self):
+        start = self.buffer.find(QUOTE_KEY)
+        if start < 0:
+            return
+        position = self._skip(self.buffer, start + len(QUOTE_KEY))
+        if position >= len(self.buffer):
+            return
+        if self.buffer[position] != ':':
+            raise ValueError('Malformed quote response.')
+        position = self._skip(self.buffer, position + 1)
+        if position >= len(self.buffer):
+            return
+        if self.buffer[position] == '[':
+            self.state = 'items'
+            position += 1
+        else:  # Occurs when only one stock entry.
+            self.state = 'single'
+        self.buffer = self.buffer[position:]
+
+    def _decode(self, quotes):
+        buffer = self.buffer
+        position = 0
+        while True:
+            position = self._skip(buffer, position)
+            if position >= len(buffer):
+                return position
+            if self.state == 'items':
+                if buffer[position] == ',':
+                    position += 1
+                    continue
+                if buffer[position] == ']':
+                    self.state = 'done'
+                    return len(buffer)
+            try:
+                quote, end = self.decoder.raw_decode(buffer, position)
+            except ValueError:
+                # The object is not complete yet; wait for the next chunk.
+                return position
+            quotes.append(quote)
+            position = end
+            if self.state == 'single':
+                self.state = 'done'
+                return len(buffer)
+
+    def _skip(self, buffer, position):
+        while position < len(buffer) and buffer[position] in WHITESPACE:
+            position += 1
+        return position
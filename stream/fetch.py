@@ -0,0 +1,135 @@
+import logging
+import requests
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
+from time import sleep
+from config import FETCH_SHARD_SIZE, FETCH_WORKERS, FETCH_TIMEOUT, FETCH_RETRIES
+from decode import QuoteStreamDecoder
+from providers import Provider, ProviderError
+from metrics import registry
+
+
+
+# Url that is used in process.py to retrieve live data
+STREAM_URL = 'https://query.yahooapis.com/v1/public/yql?q=select%20{1}%20from%20' \
+    'yahoo.finance.quotes%20where%20symbol%20in%20({0})&format=json&env=store%' \
+    '3A%2F%2Fdatatables.org%2Falltableswithkeys&callback='
+
+# Seconds to wait before retrying a failed shard; doubles on each attempt.
+RETRY_DELAY = 0.5
+
+# Bytes read from a response at a time while decoding it.
+CHUNK_SIZE = 16 * 1024
+
+log = logging.getLogger(__name__)
+
+# Until the response headers arrive, then while the body streams in and
+# is decoded.
+request_timer = registry.timer('fetch.request')
+decode_timer = registry.timer('fetch.decode')
+shard_retries = registry.counter('fetch.retries')
+shard_errors = registry.counter('fetch.errors')
+
+class ShardedFetcher(Provider):
+    """
+    Yahoo YQL provider of the Streamer. Fetches the shards of a Watchlist
+    (at most shard_size symbols each) concurrently over one pooled
+    requests.Session and merges the quotes into a single batch. A shard
+    that keeps failing is reported in failed instead of stalling the rest.
+    Responses are decoded while they stream in, straight into the
+    projection's Quote records, and also saved raw when a replay.Recorder
+    is given.
+    """
+
+    remote = True
+
+    def __init__(self, url=STREAM_URL, shard_size=FETCH_SHARD_SIZE, workers=FETCH_WORKERS,
+                 timeout=FETCH_TIMEOUT, retries=FETCH_RETRIES, projection=None, recorder=None):
+        Provider.__init__(self, projection)
+        self.url = url
+        self.recorder = recorder
+        self.max_batch = shard_size
+        self.timeout = timeout
+        self.retries = retries
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.pool = ThreadPool(workers)
+
+    def fetch_shards(self, shards):
+        """
+        Retrieves a snapshot of shards concurrently; see fetch().
+
+        @shards a list of (query string, symbols) pairs from snapshot().
+        @return a list of Quote records, in shard order.
+        """
+        results = self.pool.map(self.fetch_shard, shards)
+        quotes = []
+        self.failed = []
+        for (query, symbols), shard_quotes in zip(shards, results):
+            if shard_quotes is None:
+                self.failed.append(symbols)
+            else:
+                quotes.extend(shard_quotes)
+        return quotes
+
+    def fetch_batch(self, symbols):
+        shard, = self.snapshot(symbols)
+        quotes = self.fetch_shard(shard)
+        if quotes is None:
+            raise ProviderError('every attempt failed')
+        return quotes
+
+    def fetch_shard(self, shard):
+        """
+        Retrieves one shard, retrying with a growing delay.
+
+        @shard a (query string, symbols) pair.
+        @return a list of Quote records, or None if every attempt failed.
+        """
+        query, symbols = shard
+        url = self.url.format(query, self.projection.select)
+        delay = RETRY_DELAY
+        for attempt in range(self.retries + 1):
+            if attempt:
+                shard_retries.inc()
+                sleep(delay)
+                delay *= 2
+            try:
+                with request_timer.time():
+                    response = self.session.get(url, timeout=self.timeout, stream=True)
+                response.raise_for_status()
+                with decode_timer.time():
+                    return self.decode(response)
+            except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+                error = e
+        shard_errors.inc()
+        log.warning('Could not retrieve shard %s..%s after %d attempts: %s',
+                    symbols[0], symbols[-1], self.retries + 1, error)
+        return None
+
+    def decode(self, response):
+        """
+        Decodes the quotes of a YQL response as its body streams in.
+        """
+        now = datetime.utcnow()
+        decoder = QuoteStreamDecoder(lambda pairs: self.projection.decode_pairs(pairs, now))
+        quotes = []
+        chunks = [] if self.recorder is not None else None
+        try:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                quotes.extend(decoder.feed(chunk))
+                if chunks is not None:
+                    chunks.append(chunk)
+        finally:
+            response.close()
+        if chunks is not None:
+            self.recorder.record(''.join(chunks))
+        quotes.extend(decoder.close())
+        return quotes
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.session.close()
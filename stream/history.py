@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+from sqlalchemy import and_
+from models import tick_partition
+
+
+
+PARTITION_PREFIX = 'ticks_'
+
+def to_millis(moment):
+    """
+    Converts a naive UTC datetime to milliseconds since the epoch,
+    which is how tick timestamps are stored.
+    """
+    delta = moment - datetime(1970, 1, 1)
+    return (delta.days * 86400 + delta.seconds) * 1000 + delta.microseconds // 1000
+
+def from_millis(millis):
+    return datetime(1970, 1, 1) + timedelta(milliseconds=millis)
+
+class TickHistory(object):
+    """
+    Append-only store of every polled tick, partitioned into one
+    ticks_YYYYMMDD table per (UTC) day. Partitions older than
+    retention_days are dropped whenever a new partition is created.
+    """
+
+    def __init__(self, retention_days=None):
+        self.retention_days = retention_days
+        self._created = set()
+
+    def append(self, session, ticks):
+        """
+        Appends ticks to their day's partition. The caller commits.
+
+        @session an open session.
+        @ticks a list of (symbol_id, ts, price, volume) tuples, where ts
+            is a naive UTC datetime.
+        @return the number of ticks appended.
+        """
+        days = {}
+        for symbol_id, ts, price, volume in ticks:
+            days.setdefault(ts.date(), []).append((symbol_id, to_millis(ts), price, volume))
+        for day, rows in days.items():
+            self.insert(session, day, rows)
+        return len(ticks)
+
+    def insert(self, session, day, rows):
+        """
+        Inserts rows into a day's partition, creating it if needed. The
+        caller commits.
+
+        @day a datetime.date.
+        @rows a list of (symbol_id, ts, price, volume) tuples of that day,
+            ts in milliseconds.
+        """
+        table = self._partition(session, day)
+        # Positional parameters go straight to the driver's executemany,
+        # without building a dictionary of bound parameters per row. A
+        # second tick in the same millisecond replaces the first.
+        session.connection().execute('INSERT OR REPLACE INTO {} (symbol_id, ts, price, volume) '
+                                     'VALUES (?, ?, ?, ?)'.format(table.name), rows)
+
+    def range(self, session, symbol_id, start=None, end=None):
+        """
+        Returns the ticks of one symbol between two moments, oldest
+        first. Only the partitions that overlap the range are read.
+
+        @session an open session.
+        @symbol_id the id of the symbol's row in the stocks table.
+        @start, @end naive UTC datetimes; start defaults to the oldest
+            partition, and end to now.
+        @return a list of (ts, price, volume) tuples, ts as a datetime.
+        """
+        if end is None:
+            end = datetime.utcnow()
+        existing = self.partitions(session)
+        ticks = []
+        if start is None:
+            if not existing:
+                return ticks
+            start = datetime.combine(existing[0], datetime.min.time())
+        existing = set(existing)
+        day = start.date()
+        while day <= end.date():
+            if day in existing:
+                table = tick_partition(day)
+                query = table.select().with_only_columns(
+                    [table.c.ts, table.c.price, table.c.volume]).where(and_(
+                        table.c.symbol_id == symbol_id,
+                        table.c.ts >= to_millis(start),
+                        table.c.ts <= to_millis(end))).order_by(table.c.ts)
+                ticks.extend((from_millis(ts), price, volume)
+                             for ts, price, volume in session.execute(query))
+            day += timedelta(days=1)
+        return ticks
+
+    def partitions(self, session):
+        """
+        @return the days that have a partition, oldest first.
+        """
+        # '_' matches any character in LIKE, unless escaped.
+        names = session.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                                "AND name LIKE '{}%' ESCAPE '\\'"
+                                .format(PARTITION_PREFIX.replace('_', '\\_')))
+        return sorted(datetime.strptime(name[len(PARTITION_PREFIX):], '%Y%m%d').date()
+                      for name, in names)
+
+    def drop_before(self, session, day):
+        """
+        Drops every partition older than the given day.
+
+        @return the days that were dropped.
+        """
+        dropped = [old for old in self.partitions(session) if old < day]
+        for old in dropped:
+            tick_partition(old).drop(session.connection(), checkfirst=True)
+            self._created.discard(old)
+        return dropped
+
+    def _partition(self, session, day):
+        table = tick_partition(day)
+        if day not in self._created:
+            table.create(session.connection(), checkfirst=True)
+            self._created.add(day)
+            if self.retention_days is not None:
+                self.drop_before(session, day - timedelta(days=self.retention_days))
+        return table
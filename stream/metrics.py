@@ -0,0 +1,281 @@
+import json
+import os
+import sys
+import threading
+import time
+import urlparse
+from bisect import bisect_left
+from collections import OrderedDict
+from timeit import default_timer as timer
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from config import PROFILE_INTERVAL
+
+
+
+# Upper bounds in seconds of the buckets timings are counted in.
+TIMER_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+class Counter(object):
+    """
+    A count that only goes up, such as quotes fetched or errors.
+    Consumers derive rates from two readings.
+    """
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def collect(self):
+        return self.value
+
+class Timing(object):
+    """
+    Context manager that observes the time spent in its block.
+    """
+
+    __slots__ = ('timer', 'start')
+
+    def __init__(self, metric):
+        self.timer = metric
+
+    def __enter__(self):
+        self.start = timer()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timer.observe(timer() - self.start)
+
+class Timer(object):
+    """
+    Durations in seconds: how many there were, their sum, maximum and
+    last value, and how many fell within each of the bucket bounds.
+    """
+
+    def __init__(self, buckets=TIMER_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.last = None
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect_left(self.buckets, seconds)
+        with self.lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += seconds
+            self.last = seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def time(self):
+        """
+        @return a context manager timing its block.
+        """
+        return Timing(self)
+
+    def collect(self):
+        with self.lock:
+            counts = list(self.counts)
+            value = {'count': self.count, 'sum': self.sum, 'max': self.max, 'last': self.last}
+        # Cumulative, like Prometheus buckets.
+        buckets, total = [], 0
+        for bound, count in zip(self.buckets + ('+Inf',), counts):
+            total += count
+            buckets.append([bound, total])
+        value['buckets'] = buckets
+        return value
+
+class Gauge(object):
+    """
+    A value read when the metrics are collected, such as a queue depth.
+    """
+
+    def __init__(self, function):
+        self.function = function
+
+    def collect(self):
+        try:
+            return self.function()
+        except Exception:
+            return None
+
+class Registry(object):
+    """
+    Named metrics of the whole process. Metrics are created once, usually
+    at import time, and then updated without any lookup; collecting them
+    is left to whoever pulls them, so an idle registry costs nothing.
+    """
+
+    def __init__(self):
+        self.metrics = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, name, make):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = make()
+            return metric
+
+    def counter(self, name):
+        return self.get(name, Counter)
+
+    def timer(self, name, buckets=TIMER_BUCKETS):
+        return self.get(name, lambda: Timer(buckets))
+
+    def gauge(self, name, function):
+        """
+        Registers function() as the value of name, replacing any gauge
+        registered before, e.g. by an earlier Streamer.
+        """
+        with self.lock:
+            self.metrics[name] = Gauge(function)
+
+    def collect(self):
+        """
+        @return a dictionary of every metric's current value.
+        """
+        with self.lock:
+            metrics = self.metrics.items()
+        return OrderedDict((name, metric.collect()) for name, metric in metrics)
+
+    def prometheus(self):
+        """
+        @return the metrics in Prometheus' text exposition format.
+        """
+        lines = []
+        for name, value in self.collect().items():
+            name = 'stream_' + name.replace('.', '_')
+            if isinstance(value, dict):
+                lines.append('# TYPE {} histogram'.format(name))
+                for bound, count in value['buckets']:
+                    lines.append('{}_bucket{{le="{}"}} {}'.format(name, bound, count))
+                lines.append('{}_sum {}'.format(name, value['sum']))
+                lines.append('{}_count {}'.format(name, value['count']))
+            elif value is not None:
+                lines.append('{} {}'.format(name, float(value)))
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+class SamplingProfiler(object):
+    """
+    Samples the stack of every other thread each interval seconds, from a
+    daemon thread, and counts how often each stack was seen. Unlike a
+    tracing profiler this adds nothing to the sampled code, so it can stay
+    on in production. folded() gives the counts in the format flame graph
+    tools read.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL or 0.01):
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self.running = False
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='profiler')
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+
+    def run(self):
+        own = threading.current_thread().ident
+        while self.running:
+            names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self.sample(names.get(ident, str(ident)), frame)
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def sample(self, thread_name, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append('{}:{}'.format(os.path.basename(code.co_filename), code.co_name))
+            frame = frame.f_back
+        stack.append(thread_name)
+        key = ';'.join(reversed(stack))
+        with self.lock:
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def folded(self):
+        """
+        @return one 'thread;outer;...;inner count' line per stack seen.
+        """
+        with self.lock:
+            stacks = sorted(self.stacks.items())
+        return ''.join('{} {}\n'.format(stack, count) for stack, count in stacks)
+
+    def top(self, n=20):
+        """
+        @return the n functions most often seen running, as (function,
+            samples) pairs.
+        """
+        leaves = {}
+        with self.lock:
+            for stack, count in self.stacks.items():
+                leaf = stack.rsplit(';', 1)[-1]
+                leaves[leaf] = leaves.get(leaf, 0) + count
+        return sorted(leaves.items(), key=lambda item: -item[1])[:n]
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+    GET /metrics gives the Prometheus text format, /metrics.json the same
+    as JSON, and /profile the profiler's folded stacks.
+    """
+
+    def do_GET(self):
+        path = urlparse.urlparse(self.path).path
+        server = self.server
+        if path == '/metrics':
+            self.reply(server.registry.prometheus(), 'text/plain; version=0.0.4')
+        elif path == '/metrics.json':
+            self.reply(json.dumps(server.registry.collect()), 'application/json')
+        elif path == '/profile' and server.profiler is not None:
+            self.reply(server.profiler.folded(), 'text/plain')
+        else:
+            self.send_error(404)
+
+    def reply(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class MetricsServer(ThreadingMixIn, HTTPServer):
+    """
+    Serves a registry, and optionally a profiler, on a loopback port for
+    monitoring tools to pull.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, registry, port, profiler=None):
+        HTTPServer.__init__(self, ('127.0.0.1', port), MetricsHandler)
+        self.registry = registry
+        self.profiler = profiler
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
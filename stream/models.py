@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, MetaData, Table
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, backref
 
@@ -8,11 +8,61 @@ Base = declarative_base()
 
 class Stock(Base):
     __tablename__ = "stocks"
+    # Ids of removed stocks are never handed out again, since their ticks
+    # stay in the tick history under them.
+    __table_args__ = {'sqlite_autoincrement': True}
     
     id = Column(Integer, primary_key=True)
-    symbol = Column(String)
-    last_trade_price = Column(String)
-    change = Column(String)
+    symbol = Column(String, nullable=False, unique=True, index=True)
+    last_trade_price = Column(Float)
+    change = Column(Float)
+    volume = Column(Integer)
+    bid = Column(Float)
+    ask = Column(Float)
+    updated_at = Column(DateTime)
     
     def __init__(self, symbol):
-        self.symbol = symbol
\ No newline at end of file
+        self.symbol = symbol
+
+class AlertRule(Base):
+    """
+    Fires when a field of a symbol's quotes crosses threshold, going up,
+    down or either way. A rule that fires once is disabled when it does.
+    """
+    __tablename__ = "alert_rules"
+    
+    id = Column(Integer, primary_key=True)
+    symbol = Column(String, nullable=False, index=True)
+    field = Column(String, nullable=False, default='last_trade_price')
+    direction = Column(String, nullable=False, default='either')
+    threshold = Column(Float, nullable=False)
+    once = Column(Boolean, nullable=False, default=False)
+    enabled = Column(Boolean, nullable=False, default=True)
+    fired_at = Column(DateTime)
+
+
+
+# Tick history is split into one table per day so that old days can be
+# dropped without rewriting the rest. The tables are created on demand,
+# so they live in their own MetaData instead of Base's.
+tick_metadata = MetaData()
+
+def tick_partition(day):
+    """
+    Returns the tick history table for a given day. Rows are stored
+    WITHOUT ROWID and clustered on (symbol_id, ts), so the primary key
+    doubles as a covering index for per-symbol range queries.
+    
+    @day a datetime.date.
+    @return the sqlalchemy Table for that day.
+    """
+    name = 'ticks_{:%Y%m%d}'.format(day)
+    table = tick_metadata.tables.get(name)
+    if table is None:
+        table = Table(name, tick_metadata,
+            Column('symbol_id', Integer, primary_key=True, autoincrement=False),
+            Column('ts', Integer, primary_key=True, autoincrement=False),
+            Column('price', Float),
+            Column('volume', Integer),
+            sqlite_with_rowid=False)
+    return table
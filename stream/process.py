@@ -1,27 +1,89 @@
-import requests
+import logging
 import threading
-from time import sleep
-from config import UPDATE_INTERVAL
-from util import get_session
+from operator import attrgetter
+from datetime import datetime, timedelta
+from timeit import default_timer as timer
+from config import TICK_HISTORY, TICK_RETENTION_DAYS, BUS_PORT, SUBSCRIBER_QUEUE_SIZE, ANALYTICS, \
+    METRICS_PORT, PROFILE_INTERVAL, SHARED_QUOTES
+from sqlalchemy import bindparam
+from stream import bakery
+from util import get_session, join_threads
 from models import Stock
+from writer import QuoteWriter, WriterThread
+from history import TickHistory
+from analytics import Analytics
+from snapshot import Snapshot
+from shm import QuoteTable
+from alerts import AlertEngine, Rule, FIELDS, DIRECTIONS
+from providers import make_provider, ProviderError
+from cache import QuoteCache
+from quote import Quote
+from watchlist import Watchlist
+from scheduler import Scheduler
+from bus import QuoteBus, BusServer
+from archive import read_watchlist
+from metrics import registry, MetricsServer, SamplingProfiler
 
 
 
-# Url that is used in process.py to retrieve live data
-STREAM_URL = 'https://query.yahooapis.com/v1/public/yql?q=select%20*%20from%20' \
-    'yahoo.finance.quotes%20where%20symbol%20in%20({0})&format=json&env=store%' \
-    '3A%2F%2Fdatatables.org%2Falltableswithkeys&callback='
+log = logging.getLogger(__name__)
+
+# Per-stage timings of each tier's poll, and what went through it.
+fetch_timer = registry.timer('poll.fetch')
+process_timer = registry.timer('poll.process')
+notify_timer = registry.timer('poll.notify')
+polls = registry.counter('poll.count')
+failed_shards = registry.counter('poll.failed_shards')
+quotes_fetched = registry.counter('quotes.fetched')
+quotes_changed = registry.counter('quotes.changed')
+alerts_fired = registry.counter('alerts.fired')
 
 class Streamer:
     
-    def __init__(self):
+    def __init__(self, fetcher=None, scheduler=None):
         self.running = True
         self.threads = []
-        self.stocks = []
-        self.stocks_csv = ""
+        # The quote provider; see providers.Provider.
+        self.fetcher = fetcher if fetcher is not None else make_provider()
+        self.watchlist = Watchlist(shard_size=self.fetcher.shard_size)
+        self.scheduler = scheduler if scheduler is not None else \
+            Scheduler(shard_size=self.fetcher.shard_size)
+        self.wakeup = threading.Event()
+        # Held while the watchlist, the scheduler or the stored rows change,
+        # but not while quotes are being fetched.
+        self.lock = threading.RLock()
+        self.projection = self.fetcher.projection
+        self.writer = QuoteWriter()
+        # Every write goes through this one thread, in queue order.
+        self.writes = WriterThread(on_rollback=self.writer.load)
+        self.history = TickHistory(TICK_RETENTION_DAYS) if TICK_HISTORY else None
+        self.analytics = Analytics() if ANALYTICS else None
+        # Latest projected values and statistics of every symbol, column
+        # by column, for vectorized consumers.
+        fields = self.projection.columns
+        if self.analytics is not None:
+            fields += tuple(name for name in self.analytics.names if name not in fields)
+        self.snapshot = Snapshot(fields)
+        # The same values in shared memory, for readers in other processes.
+        self.shared = QuoteTable(SHARED_QUOTES, fields) if SHARED_QUOTES is not None else None
+        self.alerts = AlertEngine()
+        # Latest quotes for lookups, read through to the database.
+        self.cache = QuoteCache(self.read_quotes)
+        self.bus = QuoteBus()
+        self.bus_server = None
+        self.metrics_server = None
+        self.profiler = None
+        # Last values seen per symbol, and how many quotes of the last
+        # cycle changed.
+        self.last_seen = {}
+        self.cycle_counts = {'changed': 0, 'unchanged': 0}
+        # Symbols added since the update thread last woke up, which it
+        # fetches before polling the tiers.
+        self.added = []
         
         # Load from the database the previously-stored quotes.
         self.load()
+        self.register_gauges()
         
     def is_valid_symbol(self, symbol):
         """
@@ -32,55 +94,257 @@ class Streamer:
         return type(symbol) is str
     
     def update(self):
-        while self.running:
-            if len(self.stocks) > 0:
-                # Retrieve a response object from Yahoo's YQL service.
-                try:
-                    stocks_json_request = requests.get(STREAM_URL.format(repr(self.stocks_csv)))
-                except requests.ConnectionError as e:
-                    print('Cannot connect to the service. Please check your connection.')
-                    print('Trying again in {} seconds.'.format(UPDATE_INTERVAL))
-                except requests.HTTPError as e:
-                    print(e)
-                except:
-                    print('Could not retrieve the json from the specified URL.')
-                
-                # Retrieve the json data from the response.
-                try:
-                    stocks_json_data = stocks_json_request.json()
-                except ValueError as e:
-                    print(e)
-                    print('Something bad occurred when trying to update the stocks '
-                        'from Yahoo\'s YQL service.')
-                        
-                # Retrieve a list of each stock's data, which are stored as dictionaries.
-                stocks_data_list = stocks_json_data['query']['results']['quote']
-                if type(stocks_data_list) is dict:  # Occurs when only one stock entry.
-                    stocks_data_list = [stocks_data_list]
-                
-                # Update each stock's data.
-                with get_session() as session:
-                    for stock_data in stocks_data_list:
-                        stock = session.query(Stock).filter(Stock.symbol == stock_data['Symbol']).first()
-                        stock.last_trade_price = stock_data['LastTradePriceOnly']
-                        session.add(stock)
-                        print('\nSymbol: ' + stock.symbol)
-                        print('Price: ' + stock.last_trade_price)
-                        
-                    # Commit the changes.
-                    session.commit()
-                    
-                    print('- - - - - - - - - - - - - - -')
-                    
-                    # Warn the user if number of stocks in the database mismatch with
-                    # the number of stocks the application is attempting to update.
-                    num_stocks = session.query(Stock).count()
-                    if num_stocks != len(self.stocks):
-                        print('Warning: the number of stocks in the database do not match '
-                            'the number of stocks this program is updating.')
-                        print('Some data may not be refreshing and will be inaccurate.')
-                
-            sleep(UPDATE_INTERVAL)
+        """
+        Polls each tier of the watchlist whenever the scheduler says it
+        is due, sleeping until the next tier is due or until woken up.
+        Once stopped, waits for the queued writes to be committed.
+        """
+        try:
+            while self.running:
+                self.wakeup.clear()
+                with self.lock:
+                    due = self.scheduler.due()
+                self.fetch_added()
+                for tier in due:
+                    self.refresh(tier)
+                with self.lock:
+                    timeout = self.scheduler.next_wakeup()
+                self.wakeup.wait(timeout)
+        finally:
+            self.writes.stop()
+            
+    def refresh(self, tier):
+        """
+        Retrieves the quotes of one tier and sends the changed ones to
+        the writer thread and the quote bus.
+        
+        @tier a scheduler.Tier that is due.
+        """
+        # Retrieve each shard of the tier from Yahoo's YQL service.
+        with self.lock:
+            shards = self.fetcher.snapshot(tier.watchlist)
+        with fetch_timer.time():
+            quotes = self.fetcher.fetch_shards(shards)
+        failed = self.fetcher.failed
+        polls.inc()
+        quotes_fetched.inc(len(quotes))
+        failed_shards.inc(len(failed))
+        
+        start = timer()
+        with self.lock:
+            # Drop the symbols that were removed while being fetched.
+            quotes = [quote for quote in quotes if quote.symbol in self.watchlist]
+            
+            # Only quotes that changed since the last poll go downstream.
+            changed = self.apply(quotes)
+            self.cycle_counts = {'changed': len(changed),
+                                 'unchanged': len(quotes) - len(changed)}
+            self.scheduler.completed(tier, [quote.symbol for quote in quotes],
+                                     set(quote.symbol for quote in changed),
+                                     error=bool(failed) and not quotes)
+            if failed:
+                log.warning('Could not update %d shard(s) of the %s tier. Trying again in %.0f seconds.',
+                            len(failed), tier.name, tier.next_due - self.scheduler.clock())
+        process_timer.observe(timer() - start)
+        if changed:
+            self.publish(changed)
+        log.info('%s: %d changed, %d unchanged', tier.name,
+                 self.cycle_counts['changed'], self.cycle_counts['unchanged'])
+        
+        # Warn the user if number of stocks in the database mismatch with
+        # the number of stocks the application is attempting to update.
+        if len(self.writer.row_ids) != len(self.watchlist):
+            log.warning('The number of stocks in the database do not match the number of '
+                        'stocks this program is updating. Some data may not be refreshing '
+                        'and will be inaccurate.')
+            
+    def apply(self, quotes):
+        """
+        Runs the quotes through change detection, analytics, the snapshot,
+        alerts and the quote cache, and queues the changed ones for
+        writing. The caller holds the lock.
+        
+        @quotes a list of Quote records of watched symbols.
+        @return the changed quotes, to publish() once the lock is released.
+        """
+        changed = self.changes(quotes)
+        if not changed:
+            return changed
+        if self.analytics is not None:
+            self.analytics.update(changed)
+        self.snapshot.update(changed)
+        if self.shared is not None:
+            self.shared.update(changed)
+        events = self.alerts.check(changed)
+        alerts_fired.inc(len(events))
+        fired = [event.rule.id for event in events if event.rule.once]
+        if fired:
+            self.writes.submit(self.alerts.disable, fired, datetime.utcnow())
+        
+        # Queued while holding the lock, so that the write is ordered
+        # before any later remove of the same symbols.
+        self.writes.submit(self.store, changed)
+        self.cache.put(changed)
+        return changed
+        
+    def publish(self, quotes):
+        """
+        Sends changed quotes to the quote bus.
+        """
+        quotes_changed.inc(len(quotes))
+        with notify_timer.time():
+            self.bus.publish(quotes)
+        # Formatting a line per quote is skipped unless it is shown.
+        if log.isEnabledFor(logging.DEBUG):
+            for quote in quotes:
+                log.debug('%s: %s', quote.symbol, quote.last_trade_price)
+            
+    def stop(self):
+        """
+        Ends the update loop after the poll in progress, whose quotes are
+        still written. Safe to call from a signal handler.
+        """
+        self.running = False
+        self.wakeup.set()
+        if self.bus_server is not None:
+            self.bus_server.stop()
+            self.bus_server = None
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        if self.profiler is not None:
+            self.profiler.stop()
+            
+    def join(self):
+        """
+        Waits until the update loop has ended after stop(), while still
+        letting the main thread handle signals.
+        """
+        join_threads([thread for thread in self.threads if not thread.daemon])
+        
+    def register_gauges(self):
+        """
+        Exposes this Streamer's queue depths and sizes in the metrics
+        registry, read only when the metrics are collected.
+        """
+        bus = self.bus
+        registry.gauge('watchlist.symbols', lambda: len(self.watchlist))
+        registry.gauge('writer.queue_depth', self.writes.queue.qsize)
+        registry.gauge('writer.commit_latency', lambda: self.writes.commit_latency)
+        registry.gauge('bus.subscribers', lambda: len(bus.subscriptions))
+        registry.gauge('bus.pending', lambda: sum(sub.qsize() for sub in bus.subscriptions))
+        registry.gauge('bus.dropped', lambda: sum(sub.dropped for sub in bus.subscriptions))
+        registry.gauge('alerts.rules', lambda: len(self.alerts))
+        registry.gauge('alerts.dropped', lambda: self.alerts.dropped)
+        registry.gauge('cache.size', lambda: len(self.cache))
+        registry.gauge('cache.hit_ratio', self.cache.hit_ratio)
+        
+    def status(self):
+        """
+        @return a dictionary describing the watchlist, the last poll and
+            each tier's refresh latency.
+        """
+        with self.lock:
+            return {'running': self.running,
+                    'symbols': len(self.watchlist),
+                    'last_poll': dict(self.cycle_counts),
+                    'tiers': self.scheduler.latency(),
+                    'subscribers': len(self.bus.subscriptions),
+                    'writer': self.writes.metrics()}
+        
+    def changes(self, quotes):
+        """
+        Picks out the quotes whose projected values differ from the last
+        ones seen for their symbol, and remembers the new values.
+        
+        @quotes a list of Quote records.
+        @return the changed quotes, in order.
+        """
+        values_of = self.values_getter()
+        last_seen = self.last_seen
+        changed = []
+        for quote in quotes:
+            values = (values_of(quote), quote.extra)
+            if last_seen.get(quote.symbol) != values:
+                last_seen[quote.symbol] = values
+                changed.append(quote)
+        return changed
+        
+    def values_getter(self):
+        """
+        @return a callable giving the projected column values of a Quote
+            or Stock, in a form changes() can compare.
+        """
+        if not self.projection.columns:
+            return lambda record: ()
+        return attrgetter(*self.projection.columns)
+        
+    def subscribe(self, symbols=None, maxsize=SUBSCRIBER_QUEUE_SIZE, policy='conflate'):
+        """
+        Subscribes to the quote bus, which receives every batch of updated
+        quotes once it is queued for writing. Slow subscribers never hold up the
+        update thread; see bus.Subscription for the policies.
+        
+        @symbols the symbols to receive, or None for all of them.
+        @return a bus.Subscription to get() the quotes from.
+        """
+        return self.bus.subscribe(symbols, maxsize, policy)
+        
+    def store(self, session, quotes):
+        """
+        Updates each stock's projected columns in batches, and appends the
+        ticks when history is kept. Runs on the writer thread.
+        
+        @session the writer thread's session.
+        @quotes a list of Quote records.
+        """
+        self.writer.write(session, quotes, self.write_columns())
+        if self.history is not None:
+            self.history.append(session, self.make_ticks(quotes))
+        
+    def write_columns(self):
+        """
+        @return the stocks columns written from each quote: the projected
+            ones, change when analytics computes it, and updated_at.
+        """
+        columns = self.projection.columns
+        if self.analytics is not None and 'change' not in columns:
+            columns += ('change',)
+        return columns + ('updated_at',)
+        
+    def make_ticks(self, quotes):
+        """
+        Converts a poll's quotes into tick history rows, skipping quotes
+        without a price.
+        
+        @quotes a list of Quote records.
+        @return a list of (symbol_id, ts, price, volume) tuples.
+        """
+        return [(self.writer.row_ids[quote.symbol], quote.updated_at,
+                 quote.last_trade_price, quote.volume)
+                for quote in quotes if quote.last_trade_price is not None]
+        
+    def ticks(self, symbol, minutes=None, start=None, end=None):
+        """
+        Range query over the tick history, e.g. the last 30 minutes of
+        AAPL is ticks('AAPL', minutes=30).
+        
+        @symbol a string of a stock's ticker symbol.
+        @minutes how far back from now to look; overrides start.
+        @start, @end naive UTC datetimes bounding the range; without
+            minutes or start, the range starts at the oldest tick kept.
+        @return a list of (ts, price, volume) tuples, oldest first.
+        """
+        if self.history is None:
+            raise RuntimeError('Tick history is disabled; set TICK_HISTORY in config.py.')
+        symbol_id = self.writer.row_ids.get(symbol.upper())
+        if symbol_id is None:
+            return []
+        if minutes is not None:
+            end = datetime.utcnow()
+            start = end - timedelta(minutes=minutes)
+        with get_session() as session:
+            return self.history.range(session, symbol_id, start, end)
             
     def get_user_input(self):
         """
@@ -94,7 +358,7 @@ class Streamer:
             parsed = input.split()
             try:
                 if parsed[0] == 'QUITNOW':
-                    self.running = False
+                    self.stop()
                     break
                 elif parsed[0] == 'HELP':
                     print("\nA list of commands.")
@@ -112,95 +376,265 @@ class Streamer:
         
     def add(self, symbol):
         """
-        Adds a symbol to the Streamer. add updates the Streamer's stocks
-        array, stocks_csv string, and puts the symbol into the database.
+        Adds a symbol to the Streamer. add updates the Streamer's watchlist
+        and puts the symbol into the database.
         
         @symbol a string of a stock's ticker symbol.
         """
-        if self.is_valid_symbol(symbol):
-            symbol = symbol.upper()
-            in_local = self.find_local(symbol) is not None
-            in_database = self.find_database(symbol) is not None
-            if not in_local:
-                self.stocks.append(symbol)
-                self.stocks_csv = '","'.join(self.stocks)
-            if not in_database:
-                new_stock = Stock(symbol)
-                with get_session() as session:
-                    session.add(new_stock)
-                    session.commit()
-        else:
-            print('Symbol must be a string.')
+        self.add_many([symbol])
+        
+    def add_many(self, symbols, fetch=True):
+        """
+        Adds symbols to the Streamer's watchlist and puts the ones that
+        are not stored yet into the database, in a single transaction.
+        
+        @symbols a list of strings of stock ticker symbols.
+        @fetch False to leave the new symbols' quotes to the next poll
+            instead of fetching them on their own first. Either way the
+            update thread does the fetching, and the quotes arrive
+            through the quote bus; the caller only waits for the database.
+        @return the symbols that were not in the watchlist yet.
+        """
+        symbols = self.valid_symbols(symbols)
+        job = None
+        with self.lock:
+            added = self.watchlist.add_many(symbols)
+            self.scheduler.add_many(added)
+            missing = [symbol for symbol in symbols if symbol not in self.writer.row_ids]
+            if missing:
+                job = self.writes.submit(self.writer.resolve, missing)
+            if fetch:
+                self.added.extend(added)
+        if job is not None:
+            job.wait()
+        if added:
+            # The new symbols go into the hot tier, which is due now; wake
+            # the update thread, which may be asleep until a later tier.
+            self.wakeup.set()
+        return added
+
+    def fetch_added(self):
+        """
+        Fetches the symbols added since the last call on their own, so that
+        their rows are filled in without waiting for the rest of the hot
+        tier. Runs on the update thread. The fetch is shared with concurrent
+        lookups, and cached for them.
+        """
+        with self.lock:
+            symbols = [symbol for symbol in self.added if symbol in self.watchlist]
+            self.added = []
+        if not symbols:
+            return
+        self.cache.invalidate(symbols)
+        quotes = self.cache.get_many(symbols, self.fetch_quotes).values()
+        with self.lock:
+            changed = self.apply([quote for quote in quotes if quote.symbol in self.watchlist])
+        if changed:
+            self.publish(changed)
+            
+    def import_watchlist(self, path):
+        """
+        Adds every symbol of a watchlist file (see archive.read_watchlist)
+        at once, and polls them with the hot tier.
+        
+        @return the symbols that were not in the watchlist yet.
+        """
+        return self.add_many(read_watchlist(path), fetch=False)
             
     def find_local(self, symbol):
         """
-        Searches this Streamer instance's stocks array for the symbol.
-        Useful for populating the Streamer stocks array when re-initiating
-        the program.
+        Searches this Streamer instance's watchlist for the symbol.
         
         @symbol a string of a stock's ticker symbol.
         @return the symbol if it exists, None otherwise.
         """
-        if symbol in self.stocks:
+        if symbol in self.watchlist:
             return symbol
         else:
             return None
             
     def find_database(self, symbol):
         """
-        Searches the database for the symbol.
+        Looks the symbol up in the quote cache, which reads it from the
+        database on a miss.
         
         @symbol a string of a stock's ticker symbol.
-        @return the object if it exists, None otherwise.
+        @return its latest Quote if it is stored, None otherwise.
+        """
+        return self.cache.get(symbol)
+        
+    def read_quotes(self, symbols):
+        """
+        Loader of the quote cache: reads the stored quotes of the symbols.
+        
+        @return a list of Quote records of the symbols that are stored.
         """
+        columns = self.projection.columns + ('updated_at',)
+        # Baked, so the SQL is compiled once per set of columns.
+        query = bakery(lambda session: session.query(
+            Stock.symbol, *[getattr(Stock, column) for column in columns]), columns)
+        query += lambda query: query.filter(Stock.symbol.in_(bindparam('symbols', expanding=True)))
         with get_session() as session:
-            stock = session.query(Stock).filter(Stock.symbol == symbol).first()
-        return stock
+            rows = query(session).params(symbols=list(symbols)).all()
+        return [Quote(str(row[0]), **dict(zip(columns, row[1:]))) for row in rows]
+        
+    def fetch_quotes(self, symbols):
+        """
+        Fetches the symbols from the provider at once, for the quote cache.
+        Batches the provider fails on are left to the next poll.
+        
+        @return a list of Quote records.
+        """
+        quotes = []
+        size = self.fetcher.shard_size
+        for i in range(0, len(symbols), size):
+            try:
+                quotes.extend(self.fetcher.fetch_batch(symbols[i:i + size]))
+            except ProviderError as e:
+                log.warning('Could not fetch %s..%s: %s', symbols[i], symbols[i:i + size][-1], e)
+        return quotes
         
     def load(self):
         """
         Searches the database and populates the Streamer instance with the
-        quotes that it needs to retrieve from YQL.
+        quotes that it needs to retrieve from YQL. The watchlist, the
+        writer's row ids, the last seen values and the snapshot are all
+        filled from a single query of plain rows.
         """
+        columns = [getattr(Stock, column) for column in self.projection.columns]
         with get_session() as session:
-            stocks_in_database = session.query(Stock).all()
+            stocks_in_database = session.query(Stock.id, Stock.symbol, *columns).all()
+        values_of = self.values_getter()
+        symbols = []
         for stock in stocks_in_database:
-            self.add( str(stock.symbol) )
+            symbol = str(stock.symbol)
+            symbols.append(symbol)
+            self.writer.row_ids[symbol] = stock.id
+            # Stored values count as seen, so unchanged quotes are not
+            # rewritten after a restart.
+            self.last_seen[symbol] = (values_of(stock), None)
+        self.snapshot.update(stocks_in_database)
+        if self.shared is not None:
+            self.shared.update(stocks_in_database)
+        with get_session() as session:
+            self.alerts.load(session)
+        self.scheduler.add_many(self.watchlist.add_many(symbols))
             
     def remove(self, symbol):
         """
-        Removes a symbol to the Streamer. remove updates the Streamer's stocks
-        array, stocks_csv string, and deletes the symbol from the database.
+        Removes a symbol from the Streamer. remove updates the Streamer's
+        watchlist and deletes the symbol from the database.
+        
+        @symbol a string of a stock's ticker symbol.
+        """
+        self.remove_many([symbol])
+        
+    def remove_many(self, symbols):
+        """
+        Removes symbols from the Streamer's watchlist and deletes them
+        from the database, in a single transaction.
+        
+        @symbols a list of strings of stock ticker symbols.
+        @return the symbols that were removed from the watchlist.
+        """
+        symbols = self.valid_symbols(symbols)
+        with self.lock:
+            for symbol in symbols:
+                if symbol not in self.watchlist:
+                    log.warning('Symbol %s is not in the watchlist.', symbol)
+                elif symbol not in self.writer.row_ids:
+                    log.warning('Symbol %s is not in the database.', symbol)
+            removed = self.watchlist.remove_many(symbols)
+            self.scheduler.remove_many(removed)
+            self.cache.invalidate(removed)
+            job = self.writes.submit(self.writer.delete, removed) if removed else None
+            for symbol in removed:
+                self.last_seen.pop(symbol, None)
+            if self.analytics is not None:
+                self.analytics.remove(removed)
+            self.snapshot.remove(removed)
+            if self.shared is not None:
+                self.shared.remove(removed)
+        if job is not None:
+            job.wait()
+        return removed
+            
+    def add_alert(self, symbol, threshold, field='last_trade_price', direction='either',
+                  once=False):
+        """
+        Stores a rule that fires when a field of the symbol's quotes
+        crosses the threshold, e.g. add_alert('AAPL', 200) for AAPL's
+        price crossing 200. Events go to the AlertEngine's callbacks and
+        queues, see self.alerts.
         
         @symbol a string of a stock's ticker symbol.
+        @field one of alerts.FIELDS; pct_change needs ANALYTICS.
+        @direction 'up', 'down' or 'either'.
+        @once True to disable the rule after it fires.
+        @return the rule's id.
+        """
+        if field not in FIELDS:
+            raise ValueError('Unknown field {}, expected one of {}.'.format(field, FIELDS))
+        if direction not in DIRECTIONS:
+            raise ValueError('Unknown direction {}, expected one of {}.'.format(direction, DIRECTIONS))
+        rule = Rule(None, symbol.upper(), field, direction, float(threshold), once)
+        self.writes.submit(self.alerts.insert, rule).wait()
+        with self.lock:
+            self.alerts.add(rule)
+        return rule.id
+        
+    def remove_alert(self, rule_id):
         """
-        if self.is_valid_symbol(symbol):
-            symbol = symbol.upper()
-            in_local = self.find_local(symbol) is not None
-            in_database = self.find_database(symbol) is not None
-            if in_local and in_database:
-                self.stocks.remove(symbol)
-                self.stocks_csv = '","'.join(self.stocks)
-                with get_session() as session:
-                    stock = session.query(Stock).filter(Stock.symbol == symbol).first()
-                    session.delete(stock)
-                    session.commit()
-            elif not in_local:
-                print('Symbol {} is not in the local stocks array.'.format(symbol))
+        Deletes an alert rule.
+        
+        @return True if there was a rule with that id.
+        """
+        with self.lock:
+            rule = self.alerts.remove(rule_id)
+            job = self.writes.submit(self.alerts.delete, rule_id)
+        job.wait()
+        return rule is not None
+        
+    def valid_symbols(self, symbols):
+        """
+        @symbols a list of stock ticker symbols.
+        @return the symbols that are strings, upper-cased.
+        """
+        valid = []
+        for symbol in symbols:
+            if self.is_valid_symbol(symbol):
+                valid.append(symbol.upper())
             else:
-                print('Symbol {} is not in the database.'.format(symbol))
-        else:
-            print('Symbol must be a string.') 
+                log.warning('Symbol must be a string, not %r.', symbol)
+        return valid
             
     def run(self, debug=False):
+        # The update thread is not daemonic, so that exiting waits for it
+        # to write the poll in progress after stop().
         thread1 = threading.Thread(target=self.update)
-        # Make threads daemonic, i.e. terminate them when main thread terminates.
-        # http://stackoverflow.com/questions/12376224/python-threadin
-        # g-running-2-different-functions-simultaneously
-        thread1.daemon = True
         thread1.start()
         self.threads.append(thread1)
+        if BUS_PORT is not None:
+            # Let other local processes subscribe to the quotes too.
+            self.bus_server = BusServer(self.bus, BUS_PORT)
+            thread3 = threading.Thread(target=self.bus_server.serve_forever)
+            thread3.daemon = True
+            thread3.start()
+            self.threads.append(thread3)
+        if PROFILE_INTERVAL is not None:
+            self.profiler = SamplingProfiler(PROFILE_INTERVAL).start()
+        if METRICS_PORT is not None:
+            # Pulled by monitoring tools; see metrics.MetricsHandler.
+            self.metrics_server = MetricsServer(registry, METRICS_PORT, self.profiler)
+            thread4 = threading.Thread(target=self.metrics_server.serve_forever)
+            thread4.daemon = True
+            thread4.start()
+            self.threads.append(thread4)
         if debug:
+            # Make the input thread daemonic, i.e. terminate it when the
+            # main thread terminates.
+            # http://stackoverflow.com/questions/12376224/python-threadin
+            # g-running-2-different-functions-simultaneously
             thread2 = threading.Thread(target=self.get_user_input)
             thread2.daemon = True
             thread2.start()
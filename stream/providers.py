@@ -0,0 +1,251 @@
+import csv
+import json
+import logging
+import mmap
+import os
+import threading
+from datetime import datetime
+from config import QUOTE_PROVIDER, QUOTE_FILE, FILE_BATCH_SIZE, RECORD_RESPONSES, WORKER_PROCESSES
+from metrics import registry
+from quote import Projection
+from watchlist import Watchlist
+
+
+
+log = logging.getLogger(__name__)
+
+bad_lines = registry.counter('file.bad_lines')
+
+class ProviderError(Exception):
+    """
+    Raised by a provider for a batch it could not fetch.
+    """
+
+class Provider(object):
+    """
+    A source of quotes for the Streamer. Providers answer batches of at
+    most max_batch symbols with fetch_batch(), and describe what they can
+    do in capability attributes:
+
+        max_batch   most symbols per batch, which the watchlist is sharded by
+        fields      quote properties it can fill in, or None for any of them
+        remote      whether batches go over the network, so that they may
+                    fail and are worth fetching concurrently
+
+    The Streamer snapshots a watchlist's shards while it holds its lock
+    and fetches them after releasing it; fetch() does both.
+    """
+
+    max_batch = 200
+    fields = None
+    remote = False
+
+    def __init__(self, projection=None):
+        self.projection = projection if projection is not None else Projection()
+        self.failed = []
+        if self.fields is not None:
+            unsupported = [name for name in self.projection.names if name not in self.fields]
+            if unsupported:
+                raise ValueError('{} cannot fetch: {}'.format(type(self).__name__,
+                                                             ', '.join(unsupported)))
+
+    @property
+    def shard_size(self):
+        return self.max_batch
+
+    def fetch(self, watchlist):
+        """
+        Retrieves the quotes of every symbol, one batch per shard.
+        Shards that could not be fetched are left in self.failed.
+
+        @watchlist a Watchlist, or a list of symbols to shard here.
+        @return a list of Quote records, in shard order.
+        """
+        return self.fetch_shards(self.snapshot(watchlist))
+
+    def snapshot(self, watchlist):
+        """
+        @watchlist a Watchlist, or a list of symbols to shard here.
+        @return a (query string, symbols) pair per shard, which stays valid
+            while the watchlist changes.
+        """
+        if not isinstance(watchlist, Watchlist):
+            watchlist = Watchlist(watchlist, self.shard_size)
+        return [(shard.query, list(shard.symbols)) for shard in watchlist.shards]
+
+    def fetch_shards(self, shards):
+        """
+        Retrieves a snapshot of shards one after another; see fetch().
+
+        @shards a list of (query string, symbols) pairs from snapshot().
+        @return a list of Quote records, in shard order.
+        """
+        quotes = []
+        self.failed = []
+        for query, symbols in shards:
+            try:
+                quotes.extend(self.fetch_batch(symbols))
+            except ProviderError as e:
+                log.warning('Could not retrieve shard %s..%s: %s', symbols[0], symbols[-1], e)
+                self.failed.append(symbols)
+        return quotes
+
+    def fetch_batch(self, symbols):
+        """
+        @symbols at most max_batch symbols.
+        @return a list of Quote records of the symbols that have a quote.
+        @raise ProviderError if the batch could not be fetched.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class FileProvider(Provider):
+    """
+    Tails a local tick file, so the pipeline runs, and can be load-tested,
+    offline. Ticks are either CSV rows under a header of quote property
+    names (Symbol,LastTradePriceOnly,...), or NDJSON objects with those
+    names as keys, like the quotes of a YQL response; files ending in .csv
+    are read as CSV. Each poll memory-maps the file and parses only the
+    complete lines appended since it was last read, keeping the latest
+    tick of each symbol, so batches are answered without parsing the file
+    again. A file that shrank is read again from the start, as after a
+    rotation. Lines that are not a tick are skipped with a warning.
+    """
+
+    remote = False
+
+    def __init__(self, path=QUOTE_FILE, projection=None, max_batch=FILE_BATCH_SIZE):
+        Provider.__init__(self, projection)
+        if path is None:
+            raise ValueError('FileProvider needs a tick file; see QUOTE_FILE in config.py.')
+        self.path = path
+        self.max_batch = max_batch
+        self.csv = path.lower().endswith('.csv')
+        self.offset = 0
+        self.header = None
+        # Symbol -> the CSV row or NDJSON object of its latest tick.
+        self.latest = {}
+        self.ticks = 0
+        self.bad_lines = 0
+        self.lock = threading.Lock()
+
+    def read(self):
+        """
+        Takes in the complete lines appended since the last read.
+
+        @return the number of ticks read.
+        """
+        with self.lock:
+            return self.read_appended()
+
+    def read_appended(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return 0
+        if size < self.offset:
+            # The ticks of the old file may not even have the same columns.
+            self.offset = 0
+            self.header = None
+            self.latest = {}
+        if size == self.offset:
+            return 0
+        with open(self.path, 'rb') as tick_file:
+            mapped = mmap.mmap(tick_file.fileno(), size, access=mmap.ACCESS_READ)
+            try:
+                # A last line without its newline is still being written.
+                end = mapped.rfind('\n', self.offset, size) + 1
+                block = mapped[self.offset:end] if end else ''
+            finally:
+                mapped.close()
+        if not block:
+            return 0
+        self.offset = end
+        lines = block.splitlines()
+        ticks = self.read_csv(lines) if self.csv else self.read_ndjson(lines)
+        self.ticks += ticks
+        return ticks
+
+    def skip(self, line, reason):
+        log.warning('Skipping line of %s (%s): %r', self.path, reason, line[:100])
+        self.bad_lines += 1
+        bad_lines.inc()
+
+    def read_csv(self, lines):
+        rows = csv.reader(lines)
+        if self.header is None:
+            self.header = next(rows, None)
+            if self.header is None:
+                return 0
+        if 'Symbol' not in self.header:
+            raise ProviderError('{} has no Symbol column.'.format(self.path))
+        symbol_at = self.header.index('Symbol')
+        latest = self.latest
+        ticks = 0
+        for row in rows:
+            if not row:
+                continue
+            if len(row) <= symbol_at or not row[symbol_at]:
+                self.skip(','.join(row), 'no symbol')
+                continue
+            latest[row[symbol_at]] = row
+            ticks += 1
+        return ticks
+
+    def read_ndjson(self, lines):
+        latest = self.latest
+        ticks = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                tick = json.loads(line)
+            except ValueError:
+                self.skip(line, 'not JSON')
+                continue
+            if not isinstance(tick, dict) or not tick.get('Symbol'):
+                self.skip(line, 'no symbol')
+                continue
+            latest[tick['Symbol']] = tick
+            ticks += 1
+        return ticks
+
+    def fetch_batch(self, symbols):
+        self.read()
+        if self.csv and self.header is None:
+            # Nothing was written since the file was created or rotated.
+            return []
+        now = datetime.utcnow()
+        decode_pairs = self.projection.decode_pairs
+        latest = self.latest
+        quotes = []
+        for symbol in symbols:
+            tick = latest.get(symbol)
+            if tick is None:
+                continue
+            pairs = zip(self.header, tick) if self.csv else tick.iteritems()
+            quotes.append(decode_pairs(pairs, now))
+        return quotes
+
+def make_provider(name=QUOTE_PROVIDER, projection=None, workers=WORKER_PROCESSES):
+    """
+    @name 'yahoo' to poll STREAM_URL, recording the responses when
+        RECORD_RESPONSES is set, or 'file' to tail QUOTE_FILE.
+    @workers the number of worker processes to spread the provider over,
+        or 0 to run it in this process.
+    @return a new Provider.
+    """
+    if workers:
+        from functools import partial
+        from workers import WorkerPool
+        return WorkerPool(workers, partial(make_provider, name, workers=0), projection)
+    if name == 'file':
+        return FileProvider(projection=projection)
+    if name == 'yahoo':
+        from fetch import ShardedFetcher
+        from replay import Recorder
+        recorder = Recorder(RECORD_RESPONSES) if RECORD_RESPONSES is not None else None
+        return ShardedFetcher(projection=projection, recorder=recorder)
+    raise ValueError("Unknown quote provider {}, expected 'yahoo' or 'file'.".format(name))
@@ -0,0 +1,106 @@
+from urllib import quote as url_quote
+from config import QUOTE_FIELDS, quote_properties
+from util import to_float, to_int
+
+
+
+# Quote properties that have a column in the stocks table, and how their
+# YQL strings are converted.
+FIELD_COLUMNS = {
+    'LastTradePriceOnly': ('last_trade_price', to_float),
+    'Change': ('change', to_float),
+    'Volume': ('volume', to_int),
+    'Bid': ('bid', to_float),
+    'Ask': ('ask', to_float),
+    }
+
+class Quote(object):
+    """
+    Compact record of one symbol's quote. Fields that were not part of
+    the projection stay None; projected properties without a stocks
+    column are kept in extra, and rolling statistics in stats.
+    """
+
+    __slots__ = ('symbol', 'last_trade_price', 'change', 'volume', 'bid', 'ask',
+                 'updated_at', 'extra', 'stats')
+
+    def __init__(self, symbol, last_trade_price=None, change=None, volume=None,
+                 bid=None, ask=None, updated_at=None, extra=None, stats=None):
+        self.symbol = symbol
+        self.last_trade_price = last_trade_price
+        self.change = change
+        self.volume = volume
+        self.bid = bid
+        self.ask = ask
+        self.updated_at = updated_at
+        self.extra = extra
+        self.stats = stats
+
+    def __repr__(self):
+        return '<Quote {} {}>'.format(self.symbol, self.last_trade_price)
+
+    def as_dict(self):
+        """
+        @return the quote as a JSON-serializable dictionary.
+        """
+        quote = dict((name, getattr(self, name)) for name in self.__slots__)
+        if self.updated_at is not None:
+            quote['updated_at'] = self.updated_at.isoformat()
+        return quote
+
+class Projection(object):
+    """
+    The quote properties picked in config.QUOTE_FIELDS. Builds the YQL
+    select list so only those fields are downloaded, and decodes each
+    returned quote into a Quote.
+    """
+
+    def __init__(self, codes=QUOTE_FIELDS):
+        unknown = [code for code in codes if code not in quote_properties]
+        if unknown:
+            raise ValueError('Unknown quote properties: {}'.format(', '.join(unknown)))
+        names = [quote_properties[code] for code in codes]
+        self.names = ['Symbol'] + [name for name in names if name != 'Symbol']
+        self.columns = tuple(FIELD_COLUMNS[name][0] for name in self.names
+                             if name in FIELD_COLUMNS)
+        self.extra = tuple(name for name in self.names[1:] if name not in FIELD_COLUMNS)
+        self.select = url_quote(','.join(self.names))
+        
+        # Quote property -> (Quote attribute, converter); extra properties
+        # map to (None, None).
+        self.lookup = {'Symbol': ('symbol', str)}
+        for name in self.names[1:]:
+            self.lookup[name] = FIELD_COLUMNS.get(name, (None, None))
+
+    def decode(self, stock_data, now):
+        """
+        @stock_data a quote dictionary from YQL.
+        @now the time the quote was retrieved.
+        @return a Quote.
+        """
+        return self.decode_pairs(stock_data.iteritems(), now)
+
+    def decode_pairs(self, pairs, now):
+        """
+        Decodes a quote straight from its (property, value) pairs, as
+        handed over by QuoteStreamDecoder. Unprojected properties are
+        skipped without being converted.
+
+        @pairs an iterable of (property, value) pairs.
+        @now the time the quote was retrieved.
+        @return a Quote.
+        """
+        quote = Quote(None, updated_at=now)
+        if self.extra:
+            quote.extra = dict.fromkeys(self.extra)
+        lookup = self.lookup
+        for name, value in pairs:
+            field = lookup.get(name)
+            if field is None:
+                continue
+            attribute, convert = field
+            if attribute is None:
+                quote.extra[name] = value
+            else:
+                setattr(quote, attribute, convert(value))
+        return quote
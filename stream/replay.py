@@ -0,0 +1,212 @@
+import json
+import random
+import re
+import threading
+import time
+import urlparse
+from collections import OrderedDict
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+
+
+# STREAM_URL's shape, pointing at a ReplayServer; {2} is its port.
+REPLAY_URL = 'http://127.0.0.1:{2}/v1/public/yql?q=select%20{1}%20from%20' \
+    'yahoo.finance.quotes%20where%20symbol%20in%20({0})&format=json'
+
+class Recorder(object):
+    """
+    Appends raw quote responses to a recording file, one JSON line per
+    response holding the time it was received and its body. Safe to use
+    from the fetcher's worker threads.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'a')
+        self.lock = threading.Lock()
+
+    def record(self, body, now=None):
+        line = json.dumps({'t': time.time() if now is None else now, 'body': body})
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class Recording(object):
+    """
+    Recorded quotes grouped into frames: each frame maps every symbol to
+    its raw quote dictionary as of that moment. A frame holds one poll's
+    worth of responses; a new one starts whenever a symbol reappears.
+    """
+
+    def __init__(self, frames):
+        if not frames:
+            raise ValueError('A recording needs at least one frame.')
+        self.frames = frames
+        self.symbols = list(frames[0])
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a file written by a Recorder.
+        """
+        frames = [OrderedDict()]
+        with open(path) as recording:
+            for line in recording:
+                results = json.loads(json.loads(line)['body'])['query']['results']
+                quotes = results['quote'] if results else []
+                if isinstance(quotes, dict):
+                    quotes = [quotes]
+                for quote in quotes:
+                    if quote['Symbol'] in frames[-1]:
+                        frames.append(OrderedDict())
+                    frames[-1][quote['Symbol']] = quote
+        # Every frame carries forward the quotes it did not record.
+        for previous, frame in zip(frames, frames[1:]):
+            for symbol, quote in previous.items():
+                frame.setdefault(symbol, quote)
+        return cls(frames)
+
+    @classmethod
+    def synthetic(cls, quotes, frames, volatility=0.002, seed=None):
+        """
+        Makes a recording from template quote dictionaries, such as the
+        ones in tests/fixtures, whose prices random-walk over the frames.
+        """
+        rng = random.Random(seed)
+        prices = dict((quote['Symbol'], float(quote['LastTradePriceOnly'])) for quote in quotes)
+        recorded = []
+        for i in range(frames):
+            frame = OrderedDict()
+            for quote in quotes:
+                symbol = quote['Symbol']
+                prices[symbol] *= 1 + rng.gauss(0, volatility)
+                frame[symbol] = dict(quote, LastTradePriceOnly='{:.2f}'.format(prices[symbol]))
+            recorded.append(frame)
+        return cls(recorded)
+
+    def quote(self, frame, symbol):
+        """
+        @return the raw quote of a symbol in a frame. Symbols that were
+            not recorded borrow a recorded symbol's quote, so any
+            watchlist size can be replayed.
+        """
+        quotes = self.frames[frame % len(self.frames)]
+        quote = quotes.get(symbol)
+        if quote is None:
+            borrowed = quotes[self.symbols[hash(symbol) % len(self.symbols)]]
+            quote = dict(borrowed, Symbol=symbol, symbol=symbol)
+        return quote
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """
+    Answers YQL quote queries from the server's recording, with only the
+    selected fields, like STREAM_URL did.
+    """
+
+    def do_GET(self):
+        query = urlparse.parse_qs(urlparse.urlparse(self.path).query)['q'][0]
+        symbols = re.findall(r"[^'\",() ]+", re.search(r'in \((.*)\)', query).group(1))
+        fields = re.search(r'select (.*) from', query).group(1).split(',')
+        server = self.server
+        frame = server.frame(symbols) % len(server.recording.frames)
+        body = server.bodies.get((frame, self.path)) if server.bodies is not None else None
+        if body is None:
+            body = self.render(frame, symbols, fields)
+            if server.bodies is not None:
+                server.bodies[(frame, self.path)] = body
+        if server.latency:
+            time.sleep(server.latency)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        server.requests += 1
+
+    def render(self, frame, symbols, fields):
+        quotes = []
+        for symbol in symbols:
+            quote = self.server.recording.quote(frame, symbol)
+            if fields != ['*']:
+                quote = OrderedDict((field, quote.get(field)) for field in fields)
+            quotes.append(quote)
+        results = {'quote': quotes[0] if len(quotes) == 1 else quotes} if quotes else None
+        return json.dumps({'query': {'count': len(quotes), 'results': results}})
+
+    def log_message(self, *args):
+        pass
+
+class ReplayServer(ThreadingMixIn, HTTPServer):
+    """
+    Local stand-in for STREAM_URL that serves a Recording. The frame
+    served moves on rate times per second, or when rate is None on every
+    poll (once a symbol is requested again), looping at the end. latency
+    seconds are added to each response. With cache set, each response
+    body is rendered once and then served as is, so that the server costs
+    little next to the client being measured. Pass url to a
+    ShardedFetcher to poll it.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, recording, rate=None, latency=0.0, port=0, cache=False):
+        HTTPServer.__init__(self, ('127.0.0.1', port), ReplayHandler)
+        self.recording = recording
+        self.rate = rate
+        self.latency = latency
+        self.requests = 0
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.current = 0
+        self.served = set()
+        self.bodies = {} if cache else None
+        self.url = REPLAY_URL.replace('{2}', str(self.server_address[1]))
+
+    def frame(self, symbols):
+        if self.rate is not None:
+            return int((time.time() - self.started) * self.rate)
+        with self.lock:
+            if any(symbol in self.served for symbol in symbols):
+                self.current += 1
+                self.served = set()
+            self.served.update(symbols)
+            return self.current
+
+    def start(self):
+        """
+        Serves on a daemon thread.
+        """
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Serve a recording of quote responses '
+                                     'in place of STREAM_URL.')
+    parser.add_argument('recording', help='a file written with RECORD_RESPONSES set')
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--rate', type=float, help='frames per second '
+                        '(default: the next frame on every poll)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added to every response')
+    args = parser.parse_args()
+    server = ReplayServer(Recording.load(args.recording), args.rate, args.latency, args.port)
+    print('Replaying {} frames of {} symbols at {}'.format(
+        len(server.recording.frames), len(server.recording.symbols), server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+import random
+import time
+from collections import OrderedDict
+from config import TIER_INTERVALS, TIER_THRESHOLDS, MARKET_OPEN, MARKET_CLOSE, \
+    CLOSED_INTERVAL_FACTOR, MAX_BACKOFF, FETCH_SHARD_SIZE
+from watchlist import Watchlist
+
+
+
+TIERS = ('hot', 'warm', 'cold')
+
+# Weight of the latest poll in a symbol's activity score and in a tier's
+# achieved refresh interval.
+ACTIVITY_ALPHA = 0.2
+LATENCY_ALPHA = 0.2
+
+class Tier(object):
+    """
+    Symbols that are polled together, every interval seconds.
+    """
+
+    def __init__(self, name, interval, shard_size):
+        self.name = name
+        self.interval = interval
+        self.watchlist = Watchlist(shard_size=shard_size)
+        self.next_due = 0.0
+        self.started = None
+        self.last_refresh = None
+        self.achieved = None
+        self.failures = 0
+
+class Scheduler(object):
+    """
+    Decides when each symbol is polled. Symbols move between the hot, warm
+    and cold tiers by their activity score, the share of recent polls in
+    which their quote changed. Tiers are polled less often outside of
+    trading hours, and back off exponentially with jitter while their
+    polls fail. clock and random are injectable so tests can drive time.
+    """
+
+    def __init__(self, clock=time.time, random=random.random, shard_size=FETCH_SHARD_SIZE,
+                 intervals=TIER_INTERVALS, thresholds=TIER_THRESHOLDS):
+        self.clock = clock
+        self.random = random
+        self.thresholds = thresholds
+        self.tiers = OrderedDict((name, Tier(name, intervals[name], shard_size)) for name in TIERS)
+        self.tier_of = {}
+        self.activity = {}
+
+    def add_many(self, symbols):
+        """
+        New symbols start in the hot tier and settle from there.
+        """
+        hot = self.tiers['hot']
+        for symbol in hot.watchlist.add_many([symbol for symbol in symbols
+                                              if symbol not in self.tier_of]):
+            self.tier_of[symbol] = hot
+            self.activity[symbol] = self.thresholds['hot']
+        hot.next_due = min(hot.next_due, self.clock())
+
+    def remove_many(self, symbols):
+        for symbol in symbols:
+            tier = self.tier_of.pop(symbol, None)
+            if tier is not None:
+                tier.watchlist.remove(symbol)
+                del self.activity[symbol]
+
+    def due(self):
+        """
+        @return the tiers that should be polled now. Each is marked as
+            started, and must be handed back to completed().
+        """
+        now = self.clock()
+        due = [tier for tier in self.tiers.values()
+               if len(tier.watchlist) and tier.next_due <= now]
+        for tier in due:
+            tier.started = now
+        return due
+
+    def completed(self, tier, fetched, changed, error=False):
+        """
+        Records a poll of a tier and schedules its next one.
+
+        @tier a Tier returned by due().
+        @fetched the symbols whose quotes were retrieved.
+        @changed the set of those symbols whose quotes changed.
+        @error True if the poll failed altogether.
+        """
+        now = self.clock()
+        if error:
+            tier.failures += 1
+            delay = min(MAX_BACKOFF, tier.interval * 2 ** tier.failures)
+            delay *= 0.5 + self.random()
+            tier.next_due = now + delay
+            return
+        tier.failures = 0
+        if tier.last_refresh is not None:
+            achieved = tier.started - tier.last_refresh
+            if tier.achieved is None:
+                tier.achieved = achieved
+            else:
+                tier.achieved += LATENCY_ALPHA * (achieved - tier.achieved)
+        tier.last_refresh = tier.started
+        # Anchor on the start of the poll so that slow polls do not drift.
+        tier.next_due = max(now, tier.started + self.interval(tier, now))
+        self.retier(fetched, changed)
+
+    def retier(self, fetched, changed):
+        """
+        Updates the activity scores of polled symbols, moving the ones
+        that crossed a threshold to their new tier.
+        """
+        moves = dict((name, []) for name in TIERS)
+        for symbol in fetched:
+            tier = self.tier_of.get(symbol)
+            if tier is None:
+                continue
+            score = self.activity[symbol]
+            score += ACTIVITY_ALPHA * ((symbol in changed) - score)
+            self.activity[symbol] = score
+            if score >= self.thresholds['hot']:
+                name = 'hot'
+            elif score >= self.thresholds['warm']:
+                name = 'warm'
+            else:
+                name = 'cold'
+            if name != tier.name:
+                moves[name].append(symbol)
+        for name, symbols in moves.items():
+            if not symbols:
+                continue
+            destination = self.tiers[name]
+            for symbol in symbols:
+                self.tier_of[symbol].watchlist.remove(symbol)
+                self.tier_of[symbol] = destination
+            destination.watchlist.add_many(symbols)
+
+    def interval(self, tier, now):
+        """
+        @return the seconds between polls of the tier at the given time.
+        """
+        if self.market_open(now):
+            return tier.interval
+        return tier.interval * CLOSED_INTERVAL_FACTOR
+
+    def market_open(self, now):
+        moment = time.localtime(now)
+        return (moment.tm_wday < 5 and
+                MARKET_OPEN <= (moment.tm_hour, moment.tm_min) < MARKET_CLOSE)
+
+    def next_wakeup(self):
+        """
+        @return the seconds until the next tier is due, or None if there
+            is nothing to poll.
+        """
+        due = [tier.next_due for tier in self.tiers.values() if len(tier.watchlist)]
+        if not due:
+            return None
+        return max(0.0, min(due) - self.clock())
+
+    def latency(self):
+        """
+        @return for each tier, its number of symbols, its target refresh
+            interval right now and the interval it has achieved.
+        """
+        now = self.clock()
+        return OrderedDict((name, {'symbols': len(tier.watchlist),
+                                   'target': self.interval(tier, now),
+                                   'achieved': tier.achieved})
+                           for name, tier in self.tiers.items())
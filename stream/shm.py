@@ -0,0 +1,273 @@
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import numpy as np
+from config import SHARED_QUOTES_CAPACITY
+from snapshot import field_value
+
+
+
+log = logging.getLogger(__name__)
+
+MAGIC = 'STKQUOTE'
+VERSION = 1
+# The magic, the layout version, the number of rows, the number of fields
+# and the width of a symbol, followed by the generation counter, which is
+# odd while rows are being assigned or released and changes every time.
+HEADER = struct.Struct('<8sIIII')
+GENERATION_OFFSET = HEADER.size
+COUNTER = struct.Struct('<Q')
+# Bytes per field name, listed after the header in column order.
+NAME_WIDTH = 32
+SYMBOL_WIDTH = 16
+
+def row_dtype(fields):
+    """
+    @return the NumPy dtype of a row: its sequence number, odd while the
+        row is being written, the symbol (empty in a free row), the time
+        it was last written, and one float64 per field, NaN when missing.
+    """
+    return np.dtype([('sequence', '<u8'), ('symbol', 'S{}'.format(SYMBOL_WIDTH)),
+                     ('updated', '<f8')] + [(field, '<f8') for field in fields])
+
+def rows_offset(fields):
+    # Rows start at a 64-byte boundary after the header and field names.
+    size = GENERATION_OFFSET + 8 + NAME_WIDTH * len(fields)
+    return (size + 63) // 64 * 64
+
+class QuoteTable(object):
+    """
+    Writer of a fixed-layout table of the latest quotes in a memory-mapped
+    file, which QuoteTableReaders in other processes map too. Each symbol
+    keeps its row until it is removed. Rows are written seqlock style:
+    their sequence number is made odd, the values are stored and it is
+    made even again, so readers retry instead of taking a lock. This
+    relies on the stores becoming visible in program order, as they do on
+    x86. There must be a single writer of a file.
+    """
+
+    def __init__(self, path, fields, capacity=SHARED_QUOTES_CAPACITY):
+        self.path = path
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        dtype = row_dtype(self.fields)
+        offset = rows_offset(self.fields)
+        header = HEADER.pack(MAGIC, VERSION, capacity, len(self.fields), SYMBOL_WIDTH) + \
+            struct.pack('<Q', 0) + \
+            ''.join(struct.pack('{}s'.format(NAME_WIDTH), field) for field in self.fields)
+        # The table is built next to path and renamed into place, so that
+        # readers never open a half-made one.
+        handle, temporary = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            os.fchmod(handle, 0o644)
+            os.ftruncate(handle, offset + dtype.itemsize * capacity)
+            os.write(handle, header)
+            self.map = mmap.mmap(handle, offset + dtype.itemsize * capacity)
+        finally:
+            os.close(handle)
+        os.rename(temporary, path)
+        self.rows = np.frombuffer(self.map, dtype, capacity, offset)
+        self.sequence = self.rows['sequence']
+        self.generation = np.frombuffer(self.map, '<u8', 1, GENERATION_OFFSET)
+        self.row_of = {}
+        self.free = range(capacity - 1, -1, -1)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.row_of)
+
+    def update(self, quotes):
+        """
+        Writes the fields of a batch of quotes, at most one per symbol,
+        giving new symbols a row. Symbols longer than SYMBOL_WIDTH, and new
+        ones once every row is taken, are left out.
+
+        @quotes Quote records, or any objects with the fields as
+            attributes (such as rows of a query).
+        """
+        with self.lock:
+            row_of = self.row_of
+            rows = []
+            fresh = []
+            kept = []
+            for quote in quotes:
+                symbol = str(quote.symbol)
+                row = row_of.get(symbol)
+                if row is None:
+                    if not self.free or len(symbol) > SYMBOL_WIDTH:
+                        continue
+                    row = self.free.pop()
+                    row_of[symbol] = row
+                    fresh.append((row, symbol))
+                rows.append(row)
+                kept.append(quote)
+            if len(kept) < len(quotes):
+                log.warning('%d symbol(s) left out of the shared quote table %s, which holds '
+                            '%d symbols of up to %d characters.', len(quotes) - len(kept),
+                            self.path, self.capacity, SYMBOL_WIDTH)
+            if not rows:
+                return
+            values = [np.fromiter((field_value(quote, field) for quote in kept), np.float64, len(kept))
+                      for field in self.fields]
+            rows = np.array(rows, dtype=np.intp)
+            if fresh:
+                self.generation += 1
+            self.sequence[rows] += 1
+            for row, symbol in fresh:
+                self.rows['symbol'][row] = symbol
+            for field, column in zip(self.fields, values):
+                self.rows[field][rows] = column
+            self.rows['updated'][rows] = time.time()
+            self.sequence[rows] += 1
+            if fresh:
+                self.generation += 1
+
+    def remove(self, symbols):
+        """
+        Frees the rows of the symbols.
+        """
+        with self.lock:
+            rows = []
+            for symbol in symbols:
+                row = self.row_of.pop(symbol, None)
+                if row is not None:
+                    self.free.append(row)
+                    rows.append(row)
+            if not rows:
+                return
+            self.generation += 1
+            self.sequence[rows] += 1
+            self.rows['symbol'][rows] = ''
+            for field in self.fields:
+                self.rows[field][rows] = np.nan
+            self.sequence[rows] += 1
+            self.generation += 1
+
+    def close(self):
+        """
+        Unmaps the table; the file stays for readers until it is replaced.
+        """
+        del self.rows, self.sequence, self.generation
+        self.map.close()
+
+class QuoteTableReader(object):
+    """
+    Maps a QuoteTable's file read-only. get() and snapshot() return
+    consistent rows, retrying any row that was written while it was being
+    read, without locks or system calls. rows is the live table itself,
+    read-only, for vectorized reads that can do without that guarantee.
+    Single rows are unpacked straight from the mapping, which is cheaper
+    than NumPy's scalar indexing.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as table:
+            self.map = mmap.mmap(table.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, capacity, count, width = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION or width != SYMBOL_WIDTH:
+            raise ValueError('{} is not a version {} quote table.'.format(path, VERSION))
+        names = self.map[GENERATION_OFFSET + 8:GENERATION_OFFSET + 8 + NAME_WIDTH * count]
+        self.fields = tuple(names[i:i + NAME_WIDTH].rstrip('\0')
+                            for i in range(0, len(names), NAME_WIDTH))
+        self.capacity = capacity
+        self.offset = rows_offset(self.fields)
+        self.rows = np.frombuffer(self.map, row_dtype(self.fields), capacity, self.offset)
+        self.record = struct.Struct('<Q{}sd{}d'.format(SYMBOL_WIDTH, len(self.fields)))
+        self.names = self.fields + ('updated',)
+        self.sequence = self.rows['sequence']
+        self.generation = np.frombuffer(self.map, '<u8', 1, GENERATION_OFFSET)
+        self.indexed = None
+        self.row_of = {}
+
+    def index(self):
+        """
+        @return a dictionary of each symbol's row, rebuilt whenever rows
+            have been assigned or released since it was last built.
+        """
+        while True:
+            generation, = COUNTER.unpack_from(self.map, GENERATION_OFFSET)
+            if generation == self.indexed:
+                return self.row_of
+            if generation & 1:
+                continue
+            symbols = self.rows['symbol'].copy()
+            if COUNTER.unpack_from(self.map, GENERATION_OFFSET)[0] == generation:
+                rows = np.flatnonzero(symbols)
+                self.row_of = dict(zip(symbols[rows].tolist(), rows.tolist()))
+                self.indexed = generation
+
+    def read(self, row):
+        """
+        @return a consistent copy of a row: a tuple of its sequence
+            number, symbol, time written and fields.
+        """
+        position = self.offset + row * self.record.size
+        while True:
+            before, = COUNTER.unpack_from(self.map, position)
+            if before & 1:
+                continue
+            record = self.record.unpack_from(self.map, position)
+            if COUNTER.unpack_from(self.map, position)[0] == before:
+                return record
+
+    def get(self, symbol):
+        """
+        @return a dictionary of the symbol's fields and the time they were
+            written, or None if it is not in the table.
+        """
+        while True:
+            row = self.index().get(symbol)
+            if row is None:
+                return None
+            record = self.read(row)
+            if record[1].rstrip('\0') == symbol:
+                return dict(zip(self.names, record[3:] + record[2:3]))
+            # The row was given to another symbol since the index was built.
+            self.indexed = None
+
+    def snapshot(self):
+        """
+        @return a consistent copy of every row, as a NumPy structured
+            array; rows that hold no symbol have an empty one.
+        """
+        before = self.sequence.copy()
+        rows = self.rows.copy()
+        torn = np.flatnonzero((before & 1).astype(bool) | (before != self.sequence))
+        while len(torn):
+            before = self.sequence[torn]
+            rows[torn] = self.rows[torn]
+            torn = torn[(before & 1).astype(bool) | (before != self.sequence[torn])]
+        return rows
+
+    def close(self):
+        del self.rows, self.sequence, self.generation
+        self.map.close()
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Print the latest quotes from a shared '
+                                     'quote table (SHARED_QUOTES).')
+    parser.add_argument('table', help='the file of the table')
+    parser.add_argument('symbols', nargs='*', help='symbols to print (default: all of them)')
+    args = parser.parse_args()
+    reader = QuoteTableReader(args.table)
+    if args.symbols:
+        quotes = [(symbol, reader.get(symbol.upper())) for symbol in args.symbols]
+    else:
+        rows = reader.snapshot()
+        rows = rows[rows['symbol'] != '']
+        quotes = [(row['symbol'], dict((field, row[field]) for field in reader.fields))
+                  for row in rows]
+    for symbol, quote in quotes:
+        if quote is None:
+            print('{}: not in the table'.format(symbol))
+        else:
+            print('{}: {}'.format(symbol, ', '.join('{}={}'.format(field, quote[field])
+                                                   for field in reader.fields)))
+
+if __name__ == '__main__':
+    main()
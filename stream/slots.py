@@ -0,0 +1,69 @@
+import numpy as np
+
+
+
+def grow(array, capacity, fill):
+    """
+    @return a copy of array with capacity rows, the new ones set to fill.
+    """
+    grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    grown[len(array):] = fill
+    return grown
+
+class SymbolSlots(object):
+    """
+    Assigns each symbol a row of per-symbol NumPy arrays. Rows of removed
+    symbols are reused, and the capacity doubles when every row is taken;
+    owners of the arrays grow them to match.
+    """
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.row_of = {}
+        self.symbols = [None] * capacity
+        self.free = range(capacity - 1, -1, -1)
+
+    def __len__(self):
+        return len(self.row_of)
+
+    def __contains__(self, symbol):
+        return symbol in self.row_of
+
+    def assign(self, symbols):
+        """
+        @symbols an iterable of symbols, each at most once.
+        @return an array of their rows, and a list of the rows that were
+            newly assigned and must be reset by the owner.
+        """
+        row_of = self.row_of
+        rows = []
+        fresh = []
+        for symbol in symbols:
+            row = row_of.get(symbol)
+            if row is None:
+                if not self.free:
+                    self.free = range(2 * self.capacity - 1, self.capacity - 1, -1)
+                    self.symbols.extend([None] * self.capacity)
+                    self.capacity *= 2
+                row = self.free.pop()
+                row_of[symbol] = row
+                self.symbols[row] = symbol
+                fresh.append(row)
+            rows.append(row)
+        return np.array(rows, dtype=np.intp), fresh
+
+    def release(self, symbols):
+        """
+        Frees the rows of the symbols.
+
+        @return the rows that were freed.
+        """
+        freed = []
+        for symbol in symbols:
+            row = self.row_of.pop(symbol, None)
+            if row is not None:
+                self.symbols[row] = None
+                self.free.append(row)
+                freed.append(row)
+        return freed
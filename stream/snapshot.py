@@ -0,0 +1,146 @@
+import threading
+from contextlib import contextmanager
+import numpy as np
+from slots import SymbolSlots, grow
+
+
+
+class SnapshotView(object):
+    """
+    Read-only columns of a Snapshot. Each field is a float64 array with
+    one element per row, NaN where a value is missing; rows that hold no
+    symbol are False in active. Comparisons with NaN are False, so a
+    screen like
+
+        (view.last_trade_price > view.sma_20) & (view.volume > 1e6)
+
+    only selects rows that have every value it uses (NumPy warns about
+    them outside of np.errstate(invalid='ignore'), which read() sets).
+    """
+
+    def __init__(self, symbols, active, columns, row_of):
+        self.symbols = symbols
+        self.active = active
+        self.columns = columns
+        self.row_of = row_of
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['columns'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __len__(self):
+        return int(self.active.sum())
+
+    def row(self, symbol):
+        """
+        @return the row of the symbol, or None if it is not in the view.
+        """
+        return self.row_of.get(symbol)
+
+    def select(self, mask):
+        """
+        @mask a boolean array with one element per row.
+        @return the symbols of the active rows where mask is True.
+        """
+        return self.symbols[mask & self.active].tolist()
+
+def field_value(quote, field):
+    """
+    @return the quote's attribute or, failing that, its stats entry named
+        field, or NaN if it has neither.
+    """
+    value = getattr(quote, field, None)
+    if value is None:
+        stats = getattr(quote, 'stats', None)
+        if stats is not None:
+            value = stats.get(field)
+    return np.nan if value is None else value
+
+def read_only(array):
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+class Snapshot(object):
+    """
+    The latest value of each field for every symbol in the watchlist,
+    kept column by column in NumPy arrays that are updated in place with
+    each batch of quotes. Fields are Quote attributes or, failing that,
+    keys of quote.stats. Readers get read-only views through read(),
+    which holds off updates while it is open, or copies through copy().
+    """
+
+    def __init__(self, fields, capacity=1024):
+        self.fields = tuple(fields)
+        self.slots = SymbolSlots(capacity)
+        self.lock = threading.Lock()
+        self.symbols = np.empty(capacity, dtype=object)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.columns = dict((field, np.full(capacity, np.nan)) for field in self.fields)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def update(self, quotes):
+        """
+        Stores the values of a batch of quotes, adding their symbols if
+        they are new.
+
+        @quotes Quote records, or any objects with the fields as
+            attributes (such as rows of a query), at most one per symbol.
+        """
+        n = len(quotes)
+        if not n:
+            return
+        values = {}
+        for field in self.fields:
+            values[field] = np.fromiter((field_value(quote, field) for quote in quotes),
+                                        np.float64, n)
+        with self.lock:
+            rows, fresh = self.slots.assign([quote.symbol for quote in quotes])
+            if self.slots.capacity > len(self.active):
+                self.grow(self.slots.capacity)
+            for row in fresh:
+                self.symbols[row] = self.slots.symbols[row]
+            self.active[rows] = True
+            for field, column in self.columns.items():
+                column[rows] = values[field]
+
+    def remove(self, symbols):
+        with self.lock:
+            rows = self.slots.release(symbols)
+            self.symbols[rows] = None
+            self.active[rows] = False
+            for column in self.columns.values():
+                column[rows] = np.nan
+
+    @contextmanager
+    def read(self):
+        """
+        Yields a SnapshotView of the live arrays, without copying them.
+        Updates wait until the block ends, so keep it short.
+        """
+        with self.lock, np.errstate(invalid='ignore'):
+            yield SnapshotView(read_only(self.symbols), read_only(self.active),
+                               dict((field, read_only(column))
+                                    for field, column in self.columns.items()),
+                               self.slots.row_of)
+
+    def copy(self):
+        """
+        @return a SnapshotView of copies of the arrays, which later updates
+            leave alone.
+        """
+        with self.lock:
+            return SnapshotView(read_only(self.symbols.copy()), read_only(self.active.copy()),
+                                dict((field, read_only(column.copy()))
+                                     for field, column in self.columns.items()),
+                                dict(self.slots.row_of))
+
+    def grow(self, capacity):
+        self.symbols = grow(self.symbols, capacity, None)
+        self.active = grow(self.active, capacity, False)
+        for field in self.fields:
+            self.columns[field] = grow(self.columns[field], capacity, np.nan)
@@ -1,11 +1,12 @@
 import sys
 import platform
-import threading
+import Queue
 import PySide
-from time import sleep
-from PySide import QtGui, QtCore, QtSql
-from config import __version__, SQLALCHEMY_DATABASE_NAME
+from PySide import QtGui, QtCore
+from config import __version__
 from models import Stock
+from util import get_session
+from metrics import registry
 from datetime import datetime
 
 import process, windowSettable
@@ -14,6 +15,120 @@ import process, windowSettable
 
 app = QtGui.QApplication(sys.argv)
 
+# Milliseconds between applying queued quote updates to the view,
+# i.e. at most one repaint per frame at 60 Hz.
+FRAME_INTERVAL = 16
+
+# Milliseconds between checks for alert events, and how long each one
+# stays in the status bar.
+ALERT_INTERVAL = 250
+ALERT_MESSAGE_TIMEOUT = 10000
+
+# Frames that repainted part of the table, and the dataChanged signals
+# they emitted.
+ui_frames = registry.counter('ui.frames')
+ui_updates = registry.counter('ui.updates')
+
+
+
+class QuoteTableModel(QtCore.QAbstractTableModel):
+    """
+    Table model fed by a conflating subscription to the Streamer's quote
+    bus. The subscription coalesces updates per symbol between frames;
+    they are applied once per frame on the GUI thread, emitting
+    dataChanged only for the cells that actually changed. fields names
+    the columns the Streamer's projection fills in; the others are left
+    as loaded. Quotes of symbols that are not in watched (the Streamer's
+    watchlist) any more, which were published just before they were
+    removed, are dropped instead of bringing their rows back.
+    """
+    
+    columns = ('symbol', 'last_trade_price', 'change')
+    headers = ('Symbol', 'Last Price', 'Change')
+    
+    def __init__(self, subscription, rows=(), fields=columns, watched=None, parent=None):
+        super(QuoteTableModel, self).__init__(parent)
+        
+        self.subscription = subscription
+        self.fields = frozenset(fields)
+        self.watched = watched
+        self.rows = [list(row) for row in rows]
+        self.row_of = dict((row[0], i) for i, row in enumerate(self.rows))
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(FRAME_INTERVAL)
+        self.timer.timeout.connect(self.apply_pending)
+        self.timer.start()
+        
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+        
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+        
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and index.isValid():
+            return self.rows[index.row()][index.column()]
+        return None
+        
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.headers[section]
+        return None
+        
+    def apply_pending(self):
+        """
+        Applies the queued updates on the GUI thread. Consecutive rows
+        whose changed cells span the same columns share one dataChanged.
+        """
+        spans = []
+        for quote in self.subscription.get(timeout=0):
+            symbol = quote.symbol
+            if self.watched is not None and symbol not in self.watched:
+                continue
+            if symbol not in self.row_of:
+                self.add_symbol(symbol)
+            row = self.row_of[symbol]
+            values = self.rows[row]
+            changed = [column for column, key in enumerate(self.columns)
+                       if key in self.fields and getattr(quote, key) != values[column]]
+            for column in changed:
+                values[column] = getattr(quote, self.columns[column])
+            if changed:
+                spans.append((row, changed[0], changed[-1]))
+        spans.sort()
+        i = 0
+        while i < len(spans):
+            first, left, right = spans[i]
+            last = first
+            while (i + 1 < len(spans) and spans[i + 1][0] == last + 1 and
+                   spans[i + 1][1:] == (left, right)):
+                i += 1
+                last += 1
+            self.dataChanged.emit(self.index(first, left), self.index(last, right))
+            ui_updates.inc()
+            i += 1
+        if spans:
+            ui_frames.inc()
+            
+    def add_symbol(self, symbol):
+        if symbol in self.row_of:
+            return
+        row = len(self.rows)
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self.rows.append([symbol] + [None] * (len(self.columns) - 1))
+        self.row_of[symbol] = row
+        self.endInsertRows()
+        
+    def remove_symbol(self, symbol):
+        row = self.row_of.pop(symbol, None)
+        if row is None:
+            return
+        self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+        del self.rows[row]
+        for moved in self.rows[row:]:
+            self.row_of[moved[0]] -= 1
+        self.endRemoveRows()
+
 
 
 class MainWindow(QtGui.QMainWindow, windowSettable.WindowSettable):
@@ -21,7 +136,7 @@ class MainWindow(QtGui.QMainWindow, windowSettable.WindowSettable):
     def __init__(self):
         super(MainWindow, self).__init__()
         
-        self.db_model = None
+        self.quote_model = None
         self.streamer = process.Streamer()
         self.initUI()
         
@@ -70,20 +185,16 @@ class MainWindow(QtGui.QMainWindow, windowSettable.WindowSettable):
         # From http://qt-project.org/doc/note_revisions/312/514/view
         self.toolbar.setObjectName('Toolbar')
         
-        # Set up central stocks widget.
-        stocks_db = QtSql.QSqlDatabase.addDatabase("QSQLITE")
-        stocks_db.setDatabaseName("db/{}.db".format(SQLALCHEMY_DATABASE_NAME))
-        stocks_db.open()
-        self.db_model = QtSql.QSqlTableModel(db=stocks_db)
-        self.db_model.setTable(Stock.__tablename__)
-        self.db_model.setEditStrategy(QtSql.QSqlTableModel.OnManualSubmit)
-        self.db_model.select()
-        self.db_model.removeColumn(0)
-        self.db_model.setHeaderData(0, QtCore.Qt.Horizontal, 'Symbol')
-        self.db_model.setHeaderData(1, QtCore.Qt.Horizontal, 'Last Price')
-        self.db_model.setHeaderData(2, QtCore.Qt.Horizontal, 'Change')
+        # Set up central stocks widget, fed by the streamer.
+        with get_session() as session:
+            rows = session.query(Stock.symbol, Stock.last_trade_price, Stock.change).all()
+        # Conflating, and bounded only by the number of symbols, so the
+        # table never misses a symbol's latest quote.
+        subscription = self.streamer.subscribe(maxsize=None)
+        self.quote_model = QuoteTableModel(subscription, rows, self.streamer.projection.columns,
+                                           self.streamer.watchlist, self)
         stocks_view = QtGui.QTableView()
-        stocks_view.setModel(self.db_model)
+        stocks_view.setModel(self.quote_model)
         #stocks_view.verticalHeader().setResizeMode(QtGui.QHeaderView.Interactive)
         #stocks_view.setFont(QtGui.QFont('SansSerif', 8))
         scroll_area = QtGui.QScrollArea()
@@ -91,39 +202,50 @@ class MainWindow(QtGui.QMainWindow, windowSettable.WindowSettable):
         scroll_area.setWidget(stocks_view)
         self.setCentralWidget(scroll_area)
         
+        # Show fired alerts in the status bar.
+        self.alert_events = self.streamer.alerts.subscribe()
+        self.alert_timer = QtCore.QTimer(self)
+        self.alert_timer.setInterval(ALERT_INTERVAL)
+        self.alert_timer.timeout.connect(self.show_alerts)
+        self.alert_timer.start()
+        
         # Set window size and position.
         self.setGeometry(300, 300, 800, 250)
         self.setWindowTitle('Stock Stream')
         
-        # Initiate other threads.
-        refresh_thread = threading.Thread(target=self.refresh)
-        refresh_thread.daemon = True
-        self.streamer.threads.append(refresh_thread)
-        
         # Initiate the stream and show the GUI.
-        refresh_thread.start()
         self.streamer.run()
         self.show()
         
-    def refresh(self):
-        """
-        Retrieves data (hopefully updated) every 100 ms from the
-        database. Used to refresh the view with updated information.
-        Run on a separate thread.
-        """
-        while True:
-            self.db_model.select()
-            sleep(0.1)
-            
     def closeEvent(self, event):
         # Save current window attributes (position, size).
         self._writeWindowAttributeSettings()
+        # Let the streamer write the poll in progress and end its thread,
+        # which the application waits for on exit.
+        self.streamer.stop()
             ############### QUARANTINE ################
           ###                                         ###
         ###  super(MainWindow, self).closeEvent(event)  ###
           ###                                         ###
             ############### QUARANTINE ################
         
+    def show_alerts(self):
+        """
+        Shows the latest alert event queued since the last check, with the
+        number of others, in the status bar.
+        """
+        events = []
+        while True:
+            try:
+                events.append(self.alert_events.get_nowait())
+            except Queue.Empty:
+                break
+        if events:
+            message = str(events[-1])
+            if len(events) > 1:
+                message += ' (and {} more alerts)'.format(len(events) - 1)
+            self.statusBar().showMessage(message, ALERT_MESSAGE_TIMEOUT)
+        
     def show_add_stock_dialog(self):
         """
         Creates a dialog box to prompt the user for a stock to insert
@@ -133,6 +255,8 @@ class MainWindow(QtGui.QMainWindow, windowSettable.WindowSettable):
         stock_string = str(stock_qstring)
         if ok:
             self.streamer.add(stock_string)
+            if self.streamer.find_local(stock_string.upper()) is not None:
+                self.quote_model.add_symbol(stock_string.upper())
             
     def show_remove_stock_dialog(self):
         """
@@ -143,6 +267,8 @@ class MainWindow(QtGui.QMainWindow, windowSettable.WindowSettable):
         stock_string = str(stock_qstring)
         if ok:
             self.streamer.remove(stock_string)
+            if self.streamer.find_local(stock_string.upper()) is None:
+                self.quote_model.remove_symbol(stock_string.upper())
             
     def show_license_box(self):
         """
@@ -210,11 +336,3 @@ class Example(QtGui.QWidget):
             event.accept()
         else:
             event.ignore()
-    
-    
-
-class Table(QtSql.QSqlTableModel):
-    
-    def __init__(self, db):
-        super(Table, self).__init__()
-
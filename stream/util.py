@@ -1,13 +1,23 @@
+import os
+import errno
+import select
+import signal
+import threading
 from contextlib import contextmanager
 from stream import Session
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 
 
 @contextmanager
 def get_session():
     """
-    Creates and disposes of a (scoped) session properly
-    in a multithreaded application.
+    Yields the calling thread's (scoped) session, and closes it at the
+    end, which ends its transaction and hands its connection back to the
+    pool. Errors roll the session back and are raised again.
     From http://stackoverflow.com/q/5544774
     """
     session = Session()
@@ -15,16 +25,76 @@ def get_session():
         yield session
     except:
         session.rollback()
+        raise
     finally:
         session.close()
 
+def to_float(value):
+    """
+    Converts a quote field to a float.
+    
+    @return the number, or None for missing and 'N/A' values.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def to_int(value):
+    """
+    Converts a quote field to an int.
+    
+    @return the number, or None for missing and 'N/A' values.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
 def join_threads(threads):
     """
-    Join threads in interruptable fashion.
-    Necessary for ^C'ing out of a program (KeyboardInterrupt)
-    when there is a raw_input prompt.
-    From http://stackoverflow.com/a/9790882/145400
+    Waits for threads to finish without making the main thread deaf to
+    signals, which it is during a plain join() in Python 2. Each thread
+    is joined by a helper that then writes to a pipe, and the main thread
+    blocks reading the pipe; signal.set_wakeup_fd makes a signal write to
+    it as well, so its handler runs right away. Where select() cannot
+    wait on pipes (Windows) the threads are joined with a timeout.
     """
+    threads = [t for t in threads if t.is_alive()]
+    if fcntl is None:
+        for t in threads:
+            while t.is_alive():
+                t.join(1)
+        return
+    read_end, write_end = os.pipe()
+    fcntl.fcntl(write_end, fcntl.F_SETFL, os.O_NONBLOCK)
+    
+    def watch(thread):
+        thread.join()
+        try:
+            os.write(write_end, 'x')
+        except OSError:
+            # join_threads was interrupted and closed the pipe.
+            pass
+        
     for t in threads:
-        while t.isAlive():
-            t.join(5)
\ No newline at end of file
+        watcher = threading.Thread(target=watch, args=(t,))
+        watcher.daemon = True
+        watcher.start()
+    previous = signal.set_wakeup_fd(write_end)
+    finished = 0
+    try:
+        while finished < len(threads):
+            try:
+                select.select([read_end], [], [])
+                finished += os.read(read_end, 512).count('x')
+            except (select.error, OSError) as e:
+                if e.args[0] != errno.EINTR:
+                    raise
+    finally:
+        signal.set_wakeup_fd(previous)
+        os.close(read_end)
+        # Helpers still running write to write_end, which must not be
+        # reused for another file until they are done.
+        if finished == len(threads):
+            os.close(write_end)
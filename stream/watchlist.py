@@ -0,0 +1,97 @@
+from collections import OrderedDict
+from config import FETCH_SHARD_SIZE
+
+
+
+class Shard(object):
+    """
+    Up to shard_size symbols fetched in one request, with the query
+    string that requests them.
+    """
+
+    __slots__ = ('symbols', 'query')
+
+    def __init__(self):
+        self.symbols = []
+        self.query = ''
+
+    def rebuild(self):
+        self.query = repr('","'.join(self.symbols))
+
+class Watchlist(object):
+    """
+    Ordered set of the symbols a Streamer follows. Membership tests are
+    constant time, and the symbols are kept split into shards whose query
+    strings are rebuilt only when their own symbols change.
+    """
+
+    def __init__(self, symbols=(), shard_size=FETCH_SHARD_SIZE):
+        self.shard_size = shard_size
+        self.shard_of = OrderedDict()
+        self.shards = []
+        self.add_many(symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self.shard_of
+
+    def __len__(self):
+        return len(self.shard_of)
+
+    def __iter__(self):
+        return iter(self.shard_of)
+
+    def add(self, symbol):
+        """
+        @return True if the symbol was added, False if already present.
+        """
+        return bool(self.add_many([symbol]))
+
+    def remove(self, symbol):
+        """
+        @return True if the symbol was removed, False if not present.
+        """
+        return bool(self.remove_many([symbol]))
+
+    def add_many(self, symbols):
+        """
+        Appends the symbols that are not in the watchlist yet, filling up
+        the last shard before starting a new one.
+
+        @return the symbols that were added.
+        """
+        added = []
+        touched = set()
+        for symbol in symbols:
+            if symbol in self.shard_of:
+                continue
+            if not self.shards or len(self.shards[-1].symbols) >= self.shard_size:
+                self.shards.append(Shard())
+            shard = self.shards[-1]
+            shard.symbols.append(symbol)
+            self.shard_of[symbol] = shard
+            touched.add(shard)
+            added.append(symbol)
+        for shard in touched:
+            shard.rebuild()
+        return added
+
+    def remove_many(self, symbols):
+        """
+        Removes the symbols from their shards; shards left empty are dropped.
+
+        @return the symbols that were removed.
+        """
+        removed = []
+        touched = set()
+        for symbol in symbols:
+            shard = self.shard_of.pop(symbol, None)
+            if shard is None:
+                continue
+            shard.symbols.remove(symbol)
+            touched.add(shard)
+            removed.append(symbol)
+        for shard in touched:
+            shard.rebuild()
+        if any(not shard.symbols for shard in touched):
+            self.shards = [shard for shard in self.shards if shard.symbols]
+        return removed
@@ -0,0 +1,216 @@
+import json
+import logging
+import struct
+import time
+import zlib
+from array import array
+from datetime import datetime
+from functools import partial
+from multiprocessing import Process, Pipe
+from threading import Lock
+from timeit import default_timer as timer
+from config import QUOTE_PROVIDER, WORKER_PROCESSES
+from providers import Provider, ProviderError, make_provider
+from quote import FIELD_COLUMNS, Quote
+from util import to_int
+from metrics import registry
+
+
+
+log = logging.getLogger(__name__)
+
+# A batch's quote count, the byte lengths of its symbols, failed shards
+# and extra properties sections, and the time its quotes were retrieved.
+HEADER = struct.Struct('<IIIId')
+
+NAN = float('nan')
+
+batches = registry.counter('workers.batches')
+batch_bytes = registry.counter('workers.bytes')
+restarts = registry.counter('workers.restarts')
+unpack_timer = registry.timer('workers.unpack')
+
+class BatchCodec(object):
+    """
+    Packs a worker's quotes into one flat buffer, column by column, and
+    unpacks it in the aggregator: the symbols joined by newlines, the
+    projected columns as one array of doubles (NaN for None), and the
+    extra properties, if any are projected, as JSON. Failed shards travel
+    along as tab-separated symbol lists.
+    """
+
+    def __init__(self, projection):
+        self.columns = projection.columns
+        self.integers = frozenset(column for column, convert in FIELD_COLUMNS.values()
+                                  if convert is to_int)
+        self.extra = projection.extra
+
+    def pack(self, quotes, failed=(), retrieved=None):
+        symbols = '\n'.join(quote.symbol for quote in quotes)
+        failed = '\t'.join('\n'.join(shard) for shard in failed)
+        values = array('d')
+        for column in self.columns:
+            values.extend(NAN if value is None else value
+                          for value in (getattr(quote, column) for quote in quotes))
+        extra = ''
+        if self.extra:
+            extra = json.dumps([[quote.extra.get(name) for name in self.extra]
+                                for quote in quotes])
+        header = HEADER.pack(len(quotes), len(symbols), len(failed), len(extra),
+                             time.time() if retrieved is None else retrieved)
+        return ''.join((header, symbols, failed, extra, values.tostring()))
+
+    def unpack(self, buffer):
+        """
+        @return the list of quotes and the list of failed shards.
+        """
+        count, symbols_length, failed_length, extra_length, retrieved = \
+            HEADER.unpack_from(buffer)
+        position = HEADER.size
+        symbols = buffer[position:position + symbols_length].split('\n') if count else []
+        position += symbols_length
+        failed = buffer[position:position + failed_length]
+        failed = [shard.split('\n') for shard in failed.split('\t')] if failed else []
+        position += failed_length
+        extra = json.loads(buffer[position:position + extra_length]) if extra_length else None
+        position += extra_length
+        values = array('d')
+        values.fromstring(buffer[position:])
+        now = datetime.utcfromtimestamp(retrieved)
+        quotes = [Quote(symbol, updated_at=now) for symbol in symbols]
+        for i, column in enumerate(self.columns):
+            convert = int if column in self.integers else float
+            column_values = values[i * count:(i + 1) * count]
+            for quote, value in zip(quotes, column_values):
+                if value == value:
+                    setattr(quote, column, convert(value))
+        if extra is not None:
+            for quote, row in zip(quotes, extra):
+                quote.extra = dict(zip(self.extra, row))
+        return quotes, failed
+
+def work(connection, factory, projection):
+    """
+    Worker process: fetches each requested slice of symbols with its own
+    provider, factory(projection=projection), and sends the quotes back
+    packed, until it gets an empty request.
+    """
+    provider = factory(projection=projection)
+    codec = BatchCodec(projection)
+    try:
+        while True:
+            request = connection.recv_bytes()
+            if not request:
+                return
+            quotes = provider.fetch(request.split('\n'))
+            connection.send_bytes(codec.pack(quotes, provider.failed))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        provider.close()
+
+class Worker(object):
+    """
+    The aggregator's end of one worker process.
+    """
+
+    def __init__(self, factory, projection):
+        self.connection, child = Pipe()
+        self.process = Process(target=work, args=(child, factory, projection))
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+
+    def stop(self):
+        try:
+            self.connection.send_bytes('')
+        except IOError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.connection.close()
+
+class WorkerPool(Provider):
+    """
+    Multi-process provider: fetching and decoding run in worker
+    processes, one core each, instead of on threads sharing the GIL. Each
+    worker owns the slice of the watchlist whose symbols hash to it, and
+    fetches it with its own provider, made by factory(projection=...)
+    in the worker (by default the QUOTE_PROVIDER one). The quotes come back over a pipe as
+    a packed BatchCodec buffer, so the aggregator, which owns the database
+    writer and the UI feed, only does the cheap unpacking. A worker that
+    dies is replaced, and its slice reported as failed for that poll.
+    """
+
+    remote = True
+
+    def __init__(self, workers=WORKER_PROCESSES, factory=None, projection=None, max_batch=None):
+        Provider.__init__(self, projection)
+        if factory is None:
+            factory = partial(make_provider, QUOTE_PROVIDER, workers=0)
+        self.factory = factory
+        self.codec = BatchCodec(self.projection)
+        self.workers = [Worker(factory, self.projection) for i in range(workers)]
+        if max_batch is not None:
+            self.max_batch = max_batch
+        # One request and reply per worker at a time.
+        self.lock = Lock()
+
+    def owner(self, symbol):
+        return zlib.crc32(symbol) % len(self.workers)
+
+    def fetch_shards(self, shards):
+        quotes, failed = self.fetch_symbols([symbol for query, symbols in shards
+                                             for symbol in symbols])
+        self.failed = failed
+        return quotes
+
+    def fetch_batch(self, symbols):
+        quotes, failed = self.fetch_symbols(symbols)
+        self.failed = failed
+        if failed:
+            raise ProviderError('Could not fetch {} of {} symbols in the workers.'.format(
+                sum(len(shard) for shard in failed), len(symbols)))
+        return quotes
+
+    def fetch_symbols(self, symbols):
+        slices = [[] for worker in self.workers]
+        for symbol in symbols:
+            slices[self.owner(symbol)].append(symbol)
+        quotes, failed = [], []
+        with self.lock:
+            busy = []
+            for i, (worker, owned) in enumerate(zip(self.workers, slices)):
+                if owned:
+                    try:
+                        worker.connection.send_bytes('\n'.join(owned))
+                        busy.append(i)
+                    except IOError:
+                        self.replace(i)
+                        failed.append(owned)
+            for i in busy:
+                try:
+                    buffer = self.workers[i].connection.recv_bytes()
+                except (EOFError, IOError):
+                    self.replace(i)
+                    failed.append(slices[i])
+                    continue
+                start = timer()
+                worker_quotes, worker_failed = self.codec.unpack(buffer)
+                unpack_timer.observe(timer() - start)
+                batches.inc()
+                batch_bytes.inc(len(buffer))
+                quotes.extend(worker_quotes)
+                failed.extend(worker_failed)
+        return quotes, failed
+
+    def replace(self, i):
+        log.error('Worker %d died; starting a new one.', i)
+        restarts.inc()
+        self.workers[i].stop()
+        self.workers[i] = Worker(self.factory, self.projection)
+
+    def close(self):
+        for worker in self.workers:
+            worker.stop()
@@ -0,0 +1,262 @@
+import Queue
+import logging
+import threading
+from timeit import default_timer as timer
+from sqlalchemy import bindparam
+from config import WRITE_BATCH_SIZE, WRITE_QUEUE_SIZE, WRITE_GROUP_SIZE
+from stream import Session, bakery
+from models import Stock
+from metrics import registry
+
+
+
+stocks_table = Stock.__table__
+
+log = logging.getLogger(__name__)
+
+commit_timer = registry.timer('writer.commit')
+write_errors = registry.counter('writer.errors')
+
+class QuoteWriter(object):
+    """
+    Batched write stage for the Streamer. Applies a whole poll's quotes
+    to the stocks table with one executemany statement per batch, using
+    an in-memory symbol -> row id map instead of a query per symbol.
+    """
+
+    def __init__(self, batch_size=WRITE_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.row_ids = {}
+        self._update = stocks_table.update().where(stocks_table.c.id == bindparam('_id'))
+        self._insert = stocks_table.insert().prefix_with('OR IGNORE')
+        self._delete = stocks_table.delete().where(
+            stocks_table.c.id.in_(bindparam('ids', expanding=True)))
+        self._resolved = bakery(lambda session: session.query(Stock.id, Stock.symbol))
+        self._resolved += lambda query: query.filter(
+            Stock.symbol.in_(bindparam('symbols', expanding=True)))
+
+    def load(self, session):
+        """
+        Populates the symbol -> row id map from the stocks table.
+
+        @session an open session.
+        """
+        self.row_ids = dict((str(symbol), row_id) for row_id, symbol in
+                            session.query(Stock.id, Stock.symbol))
+
+    def write(self, session, quotes, columns):
+        """
+        Updates (or inserts) one row per quote. The caller commits.
+
+        @session an open session.
+        @quotes a list of Quote records.
+        @columns the names of the stocks columns to set from each quote.
+        @return the number of rows written.
+        """
+        unknown = [quote.symbol for quote in quotes if quote.symbol not in self.row_ids]
+        if unknown:
+            self.resolve(session, unknown)
+
+        row_ids = self.row_ids
+        params = []
+        for quote in quotes:
+            values = dict((column, getattr(quote, column)) for column in columns)
+            values['_id'] = row_ids[quote.symbol]
+            params.append(values)
+        for start in range(0, len(params), self.batch_size):
+            session.execute(self._update, params[start:start + self.batch_size])
+        return len(params)
+
+    def resolve(self, session, symbols):
+        """
+        Fills in the row ids of symbols missing from the map, inserting
+        rows for symbols that are not in the database yet. The unique
+        index on symbol turns the insert into a no-op for existing rows.
+        """
+        for start in range(0, len(symbols), self.batch_size):
+            batch = symbols[start:start + self.batch_size]
+            session.execute(self._insert, [{'symbol': symbol} for symbol in batch])
+            for row_id, symbol in self._resolved(session).params(symbols=batch):
+                self.row_ids[str(symbol)] = row_id
+
+    def delete(self, session, symbols):
+        """
+        Deletes the rows of the given symbols. The caller commits.
+
+        @return the number of rows deleted.
+        """
+        row_ids = [self.row_ids.pop(symbol) for symbol in symbols if symbol in self.row_ids]
+        for start in range(0, len(row_ids), self.batch_size):
+            session.execute(self._delete, {'ids': row_ids[start:start + self.batch_size]})
+        return len(row_ids)
+
+# Weight of each new sample in the commit latency average.
+LATENCY_ALPHA = 0.2
+
+class WriteJob(object):
+    """
+    A function queued on a WriterThread, called with the writer's session.
+    """
+
+    __slots__ = ('function', 'args', 'done', 'result', 'error')
+
+    def __init__(self, function, args):
+        self.function = function
+        self.args = args
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self, timeout=None):
+        """
+        Waits until the job's transaction has committed.
+
+        @return what the job's function returned.
+        """
+        self.done.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class WriterThread(object):
+    """
+    The only thread that writes to the database. Jobs are taken off a
+    bounded queue, so producers wait once it is full instead of piling up
+    memory, and everything queued while a transaction was committing is
+    applied in the next single transaction (group commit). A group that
+    fails is rolled back and its jobs are retried one transaction each,
+    so one bad job does not lose the others. on_rollback(session) is
+    called after each rollback, to reload state the jobs cached. Once the
+    thread has ended, submitting raises, and jobs still queued fail.
+    """
+
+    def __init__(self, maxsize=WRITE_QUEUE_SIZE, group_size=WRITE_GROUP_SIZE, on_rollback=None):
+        self.queue = Queue.Queue(maxsize)
+        self.group_size = group_size
+        self.on_rollback = on_rollback
+        self.commits = 0
+        self.jobs = 0
+        self.errors = 0
+        self.commit_latency = None
+        self.last_commit_latency = None
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run)
+        # stop() drains the queue; the thread only needs to be daemonic for
+        # Streamers that are never stopped.
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, function, *args):
+        """
+        Queues function(session, *args), waiting while the queue is full.
+
+        @return a WriteJob to wait() on.
+        @raise RuntimeError if the thread has ended.
+        """
+        if self.stopped:
+            raise RuntimeError('The database writer has stopped.')
+        job = WriteJob(function, args)
+        self.queue.put(job)
+        if self.stopped:
+            # The thread ended while the job was being queued.
+            self.fail_queued()
+        return job
+
+    def stop(self):
+        """
+        Writes everything queued so far, then ends the thread.
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    def run(self):
+        session = Session()
+        try:
+            while True:
+                jobs = [self.queue.get()]
+                while jobs[-1] is not None and len(jobs) < self.group_size:
+                    try:
+                        jobs.append(self.queue.get_nowait())
+                    except Queue.Empty:
+                        break
+                stopping = jobs[-1] is None
+                if stopping:
+                    jobs.pop()
+                if jobs:
+                    self.commit(session, jobs)
+                if stopping:
+                    return
+        except Exception:
+            log.exception('The database writer failed.')
+        finally:
+            self.stopped = True
+            self.fail_queued()
+            Session.remove()
+
+    def fail_queued(self):
+        while True:
+            try:
+                job = self.queue.get_nowait()
+            except Queue.Empty:
+                return
+            if job is not None:
+                job.error = RuntimeError('The database writer has stopped.')
+                job.done.set()
+
+    def commit(self, session, jobs):
+        start = timer()
+        try:
+            for job in jobs:
+                job.result = job.function(session, *job.args)
+            session.commit()
+            self.commits += 1
+        except Exception:
+            self.rollback(session)
+            for job in jobs:
+                try:
+                    job.result = job.function(session, *job.args)
+                    session.commit()
+                    self.commits += 1
+                except Exception as e:
+                    self.rollback(session)
+                    job.result = None
+                    job.error = e
+                    self.errors += 1
+                    write_errors.inc()
+                    log.error('Could not write to the database: %s', e)
+        finally:
+            latency = timer() - start
+            commit_timer.observe(latency)
+            self.last_commit_latency = latency
+            if self.commit_latency is None:
+                self.commit_latency = latency
+            else:
+                self.commit_latency += LATENCY_ALPHA * (latency - self.commit_latency)
+            self.jobs += len(jobs)
+            # Even if the thread is about to fail, nobody waits forever.
+            for job in jobs:
+                job.done.set()
+
+    def rollback(self, session):
+        try:
+            session.rollback()
+            if self.on_rollback is not None:
+                self.on_rollback(session)
+        except Exception as e:
+            # Start the next transaction on a new connection instead.
+            log.error('Could not roll back: %s', e)
+            session.close()
+
+    def metrics(self):
+        """
+        @return the queue depth and bound, the commit and job counts, and
+            the average and last commit latency in seconds.
+        """
+        return {'queue_depth': self.queue.qsize(),
+                'queue_size': self.queue.maxsize,
+                'commits': self.commits,
+                'jobs': self.jobs,
+                'errors': self.errors,
+                'commit_latency': self.commit_latency,
+                'last_commit_latency': self.last_commit_latency}
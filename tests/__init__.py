@@ -0,0 +1,30 @@
+import os
+import shutil
+import tempfile
+from sqlalchemy import create_engine
+import stream
+from stream.models import Base
+
+def setup_database(wal=False):
+    """
+    Creates the tables in a new SQLite database in a temporary directory,
+    and binds stream.Session to it.
+
+    @wal True to switch its connections to write-ahead logging.
+    @return the directory, for teardown_database() and other test files.
+    """
+    directory = tempfile.mkdtemp()
+    engine = create_engine('sqlite:///' + os.path.join(directory, 'test.db'))
+    if wal:
+        stream.enable_wal(engine)
+    Base.metadata.create_all(engine)
+    stream.Session.configure(bind=engine)
+    return directory
+
+def teardown_database(directory):
+    """
+    Closes the database of setup_database() and deletes its directory.
+    """
+    stream.Session.remove()
+    stream.Session.session_factory.kw['bind'].dispose()
+    shutil.rmtree(directory)
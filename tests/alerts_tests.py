@@ -0,0 +1,65 @@
+from nose.tools import *
+import stream
+from stream.alerts import AlertEngine, Rule
+from stream.models import AlertRule
+from stream.process import Streamer
+from stream.providers import Provider
+from stream.quote import Projection, Quote
+from tests import setup_database, teardown_database
+
+directory = None
+
+class FakeFetcher(Provider):
+
+    def __init__(self):
+        Provider.__init__(self, Projection(['l1']))
+
+    def fetch_batch(self, symbols):
+        return []
+
+def setup():
+    global directory
+    directory = setup_database()
+
+def teardown():
+    teardown_database(directory)
+
+def fired(engine, symbol, price):
+    return sorted(event.rule.id for event in engine.check([Quote(symbol, price)]))
+
+def test_rules_fire_on_crossings_only():
+    engine = AlertEngine()
+    engine.add(Rule(1, 'AAPL', 'last_trade_price', 'up', 200.0))
+    engine.add(Rule(2, 'AAPL', 'last_trade_price', 'down', 190.0))
+    engine.add(Rule(3, 'AAPL', 'last_trade_price', 'either', 195.0, once=True))
+    engine.add(Rule(4, 'IBM', 'last_trade_price', 'either', 1.0))
+    events = engine.subscribe()
+    assert_equal(fired(engine, 'AAPL', 185.0), [])
+    assert_equal(fired(engine, 'AAPL', 200.0), [1, 3])
+    assert_equal(fired(engine, 'AAPL', 199.0), [])
+    assert_equal(fired(engine, 'AAPL', 190.0), [2])
+    assert_equal(fired(engine, 'AAPL', 210.0), [1])
+    assert_equal(events.qsize(), 4)
+    assert_equal(str(events.get()), 'AAPL last_trade_price crossed above 195.0: 185.0 -> 200.0')
+    engine.remove(1)
+    engine.remove(2)
+    assert_equal(list(engine.index), ['IBM'])
+
+def test_rules_persist_and_once_rules_are_disabled():
+    streamer = Streamer(fetcher=FakeFetcher())
+    once = streamer.add_alert('aapl', 200, direction='up', once=True)
+    kept = streamer.add_alert('AAPL', 300)
+    gone = streamer.add_alert('AAPL', 100)
+    assert_true(streamer.remove_alert(gone))
+    assert_raises(ValueError, streamer.add_alert, 'AAPL', 1, field='price')
+
+    restarted = Streamer(fetcher=FakeFetcher())
+    assert_equal(sorted(restarted.alerts.rules), [once, kept])
+    restarted.alerts.check([Quote('AAPL', 150.0)])
+    events = restarted.alerts.check([Quote('AAPL', 250.0)])
+    restarted.writes.submit(restarted.alerts.disable, [e.rule.id for e in events], None).wait()
+    assert_equal(sorted(restarted.alerts.rules), [kept])
+    session = stream.Session()
+    enabled = dict(session.query(AlertRule.id, AlertRule.enabled))
+    stream.Session.remove()
+    assert_equal(enabled, {once: False, kept: True})
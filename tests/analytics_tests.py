@@ -0,0 +1,72 @@
+from nose.tools import *
+import numpy as np
+from stream.analytics import Analytics
+from stream.quote import Quote
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1408716000.0
+
+    def __call__(self):
+        return self.now
+
+def feed(analytics, prices, symbol='AAPL', change=None):
+    quotes = []
+    for price in prices:
+        quote = Quote(symbol, price, change)
+        analytics.update([quote])
+        quotes.append(quote)
+    return quotes
+
+def test_rolling_statistics_match_direct_computation():
+    analytics = Analytics(sma_windows=(3, 5), ema_spans=(4,), volatility_window=4,
+                          capacity=2, clock=FakeClock())
+    prices = [10.0, 11.0, 10.5, 12.0, 11.5, 13.0, 12.5]
+    quotes = feed(analytics, prices, change=-0.5)
+    # A second symbol makes the slots grow past their capacity.
+    feed(analytics, [5.0, 6.0, 7.0], 'IBM')
+    feed(analytics, [8.0], 'MSFT')
+    stats = quotes[-1].stats
+
+    assert_equal(quotes[1].stats['sma_3'], None)
+    assert_almost_equal(stats['sma_3'], np.mean(prices[-3:]))
+    assert_almost_equal(stats['sma_5'], np.mean(prices[-5:]))
+    ema = prices[0]
+    for price in prices[1:]:
+        ema += 0.4 * (price - ema)
+    assert_almost_equal(stats['ema_4'], ema)
+    returns = np.diff(np.log(prices))[-4:]
+    assert_almost_equal(stats['volatility'], np.std(returns, ddof=1))
+    assert_equal((stats['high'], stats['low']), (13.0, 10.0))
+    # The previous close is 10.5, from the first quote's price and change.
+    assert_almost_equal(stats['change'], 2.0)
+    assert_almost_equal(stats['pct_change'], 2.0 / 10.5 * 100)
+
+def test_repeated_prices_are_not_ticks():
+    analytics = Analytics(sma_windows=(2,), ema_spans=(2,), volatility_window=2,
+                          clock=FakeClock())
+    feed(analytics, [10.0, 12.0])
+    # A quote whose volume changed, at the same price, is not sampled again.
+    quote, = feed(analytics, [12.0])
+    assert_equal(quote.stats['sma_2'], 11.0)
+    assert_equal(analytics.count[0], 2)
+    quote, = feed(analytics, [14.0])
+    assert_equal(quote.stats['sma_2'], 13.0)
+
+def test_change_filled_in_and_reset_per_session():
+    clock = FakeClock()
+    analytics = Analytics(sma_windows=(2,), ema_spans=(2,), volatility_window=2, clock=clock)
+    quotes = feed(analytics, [20.0, 22.0])
+    assert_equal(quotes[1].change, 2.0)
+    clock.now += 86400
+    quote, = feed(analytics, [21.0])
+    assert_equal((quote.change, quote.stats['high'], quote.stats['sma_2']), (0.0, 21.0, 21.5))
+
+def test_removed_symbol_starts_over():
+    analytics = Analytics(sma_windows=(2,), ema_spans=(2,), volatility_window=2,
+                          clock=FakeClock())
+    feed(analytics, [1.0, 2.0, 3.0])
+    analytics.remove(['AAPL'])
+    quote, = feed(analytics, [7.0], 'IBM')
+    assert_equal((quote.stats['sma_2'], quote.stats['low'], quote.stats['ema_2']), (None, 7.0, 7.0))
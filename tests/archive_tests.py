@@ -0,0 +1,85 @@
+from nose.tools import *
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from stream.archive import export_stocks, export_ticks, import_stocks, import_ticks, \
+    import_watchlist, read_watchlist, ArchiveReader
+from stream.history import TickHistory
+from stream.models import Base, Stock
+
+directory = None
+
+def setup():
+    global directory
+    directory = tempfile.mkdtemp()
+
+def teardown():
+    shutil.rmtree(directory)
+
+def make_session(name):
+    engine = create_engine('sqlite:///' + os.path.join(directory, name))
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+def test_stocks_and_ticks_survive_a_round_trip_in_small_chunks():
+    source = make_session('source.db')
+    stocks = Stock.__table__
+    updated = datetime(2014, 8, 22, 15, 30, 1, 250000)
+    source.execute(stocks.insert(), [
+        {'symbol': 'AAPL', 'last_trade_price': 100.5, 'volume': 10, 'updated_at': updated},
+        {'symbol': 'IBM', 'last_trade_price': None, 'volume': None, 'updated_at': None},
+        {'symbol': 'MSFT', 'last_trade_price': 40.0, 'volume': 5, 'updated_at': updated}])
+    ids = dict((str(symbol), row_id) for row_id, symbol in source.query(Stock.id, Stock.symbol))
+    midnight = datetime(2014, 8, 22)
+    TickHistory().append(source, [
+        (ids['AAPL'], midnight - timedelta(minutes=1), 99.5, 10),
+        (ids['AAPL'], midnight + timedelta(minutes=1), 100.5, 20),
+        (ids['MSFT'], midnight + timedelta(minutes=2), 40.0, None),
+        (ids['MSFT'], midnight + timedelta(minutes=3), 40.5, 7),
+        # Ticks of symbols no longer stored are not exported.
+        (999, midnight + timedelta(minutes=1), 1.0, 1)])
+    source.commit()
+    stocks_file = os.path.join(directory, 'stocks.stk')
+    ticks_file = os.path.join(directory, 'ticks.stk')
+    assert_equal(export_stocks(source, stocks_file, chunk_size=2), 3)
+    assert_equal(export_ticks(source, ticks_file, date(2014, 8, 21), date(2014, 8, 22),
+                              chunk_size=2), 4)
+    with ArchiveReader(ticks_file) as archive:
+        assert_equal(archive.table, 'ticks')
+        assert_equal([len(chunk['ts']) for chunk in archive], [1, 2, 1])
+
+    target = make_session('target.db')
+    # MSFT gets a different id in the target database.
+    target.execute(stocks.insert(), [{'symbol': 'ZZZ'}, {'symbol': 'MSFT', 'volume': 1}])
+    assert_equal(import_stocks(target, stocks_file), 3)
+    assert_equal(import_ticks(target, ticks_file), 4)
+    target.commit()
+    rows = target.query(Stock.symbol, Stock.last_trade_price, Stock.volume,
+                        Stock.updated_at).order_by(Stock.symbol).all()
+    assert_equal([tuple(row) for row in rows],
+                 [('AAPL', 100.5, 10, updated), ('IBM', None, None, None),
+                  ('MSFT', 40.0, 5, updated), ('ZZZ', None, None, None)])
+    history = TickHistory()
+    msft, = target.query(Stock.id).filter(Stock.symbol == 'MSFT').one()
+    assert_equal(history.partitions(target), [date(2014, 8, 21), date(2014, 8, 22)])
+    assert_equal([(price, volume) for ts, price, volume in
+                  history.range(target, msft, midnight, midnight + timedelta(hours=1))],
+                 [(40.0, None), (40.5, 7)])
+    assert_raises(ValueError, import_stocks, target, ticks_file)
+    source.close()
+    target.close()
+
+def test_watchlist_files_are_read_in_order_without_duplicates():
+    path = os.path.join(directory, 'watchlist.csv')
+    with open(path, 'w') as watchlist:
+        watchlist.write('Symbol,Name\n# comment\naapl,Apple\n\nIBM, International\n"MSFT",x\n'
+                        ',Blank\n  ,x\nAAPL\n')
+    assert_equal(read_watchlist(path), ['AAPL', 'IBM', 'MSFT'])
+    session = make_session('watchlist.db')
+    session.execute(Stock.__table__.insert(), [{'symbol': 'IBM'}])
+    assert_equal(import_watchlist(session, path), ['AAPL', 'MSFT'])
+    assert_equal(session.query(Stock).count(), 3)
+    session.close()
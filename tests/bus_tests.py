@@ -0,0 +1,49 @@
+from nose.tools import *
+import json
+import socket
+import threading
+import time
+from stream.bus import QuoteBus, BusServer
+from stream.quote import Quote
+
+def test_conflate_keeps_latest_quote_per_symbol():
+    bus = QuoteBus()
+    subscription = bus.subscribe(maxsize=2)
+    bus.publish([Quote('A', 1.0), Quote('B', 1.0)])
+    bus.publish([Quote('A', 2.0), Quote('C', 1.0)])
+    quotes = subscription.get(timeout=0)
+    assert_equal([(quote.symbol, quote.last_trade_price) for quote in quotes],
+                 [('A', 2.0), ('C', 1.0)])
+    assert_equal(subscription.dropped, 1)
+    assert_equal(subscription.get(timeout=0), [])
+
+def test_drop_discards_oldest_and_filters_symbols():
+    bus = QuoteBus()
+    subscription = bus.subscribe(['A'], maxsize=2, policy='drop')
+    everything = bus.subscribe(maxsize=None)
+    bus.publish([Quote('A', 1.0), Quote('B', 1.0), Quote('A', 2.0), Quote('A', 3.0)])
+    assert_equal([quote.last_trade_price for quote in subscription.get(timeout=0)], [2.0, 3.0])
+    assert_equal(subscription.dropped, 1)
+    assert_equal(len(everything.get(timeout=0)), 2)
+    subscription.close()
+    bus.publish([Quote('A', 4.0)])
+    assert_equal(subscription.get(), [])
+
+def test_socket_subscriber_receives_json_lines():
+    bus = QuoteBus()
+    server = BusServer(bus, 0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    connection = socket.create_connection(server.server_address)
+    try:
+        connection.sendall('SUBSCRIBE b\n')
+        deadline = time.time() + 5
+        while not bus.subscriptions and time.time() < deadline:
+            time.sleep(0.01)
+        bus.publish([Quote('A', 1.0), Quote('B', 2.5, volume=10)])
+        quote = json.loads(connection.makefile('r').readline())
+        assert_equal((quote['symbol'], quote['last_trade_price'], quote['volume']), ('B', 2.5, 10))
+    finally:
+        connection.close()
+        server.stop()
@@ -0,0 +1,60 @@
+from nose.tools import *
+import threading
+from stream.cache import QuoteCache
+from stream.quote import Quote
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_entries_expire_and_least_recently_used_are_evicted():
+    loads = []
+    def loader(symbols):
+        loads.append(list(symbols))
+        return [Quote(symbol, 1.0) for symbol in symbols if symbol != 'NONE']
+    clock = Clock()
+    cache = QuoteCache(loader, maxsize=2, ttl=10, clock=clock)
+    assert_equal(sorted(cache.get_many(['A', 'B', 'NONE'])), ['A', 'B'])
+    assert_equal(cache.get('A').symbol, 'A')
+    assert_equal(cache.get('NONE'), None)
+    # B is the least recently used.
+    cache.put([Quote('C', 2.0)])
+    assert_equal(list(cache.entries), ['A', 'C'])
+    clock.now = 11
+    cache.get('C')
+    assert_equal(loads, [['A', 'B', 'NONE'], ['NONE'], ['C']])
+    cache.invalidate(['C'])
+    assert_equal(len(cache), 1)
+    # Only this cache's own lookups count: one hit (A) in six.
+    QuoteCache(loader).get('A')
+    assert_almost_equal(cache.hit_ratio(), 1 / 6.0)
+
+def test_concurrent_misses_share_one_load():
+    started, release = threading.Event(), threading.Event()
+    loads = []
+    def loader(symbols):
+        loads.append(list(symbols))
+        started.set()
+        release.wait()
+        return [Quote(symbol, 1.0) for symbol in symbols]
+    cache = QuoteCache(loader)
+    results = {}
+    first = threading.Thread(target=lambda: results.update(first=cache.get('A')))
+    first.start()
+    started.wait()
+    second = threading.Thread(target=lambda: results.update(second=cache.get_many(['A', 'B'])))
+    second.start()
+    # A is loading, so only B needs a load; it blocks too until released.
+    while len(loads) < 2:
+        started.wait(0.01)
+    release.set()
+    first.join()
+    second.join()
+    assert_equal(sorted(loads), [['A'], ['B']])
+    assert_equal(results['first'].symbol, 'A')
+    assert_true(results['second']['A'] is results['first'])
+    assert_equal(sorted(results['second']), ['A', 'B'])
@@ -0,0 +1,73 @@
+from nose.tools import *
+import json
+import socket
+import threading
+import stream
+from stream.daemon import ControlServer
+from stream.models import Stock
+from stream.process import Streamer
+from stream.providers import Provider
+from stream.quote import Projection, Quote
+from tests import setup_database, teardown_database
+
+directory = None
+
+class StoppingFetcher(Provider):
+    """
+    Answers every shard with a price of 2.0, and stops the Streamer while
+    the first poll is in flight, like a SIGTERM would.
+    """
+
+    def __init__(self):
+        Provider.__init__(self, Projection(['l1']))
+        self.streamer = None
+
+    def snapshot(self, watchlist):
+        return [list(watchlist)]
+
+    def fetch_batch(self, symbols):
+        return []
+
+    def fetch_shards(self, shards):
+        self.streamer.stop()
+        return [Quote(symbol, 2.0) for symbols in shards for symbol in symbols]
+
+def setup():
+    global directory
+    directory = setup_database()
+
+def teardown():
+    teardown_database(directory)
+
+def test_control_socket_commands():
+    streamer = Streamer(fetcher=StoppingFetcher())
+    server = ControlServer(streamer, 0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    connection = socket.create_connection(server.server_address)
+    replies = connection.makefile('r')
+    try:
+        connection.sendall('add ibm msft\nSTATUS\nREMOVE IBM\nJUMP\n')
+        assert_equal(replies.readline(), 'OK IBM MSFT\n')
+        status = json.loads(replies.readline()[len('OK '):])
+        assert_equal(status['symbols'], 2)
+        assert_equal(status['tiers']['hot']['symbols'], 2)
+        assert_equal(replies.readline(), 'OK IBM\n')
+        assert_true(replies.readline().startswith('ERR'))
+        assert_equal(list(streamer.watchlist), ['MSFT'])
+    finally:
+        connection.close()
+        server.stop()
+
+def test_stop_writes_the_poll_in_progress():
+    fetcher = StoppingFetcher()
+    streamer = Streamer(fetcher=fetcher)
+    fetcher.streamer = streamer
+    streamer.add('AAPL')
+    streamer.run()
+    streamer.join()
+    session = stream.Session()
+    price, = session.query(Stock.last_trade_price).filter(Stock.symbol == 'AAPL').one()
+    stream.Session.remove()
+    assert_equal(price, 2.0)
@@ -0,0 +1,40 @@
+from nose.tools import *
+import json
+import os
+from datetime import datetime
+from stream.decode import QuoteStreamDecoder
+from stream.quote import Projection
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'yql_quotes.json')
+
+def decode(body, chunk_size):
+    projection = Projection()
+    now = datetime(2014, 8, 22, 20, 0, 5)
+    decoder = QuoteStreamDecoder(lambda pairs: projection.decode_pairs(pairs, now))
+    quotes = []
+    for start in range(0, len(body), chunk_size):
+        quotes.extend(decoder.feed(body[start:start + chunk_size]))
+    quotes.extend(decoder.close())
+    return [(quote.symbol, quote.last_trade_price, quote.change, quote.volume, quote.bid, quote.ask)
+            for quote in quotes]
+
+def test_streaming_matches_full_decode():
+    body = open(FIXTURE).read()
+    projection = Projection()
+    now = datetime(2014, 8, 22, 20, 0, 5)
+    expected = [projection.decode(stock_data, now)
+                for stock_data in json.loads(body)['query']['results']['quote']]
+    expected = [(quote.symbol, quote.last_trade_price, quote.change, quote.volume, quote.bid, quote.ask)
+                for quote in expected]
+    assert_equal(expected[0], ('AAPL', 101.32, 0.74, 44183834, 101.30, 101.33))
+    for chunk_size in (1, 7, 4096):
+        assert_equal(decode(body, chunk_size), expected)
+
+def test_single_and_empty_results():
+    single = '{"query":{"count":1,"results":{"quote":{"Symbol":"AAPL","LastTradePriceOnly":"1.5"}}}}'
+    assert_equal(decode(single, 5), [('AAPL', 1.5, None, None, None, None)])
+    assert_equal(decode('{"query":{"count":0,"results":null}}', 5), [])
+
+@raises(ValueError)
+def test_truncated_response():
+    decode(open(FIXTURE).read()[:-200], 64)
@@ -0,0 +1,67 @@
+from nose.tools import *
+import json
+import re
+import threading
+import urlparse
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from stream.fetch import ShardedFetcher
+
+server = None
+requested = []
+
+class StubYQLHandler(BaseHTTPRequestHandler):
+    """
+    Stands in for STREAM_URL. Answers with a YQL-shaped quote for each
+    requested symbol, and fails every request for a shard containing BAD.
+    """
+
+    def do_GET(self):
+        query = urlparse.parse_qs(urlparse.urlparse(self.path).query)['q'][0]
+        symbols = re.findall(r'[A-Z]+', re.search(r'in \((.*)\)', query).group(1))
+        requested.append(symbols)
+        if 'BAD' in symbols:
+            self.send_error(500)
+            return
+        quotes = [{'Symbol': symbol, 'LastTradePriceOnly': '1.00'} for symbol in symbols]
+        body = json.dumps({'query': {'results': {'quote': quotes[0] if len(quotes) == 1 else quotes}}})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def setup():
+    global server
+    server = HTTPServer(('127.0.0.1', 0), StubYQLHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+def teardown():
+    server.shutdown()
+    server.server_close()
+
+def stub_url():
+    return 'http://127.0.0.1:%d/v1/public/yql?q=select%%20*%%20from%%20yahoo.finance.quotes' \
+        '%%20where%%20symbol%%20in%%20({0})&format=json' % server.server_port
+
+def test_fetch_merges_shards():
+    del requested[:]
+    fetcher = ShardedFetcher(url=stub_url(), shard_size=2, workers=3, retries=0)
+    quotes = fetcher.fetch(['A', 'B', 'C', 'D', 'E'])
+    fetcher.close()
+    assert_equal([quote.symbol for quote in quotes], ['A', 'B', 'C', 'D', 'E'])
+    assert_equal(sorted(requested), [['A', 'B'], ['C', 'D'], ['E']])
+    assert_equal(fetcher.failed, [])
+
+def test_bad_shard_does_not_block_the_rest():
+    del requested[:]
+    fetcher = ShardedFetcher(url=stub_url(), shard_size=2, workers=2, retries=1)
+    quotes = fetcher.fetch(['A', 'B', 'BAD', 'C'])
+    fetcher.close()
+    assert_equal([quote.symbol for quote in quotes], ['A', 'B'])
+    assert_equal(fetcher.failed, [['BAD', 'C']])
+    assert_equal(requested.count(['BAD', 'C']), 2)
@@ -0,0 +1,50 @@
+from nose.tools import *
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from stream.history import TickHistory
+
+directory = None
+Session = None
+
+def setup():
+    global directory, Session
+    directory = tempfile.mkdtemp()
+    engine = create_engine('sqlite:///' + os.path.join(directory, 'test.db'))
+    Session = sessionmaker(bind=engine)
+
+def teardown():
+    Session.kw['bind'].dispose()
+    shutil.rmtree(directory)
+
+def test_range_spans_partitions():
+    session = Session()
+    history = TickHistory()
+    midnight = datetime(2014, 8, 22)
+    history.append(session, [
+        (1, midnight - timedelta(minutes=1), 99.5, 10),
+        (1, midnight + timedelta(minutes=1), 100.5, 20),
+        (2, midnight + timedelta(minutes=1), 7.0, None),
+        ])
+    session.commit()
+    assert_equal(history.partitions(session), [date(2014, 8, 21), date(2014, 8, 22)])
+    ticks = history.range(session, 1, midnight - timedelta(hours=1), midnight + timedelta(hours=1))
+    assert_equal([(price, volume) for ts, price, volume in ticks], [(99.5, 10), (100.5, 20)])
+    assert_equal(ticks[1][0], midnight + timedelta(minutes=1))
+    # Without a start, the range starts at the oldest partition.
+    assert_equal(history.range(session, 1), ticks)
+    # Only tables named like partitions are partitions.
+    session.execute('CREATE TABLE ticksX20140823 (id INTEGER)')
+    assert_equal(history.partitions(session), [date(2014, 8, 21), date(2014, 8, 22)])
+
+    assert_equal(history.drop_before(session, date(2014, 8, 22)), [date(2014, 8, 21)])
+    assert_equal(len(history.range(session, 1, midnight - timedelta(hours=1), midnight)), 0)
+    session.close()
+
+def test_range_without_start_is_empty_without_partitions():
+    session = sessionmaker(bind=create_engine('sqlite://'))()
+    assert_equal(TickHistory().range(session, 1), [])
+    session.close()
@@ -0,0 +1,61 @@
+from nose.tools import *
+import json
+import threading
+import time
+import urllib2
+from stream.metrics import Registry, MetricsServer, SamplingProfiler
+
+def test_registry_collects_and_exposes_metrics():
+    registry = Registry()
+    fetched = registry.counter('quotes.fetched')
+    assert_true(registry.counter('quotes.fetched') is fetched)
+    fetched.inc(3)
+    timer = registry.timer('poll.fetch', buckets=(0.1, 1.0))
+    timer.observe(0.05)
+    timer.observe(0.5)
+    with timer.time():
+        pass
+    registry.gauge('writer.queue_depth', lambda: 7)
+    registry.gauge('broken', lambda: 1 / 0)
+
+    collected = registry.collect()
+    assert_equal(collected['quotes.fetched'], 3)
+    assert_equal(collected['poll.fetch']['count'], 3)
+    assert_equal(collected['poll.fetch']['buckets'], [[0.1, 2], [1.0, 3], ['+Inf', 3]])
+    assert_equal(collected['writer.queue_depth'], 7)
+    assert_equal(collected['broken'], None)
+    text = registry.prometheus()
+    assert_true('stream_quotes_fetched 3.0\n' in text)
+    assert_true('stream_poll_fetch_bucket{le="1.0"} 3\n' in text)
+    assert_false('stream_broken' in text)
+
+def spin(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+def test_metrics_server_serves_metrics_and_profile():
+    registry = Registry()
+    registry.counter('quotes.changed').inc()
+    profiler = SamplingProfiler(0.001).start()
+    stop = threading.Event()
+    worker = threading.Thread(target=spin, args=(stop,), name='spinner')
+    worker.start()
+    time.sleep(0.1)
+    stop.set()
+    worker.join()
+    profiler.stop()
+    server = MetricsServer(registry, 0, profiler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    try:
+        metrics = json.loads(urllib2.urlopen(url + '/metrics.json').read())
+        profile = urllib2.urlopen(url + '/profile').read()
+        assert_raises(urllib2.HTTPError, urllib2.urlopen, url + '/missing')
+    finally:
+        server.stop()
+    assert_equal(metrics, {'quotes.changed': 1})
+    assert_true(any(line.startswith('spinner;') and 'metrics_tests.py:spin' in line
+                    for line in profile.splitlines()))
+    assert_true(profiler.top(1))
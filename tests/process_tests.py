@@ -0,0 +1,134 @@
+from nose.tools import *
+import time
+from datetime import datetime
+import stream
+from stream.history import TickHistory
+from stream.models import Stock
+from stream.process import Streamer
+from stream.providers import Provider
+from stream.quote import Projection, Quote
+from stream.scheduler import Scheduler
+from tests import setup_database, teardown_database
+
+directory = None
+
+class FakeFetcher(Provider):
+
+    def __init__(self):
+        Provider.__init__(self, Projection(['l1', 'v0']))
+
+    def fetch_batch(self, symbols):
+        return []
+
+def setup():
+    global directory
+    directory = setup_database()
+    session = stream.Session()
+    stock = Stock('AAPL')
+    stock.last_trade_price = 101.5
+    stock.volume = 100
+    session.add(stock)
+    session.commit()
+    stream.Session.remove()
+
+def teardown():
+    teardown_database(directory)
+
+def test_changes_skips_unchanged_quotes():
+    streamer = Streamer(fetcher=FakeFetcher())
+    streamer.add('GOOG')
+    quotes = [Quote('AAPL', 101.5, volume=100), Quote('GOOG', 530.0, volume=5)]
+    # AAPL matches the stored row, so only GOOG is new.
+    assert_equal([quote.symbol for quote in streamer.changes(quotes)], ['GOOG'])
+    assert_equal(streamer.changes(quotes), [])
+    quotes[0].volume = 200
+    assert_equal([quote.symbol for quote in streamer.changes(quotes)], ['AAPL'])
+
+def test_add_many_and_remove_many():
+    streamer = Streamer(fetcher=FakeFetcher())
+    streamer.add_many(['msft', 'AAPL', 'IBM', 'MSFT'])
+    assert_equal(list(streamer.watchlist)[-2:], ['MSFT', 'IBM'])
+    assert_equal(len(streamer.watchlist), len(set(streamer.watchlist)))
+    session = stream.Session()
+    stored = set(symbol for symbol, in session.query(Stock.symbol))
+    assert_true(set(['AAPL', 'IBM', 'MSFT']) <= stored)
+    stream.Session.remove()
+
+    streamer.remove_many(['IBM', 'MSFT'])
+    assert_false('MSFT' in streamer.watchlist)
+    session = stream.Session()
+    stored = set(symbol for symbol, in session.query(Stock.symbol))
+    assert_equal(stored & set(['IBM', 'MSFT']), set())
+    stream.Session.remove()
+
+def test_ticks_without_a_start_go_back_to_the_oldest_kept():
+    streamer = Streamer(fetcher=FakeFetcher())
+    streamer.history = TickHistory()
+    aapl = streamer.writer.row_ids['AAPL']
+    streamer.writes.submit(streamer.history.append,
+                           [(aapl, datetime(2014, 8, 22, 15, 30), 100.0, 5)]).wait()
+    assert_equal([(price, volume) for ts, price, volume in streamer.ticks('AAPL')], [(100.0, 5)])
+    streamer.writes.stop()
+
+class PricingFetcher(FakeFetcher):
+
+    def __init__(self):
+        FakeFetcher.__init__(self)
+        self.batches = []
+
+    def fetch_batch(self, symbols):
+        self.batches.append(list(symbols))
+        return [Quote(symbol, 10.0, volume=1) for symbol in symbols]
+
+def test_added_symbols_are_fetched_on_their_own_and_looked_up_in_memory():
+    fetcher = PricingFetcher()
+    streamer = Streamer(fetcher=fetcher)
+    subscription = streamer.subscribe()
+    streamer.add_many(['NFLX', 'AAPL'])
+    # Adding does not wait for the fetch, which the update thread does.
+    assert_equal(fetcher.batches, [])
+    streamer.fetch_added()
+    assert_equal(fetcher.batches, [['NFLX']])
+    assert_equal([quote.symbol for quote in subscription.get(timeout=0)], ['NFLX'])
+    streamer.writes.submit(lambda session: None).wait()
+    assert_equal(streamer.find_database('NFLX').last_trade_price, 10.0)
+    # AAPL is read from the database once, then served from the cache.
+    assert_equal(streamer.find_database('AAPL').last_trade_price, 101.5)
+    hits = streamer.cache.hit_ratio()
+    assert_equal(streamer.find_database('AAPL').volume, 100)
+    assert_true(streamer.cache.hit_ratio() > hits)
+    assert_equal(streamer.find_database('ZZZZ'), None)
+    streamer.remove_many(['NFLX'])
+    assert_equal(streamer.find_database('NFLX'), None)
+
+class PollingFetcher(FakeFetcher):
+
+    def __init__(self):
+        FakeFetcher.__init__(self)
+        self.polled = []
+
+    def fetch_shards(self, shards):
+        for query, symbols in shards:
+            self.polled.extend(symbols)
+        return FakeFetcher.fetch_shards(self, shards)
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_update_thread_polls_added_symbols_while_asleep():
+    fetcher = PollingFetcher()
+    intervals = {'hot': 60.0, 'warm': 60.0, 'cold': 60.0}
+    streamer = Streamer(fetcher=fetcher, scheduler=Scheduler(intervals=intervals))
+    streamer.run()
+    try:
+        # After its first poll the update thread sleeps for a minute.
+        assert_true(wait_for(lambda: 'AAPL' in fetcher.polled))
+        streamer.add('ORCL')
+        assert_true(wait_for(lambda: 'ORCL' in fetcher.polled))
+        streamer.remove('ORCL')
+    finally:
+        streamer.stop()
+        streamer.join()
@@ -0,0 +1,85 @@
+from nose.tools import *
+import os
+import shutil
+import tempfile
+from stream.providers import Provider, FileProvider, make_provider
+from stream.quote import Projection
+
+directory = None
+
+def setup():
+    global directory
+    directory = tempfile.mkdtemp()
+
+def teardown():
+    shutil.rmtree(directory)
+
+def append(path, text):
+    with open(path, 'a') as tick_file:
+        tick_file.write(text)
+
+def prices(provider, symbols):
+    return dict((quote.symbol, quote.last_trade_price) for quote in provider.fetch(symbols))
+
+def test_file_provider_tails_csv():
+    path = os.path.join(directory, 'ticks.csv')
+    provider = FileProvider(path, Projection(['l1', 'v0']), max_batch=2)
+    assert_equal(provider.fetch(['AAPL']), [])
+    append(path, 'Symbol,LastTradePriceOnly,Volume\nAAPL,101.5,100\nIBM,190.0,5\nAAPL,102')
+    # The last line is not complete yet.
+    assert_equal(prices(provider, ['AAPL', 'IBM', 'MSFT']), {'AAPL': 101.5, 'IBM': 190.0})
+    append(path, '.0,200\nMSFT,45.1,1\n')
+    quotes = provider.fetch(['AAPL', 'IBM', 'MSFT'])
+    assert_equal([(quote.symbol, quote.last_trade_price, quote.volume) for quote in quotes],
+                 [('AAPL', 102.0, 200), ('IBM', 190.0, 5), ('MSFT', 45.1, 1)])
+    assert_equal(provider.ticks, 4)
+    # Rotated: read again from the start.
+    with open(path, 'w') as tick_file:
+        tick_file.write('Symbol,LastTradePriceOnly\nAAPL,99\n')
+    assert_equal(prices(provider, ['AAPL']), {'AAPL': 99.0})
+
+def test_file_provider_reads_ndjson_and_providers_check_fields():
+    path = os.path.join(directory, 'ticks.ndjson')
+    append(path, '{"Symbol": "AAPL", "LastTradePriceOnly": 101.5}\n\n'
+                 '{"Symbol": "AAPL", "LastTradePriceOnly": "N/A"}\n')
+    provider = FileProvider(path, Projection(['l1']))
+    assert_false(provider.remote)
+    assert_equal(prices(provider, ['AAPL']), {'AAPL': None})
+
+    class PriceOnly(Provider):
+        fields = ('Symbol', 'LastTradePriceOnly')
+    PriceOnly(Projection(['l1']))
+    assert_raises(ValueError, PriceOnly, Projection(['l1', 'v0']))
+    assert_raises(ValueError, make_provider, 'bloomberg')
+
+def test_file_provider_skips_bad_lines():
+    path = os.path.join(directory, 'bad.ndjson')
+    append(path, '{"Symbol": "AAPL", "LastTradePriceOnly": 101.5}\n{"Symbol": \n'
+                 '{"LastTradePriceOnly": 1}\n[1]\n{"Symbol": "IBM", "LastTradePriceOnly": 190}\n')
+    provider = FileProvider(path, Projection(['l1']))
+    # The ticks around the bad lines are kept.
+    assert_equal(prices(provider, ['AAPL', 'IBM']), {'AAPL': 101.5, 'IBM': 190.0})
+    assert_equal((provider.ticks, provider.bad_lines), (2, 3))
+
+    path = os.path.join(directory, 'bad.csv')
+    append(path, 'LastTradePriceOnly,Symbol\n101.5,AAPL\n7\n1.0,\n190,IBM\n')
+    provider = FileProvider(path, Projection(['l1']))
+    assert_equal(prices(provider, ['AAPL', 'IBM']), {'AAPL': 101.5, 'IBM': 190.0})
+    assert_equal((provider.ticks, provider.bad_lines), (2, 2))
+
+    path = os.path.join(directory, 'nosymbol.csv')
+    append(path, 'LastTradePriceOnly\n101.5\n')
+    provider = FileProvider(path, Projection(['l1']))
+    assert_equal(provider.fetch(['AAPL']), [])
+    assert_equal(provider.failed, [['AAPL']])
+
+def test_file_provider_forgets_ticks_of_a_rotated_file():
+    path = os.path.join(directory, 'rotated.csv')
+    append(path, 'Symbol,LastTradePriceOnly\nAAPL,101.5\nIBM,190.0\n')
+    provider = FileProvider(path, Projection(['l1', 'v0']))
+    assert_equal(prices(provider, ['AAPL', 'IBM']), {'AAPL': 101.5, 'IBM': 190.0})
+    open(path, 'w').close()
+    assert_equal(provider.fetch(['AAPL', 'IBM']), [])
+    append(path, 'Volume,Symbol\n5,IBM\n')
+    quotes = provider.fetch(['AAPL', 'IBM'])
+    assert_equal([(quote.symbol, quote.volume) for quote in quotes], [('IBM', 5)])
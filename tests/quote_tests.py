@@ -0,0 +1,21 @@
+from nose.tools import *
+from datetime import datetime
+from stream.quote import Projection
+
+def test_projection_selects_and_decodes_only_picked_fields():
+    projection = Projection(['l1', 'b0', 'a2'])
+    assert_equal(projection.names, ['Symbol', 'LastTradePriceOnly', 'Bid', 'AverageDailyVolume'])
+    assert_equal(projection.columns, ('last_trade_price', 'bid'))
+    assert_equal(projection.select, 'Symbol%2CLastTradePriceOnly%2CBid%2CAverageDailyVolume')
+
+    now = datetime(2014, 8, 22, 15, 30)
+    quote = projection.decode({'Symbol': 'AAPL', 'LastTradePriceOnly': '101.32',
+                               'Bid': 'N/A', 'AverageDailyVolume': '56000000'}, now)
+    assert_equal((quote.symbol, quote.last_trade_price, quote.bid, quote.ask),
+                 ('AAPL', 101.32, None, None))
+    assert_equal(quote.extra, {'AverageDailyVolume': '56000000'})
+    assert_equal(quote.updated_at, now)
+
+@raises(ValueError)
+def test_projection_rejects_unknown_codes():
+    Projection(['zz'])
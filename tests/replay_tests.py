@@ -0,0 +1,60 @@
+from nose.tools import *
+import json
+import os
+import stream
+from stream.fetch import ShardedFetcher
+from stream.models import Stock
+from stream.process import Streamer
+from stream.quote import Projection
+from stream.replay import Recorder, Recording, ReplayServer
+from tests import setup_database, teardown_database
+
+directory = None
+server = None
+
+def fixture_quotes():
+    path = os.path.join(os.path.dirname(__file__), 'fixtures', 'yql_quotes.json')
+    with open(path) as fixture:
+        return json.load(fixture)['query']['results']['quote']
+
+def setup():
+    global directory, server
+    directory = setup_database()
+    server = ReplayServer(Recording.synthetic(fixture_quotes(), 3, seed=1)).start()
+
+def teardown():
+    server.stop()
+    teardown_database(directory)
+
+def test_replayed_poll_is_stored_published_and_recorded():
+    path = os.path.join(directory, 'recording.ndjson')
+    recorder = Recorder(path)
+    fetcher = ShardedFetcher(url=server.url, shard_size=2, projection=Projection(['l1']),
+                             recorder=recorder)
+    streamer = Streamer(fetcher=fetcher)
+    subscription = streamer.subscribe()
+    # The new symbols are fetched on their own, then the poll fetches them
+    # again. ZZZZ was not recorded, so it borrows a recorded quote.
+    streamer.add_many(['AAPL', 'GOOG', 'MSFT', 'ZZZZ'])
+    streamer.fetch_added()
+    tier, = streamer.scheduler.due()
+    streamer.refresh(tier)
+    streamer.writes.stop()
+    recorder.close()
+
+    published = dict((quote.symbol, quote.last_trade_price)
+                     for quote in subscription.get(timeout=0))
+    assert_equal(sorted(published), ['AAPL', 'GOOG', 'MSFT', 'ZZZZ'])
+    session = stream.Session()
+    prices = dict(session.query(Stock.symbol, Stock.last_trade_price))
+    stream.Session.remove()
+    assert_equal(prices, published)
+    latest = server.recording.frames[1]
+    assert_almost_equal(prices['AAPL'], float(latest['AAPL']['LastTradePriceOnly']))
+
+    # Both polls were recorded, two shards each, and load back as frames.
+    recording = Recording.load(path)
+    assert_equal(len(recording.frames), 2)
+    assert_equal(sorted(recording.symbols), ['AAPL', 'GOOG', 'MSFT', 'ZZZZ'])
+    assert_equal(recording.quote(1, 'GOOG')['LastTradePriceOnly'],
+                 latest['GOOG']['LastTradePriceOnly'])
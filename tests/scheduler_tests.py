@@ -0,0 +1,67 @@
+from nose.tools import *
+import time
+from stream.scheduler import Scheduler
+
+# Friday 22 August 2014, 10:00 and 20:00 local time.
+OPEN = time.mktime((2014, 8, 22, 10, 0, 0, 0, 0, -1))
+CLOSED = time.mktime((2014, 8, 22, 20, 0, 0, 0, 0, -1))
+INTERVALS = {'hot': 5, 'warm': 15, 'cold': 60}
+
+class FakeClock(object):
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def make_scheduler(now=OPEN):
+    clock = FakeClock(now)
+    scheduler = Scheduler(clock=clock, random=lambda: 0.5, shard_size=2, intervals=INTERVALS)
+    return clock, scheduler
+
+def test_quiet_symbols_cool_down_and_busy_ones_stay_hot():
+    clock, scheduler = make_scheduler()
+    scheduler.add_many(['AAPL', 'IBM'])
+    for i in range(40):
+        for tier in scheduler.due():
+            fetched = list(tier.watchlist)
+            scheduler.completed(tier, fetched, set(['AAPL']) & set(fetched))
+        clock.now += 5
+    assert_equal(scheduler.tier_of['AAPL'].name, 'hot')
+    assert_equal(scheduler.tier_of['IBM'].name, 'cold')
+    latency = scheduler.latency()
+    assert_equal(latency['hot']['target'], 5)
+    assert_equal(latency['hot']['achieved'], 5)
+
+def test_next_wakeup_follows_the_earliest_tier():
+    clock, scheduler = make_scheduler()
+    assert_equal(scheduler.next_wakeup(), None)
+    scheduler.add_many(['AAPL'])
+    assert_equal(scheduler.next_wakeup(), 0)
+    tier, = scheduler.due()
+    clock.now += 1
+    scheduler.completed(tier, ['AAPL'], set(['AAPL']))
+    assert_equal(scheduler.next_wakeup(), 4)
+    assert_equal(scheduler.due(), [])
+
+def test_errors_back_off_exponentially():
+    clock, scheduler = make_scheduler()
+    scheduler.add_many(['AAPL'])
+    delays = []
+    for i in range(3):
+        tier, = scheduler.due()
+        scheduler.completed(tier, [], set(), error=True)
+        delays.append(tier.next_due - clock.now)
+        clock.now = tier.next_due
+    assert_equal(delays, [10, 20, 40])
+    tier, = scheduler.due()
+    scheduler.completed(tier, ['AAPL'], set(['AAPL']))
+    assert_equal(tier.next_due - clock.now, 5)
+
+def test_polls_slow_down_outside_trading_hours():
+    clock, scheduler = make_scheduler(CLOSED)
+    scheduler.add_many(['AAPL'])
+    tier, = scheduler.due()
+    scheduler.completed(tier, ['AAPL'], set(['AAPL']))
+    assert_equal(scheduler.next_wakeup(), 5 * 12)
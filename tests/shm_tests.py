@@ -0,0 +1,65 @@
+from nose.tools import *
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+from stream.quote import Quote
+from stream.shm import QuoteTable, QuoteTableReader
+
+directory = None
+
+def setup():
+    global directory
+    directory = tempfile.mkdtemp()
+
+def teardown():
+    shutil.rmtree(directory)
+
+def test_readers_see_updates_removals_and_reused_rows():
+    path = os.path.join(directory, 'quotes')
+    table = QuoteTable(path, ('last_trade_price', 'volume', 'sma_2'), capacity=2)
+    reader = QuoteTableReader(path)
+    assert_equal(reader.fields, ('last_trade_price', 'volume', 'sma_2'))
+    table.update([Quote('AAPL', 100.0, volume=10, stats={'sma_2': 90.0}), Quote('IBM', 50.0),
+                  Quote('MSFT', 40.0), Quote('TOOLONGFORTHETABLE', 1.0)])
+    # The table is full after AAPL and IBM.
+    assert_equal(len(table), 2)
+    assert_equal(reader.get('MSFT'), None)
+    quote = reader.get('AAPL')
+    assert_equal((quote['last_trade_price'], quote['volume'], quote['sma_2']), (100.0, 10, 90.0))
+    assert_true(np.isnan(reader.get('IBM')['volume']))
+    table.update([Quote('AAPL', 101.0)])
+    assert_equal(reader.get('AAPL')['last_trade_price'], 101.0)
+    # MSFT takes over AAPL's row, which the reader's index still points at.
+    row = reader.index()['AAPL']
+    table.remove(['AAPL'])
+    table.update([Quote('MSFT', 41.0)])
+    assert_equal(table.row_of['MSFT'], row)
+    assert_equal(reader.get('AAPL'), None)
+    assert_equal(reader.get('MSFT')['last_trade_price'], 41.0)
+    rows = reader.snapshot()
+    assert_equal(sorted(rows['symbol'][rows['symbol'] != '']), ['IBM', 'MSFT'])
+    assert_raises(ValueError, reader.rows['last_trade_price'].__setitem__, 0, 1.0)
+    reader.close()
+    table.close()
+
+def test_readers_wait_for_rows_being_written():
+    path = os.path.join(directory, 'writing')
+    table = QuoteTable(path, ('last_trade_price',))
+    reader = QuoteTableReader(path)
+    table.update([Quote('AAPL', 100.0)])
+    row = table.row_of['AAPL']
+    # Leave the row half written, as a writer in another process would.
+    table.sequence[row] += 1
+    table.rows['last_trade_price'][row] = 101.0
+    def finish():
+        table.rows['last_trade_price'][row] = 102.0
+        table.sequence[row] += 1
+    writer = threading.Timer(0.05, finish)
+    writer.start()
+    assert_equal(reader.get('AAPL')['last_trade_price'], 102.0)
+    assert_equal(reader.snapshot()['last_trade_price'][row], 102.0)
+    writer.join()
+    reader.close()
+    table.close()
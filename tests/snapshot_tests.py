@@ -0,0 +1,22 @@
+from nose.tools import *
+import numpy as np
+from stream.quote import Quote
+from stream.snapshot import Snapshot
+
+def test_screen_updates_in_place_and_views_are_read_only():
+    snapshot = Snapshot(('last_trade_price', 'volume', 'sma_2'), capacity=2)
+    snapshot.update([Quote('AAPL', 100.0, volume=10, stats={'sma_2': 90.0}),
+                     Quote('IBM', 50.0, volume=5, stats={'sma_2': 60.0}),
+                     Quote('MSFT', 40.0)])
+    copy = snapshot.copy()
+    snapshot.update([Quote('IBM', 70.0, volume=20, stats={'sma_2': 60.0})])
+    snapshot.remove(['AAPL'])
+    with snapshot.read() as view:
+        assert_equal(len(view), 2)
+        assert_equal(view.select(view.last_trade_price > view.sma_2), ['IBM'])
+        assert_equal(view.volume[view.row('IBM')], 20)
+        assert_true(np.isnan(view.volume[view.row('MSFT')]))
+        assert_raises(ValueError, view.last_trade_price.__setitem__, 0, 1.0)
+    # The copy still holds the values from before.
+    with np.errstate(invalid='ignore'):
+        assert_equal(copy.select(copy.last_trade_price > copy.sma_2), ['AAPL'])
@@ -1,5 +1,13 @@
 from nose.tools import *
+import os
+import shutil
+import tempfile
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
 import stream
+from stream.models import Base, Stock
+from stream.util import get_session
+from tests import setup_database, teardown_database
 
 def setup():
     print("SETUP!")
@@ -8,4 +16,35 @@ def teardown():
     print("TEAR DOWN!")
 
 def test_basic():
-    print("I RAN!")
\ No newline at end of file
+    print("I RAN!")
+
+def test_sqlite_files_reuse_pooled_connections():
+    directory = tempfile.mkdtemp()
+    try:
+        engine = stream.make_engine('sqlite:///' + os.path.join(directory, 'test.db'), pool_size=2)
+        connects = []
+        event.listen(engine, 'connect', lambda connection, record: connects.append(connection))
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        for i in range(3):
+            session = Session()
+            session.query(Stock).count()
+            session.close()
+        assert_equal(len(connects), 1)
+        assert_equal(engine.pool.checkedin(), 1)
+        engine.dispose()
+    finally:
+        shutil.rmtree(directory)
+
+def test_get_session_rolls_back_and_raises():
+    directory = setup_database()
+    try:
+        with assert_raises(ValueError):
+            with get_session() as session:
+                session.add(Stock('AAPL'))
+                session.flush()
+                raise ValueError('bad quote')
+        with get_session() as session:
+            assert_equal(session.query(Stock).count(), 0)
+    finally:
+        teardown_database(directory)
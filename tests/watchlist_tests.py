@@ -0,0 +1,17 @@
+from nose.tools import *
+from stream.watchlist import Watchlist
+
+def test_ordered_set_with_incremental_shards():
+    watchlist = Watchlist(['A', 'B', 'C'], shard_size=2)
+    assert_equal(watchlist.add_many(['B', 'D', 'E']), ['D', 'E'])
+    assert_equal(list(watchlist), ['A', 'B', 'C', 'D', 'E'])
+    assert_true('D' in watchlist)
+    assert_equal([shard.query for shard in watchlist.shards],
+                 [repr('A","B'), repr('C","D'), repr('E')])
+
+    first, second, third = watchlist.shards
+    assert_equal(watchlist.remove_many(['C', 'E', 'Z']), ['C', 'E'])
+    assert_equal(len(watchlist), 3)
+    assert_equal(watchlist.shards, [first, second])
+    assert_equal(second.query, repr('D'))
+    assert_false(watchlist.remove('C'))
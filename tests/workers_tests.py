@@ -0,0 +1,60 @@
+from nose.tools import *
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from functools import partial
+from stream.providers import FileProvider, ProviderError
+from stream.quote import Projection, Quote
+from stream.workers import BatchCodec, WorkerPool
+
+directory = None
+
+def setup():
+    global directory
+    directory = tempfile.mkdtemp()
+
+def teardown():
+    shutil.rmtree(directory)
+
+def test_codec_round_trip():
+    codec = BatchCodec(Projection(['l1', 'v0', 'c4']))
+    quotes = [Quote('AAPL', 101.5, volume=100, extra={'Currency': 'USD'}),
+              Quote('IBM', None, volume=None, extra={'Currency': None})]
+    buffer = codec.pack(quotes, [['X', 'Y']], retrieved=0)
+    unpacked, failed = codec.unpack(buffer)
+    assert_equal([(quote.symbol, quote.last_trade_price, quote.volume, quote.extra)
+                  for quote in unpacked],
+                 [('AAPL', 101.5, 100, {'Currency': 'USD'}), ('IBM', None, None, {'Currency': None})])
+    assert_equal(type(unpacked[0].volume), int)
+    assert_equal(unpacked[0].updated_at, datetime(1970, 1, 1))
+    assert_equal(failed, [['X', 'Y']])
+    assert_equal(codec.unpack(codec.pack([]))[0], [])
+
+def test_worker_pool_fetches_slices_in_processes():
+    path = os.path.join(directory, 'ticks.csv')
+    with open(path, 'w') as tick_file:
+        tick_file.write('Symbol,LastTradePriceOnly\n')
+        for i in range(100):
+            tick_file.write('S{},{}\n'.format(i, i))
+    pool = WorkerPool(3, partial(FileProvider, path), Projection(['l1']))
+    try:
+        symbols = ['S{}'.format(i) for i in range(100)] + ['MISSING']
+        quotes = pool.fetch(symbols)
+        assert_equal(sorted((quote.symbol, quote.last_trade_price) for quote in quotes),
+                     sorted(('S{}'.format(i), float(i)) for i in range(100)))
+        assert_equal(pool.failed, [])
+        # A dead worker's slice fails for one poll, then a new one takes over.
+        pool.workers[0].process.terminate()
+        pool.workers[0].process.join()
+        assert_true(len(pool.fetch(symbols)) < 100)
+        assert_equal(len(pool.failed), 1)
+        assert_equal(len(pool.fetch(symbols)), 100)
+        # Single batches fail as a whole, as Provider.fetch_batch promises.
+        pool.workers[1].process.terminate()
+        pool.workers[1].process.join()
+        assert_raises(ProviderError, pool.fetch_batch, symbols)
+        assert_equal(len(pool.failed), 1)
+        assert_equal(len(pool.fetch_batch(symbols)), 100)
+    finally:
+        pool.close()
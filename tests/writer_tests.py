@@ -0,0 +1,82 @@
+from nose.tools import *
+import threading
+from sqlalchemy.orm import sessionmaker
+import stream
+from stream.models import Stock
+from stream.quote import Quote
+from stream.writer import QuoteWriter, WriterThread
+from tests import setup_database, teardown_database
+
+directory = None
+Session = None
+
+def setup():
+    global directory, Session
+    directory = setup_database(wal=True)
+    Session = sessionmaker(bind=stream.Session.session_factory.kw['bind'])
+
+def teardown():
+    teardown_database(directory)
+
+def test_write_updates_and_inserts():
+    session = Session()
+    session.add(Stock('AAPL'))
+    session.commit()
+    writer = QuoteWriter(batch_size=1)
+    writer.load(session)
+    written = writer.write(session, [Quote('AAPL', 101.5), Quote('GOOG', 530.0)],
+                           ('last_trade_price',))
+    session.commit()
+    assert_equal(written, 2)
+    assert_equal(sorted(writer.row_ids), ['AAPL', 'GOOG'])
+    prices = dict(session.query(Stock.symbol, Stock.last_trade_price))
+    assert_equal(prices, {'AAPL': 101.5, 'GOOG': 530.0})
+    assert_equal(session.query(Stock).count(), 2)
+    session.close()
+
+def test_writer_thread_groups_jobs_and_isolates_failures():
+    writer = QuoteWriter()
+    writes = WriterThread(on_rollback=writer.load)
+    # Hold up the thread so that the next jobs queue up behind this one.
+    gate = threading.Event()
+    blocker = writes.submit(lambda session: gate.wait())
+    jobs = [writes.submit(writer.resolve, [symbol]) for symbol in ('IBM', 'MSFT')]
+    bad = writes.submit(lambda session: session.execute('INSERT INTO nowhere VALUES (1)'))
+    gate.set()
+    writes.stop()
+    blocker.wait()
+    for job in jobs:
+        job.wait()
+    assert_raises(Exception, bad.wait)
+    metrics = writes.metrics()
+    assert_equal((metrics['jobs'], metrics['errors'], metrics['queue_depth']), (4, 1, 0))
+    # The bad job fails its group, which is then retried job by job: the
+    # blocker, IBM and MSFT each commit once.
+    assert_equal(metrics['commits'], 3)
+    session = Session()
+    assert_true(set(['IBM', 'MSFT']) <= set(symbol for symbol, in session.query(Stock.symbol)))
+    assert_equal(session.execute('PRAGMA journal_mode').scalar(), 'wal')
+    session.close()
+
+def test_ids_of_removed_stocks_are_not_reused():
+    session = Session()
+    writer = QuoteWriter()
+    writer.load(session)
+    writer.resolve(session, ['OLD'])
+    old = writer.row_ids['OLD']
+    writer.delete(session, ['OLD'])
+    writer.resolve(session, ['NEW'])
+    session.commit()
+    # Ticks stored under the old id must not become the new symbol's.
+    assert_true(writer.row_ids['NEW'] > old)
+    session.close()
+
+def test_writer_thread_survives_failed_rollbacks_and_refuses_jobs_once_stopped():
+    def reload(session):
+        raise ValueError('reload failed')
+    writes = WriterThread(on_rollback=reload)
+    bad = writes.submit(lambda session: session.execute('INSERT INTO nowhere VALUES (1)'))
+    assert_raises(Exception, bad.wait)
+    assert_equal(writes.submit(lambda session: 'written').wait(), 'written')
+    writes.stop()
+    assert_raises(RuntimeError, writes.submit, lambda session: None)